@@ -0,0 +1,86 @@
+"""Byte-level codec for the ASH UART framing
+
+Byte stuffing, unstuffing and data randomization are applied to every frame
+exchanged with the NCP, so they are built from bytes methods and big integer
+operations which run in C, rather than from per-byte Python loops.
+"""
+
+import re
+
+FLAG = b'\x7E'  # Marks end of frame
+ESCAPE = b'\x7D'
+XON = b'\x11'  # Resume transmission
+XOFF = b'\x13'  # Stop transmission
+SUBSTITUTE = b'\x18'
+CANCEL = b'\x1A'  # Terminates a frame in progress
+
+RESERVED = FLAG + ESCAPE + XON + XOFF + SUBSTITUTE + CANCEL
+
+# ESCAPE has to be stuffed first, so that the escape bytes inserted for the
+# other reserved bytes are not escaped a second time.
+_STUFFING = [
+    (bytes([c]), ESCAPE + bytes([c ^ 0x20]))
+    for c in ESCAPE + FLAG + XON + XOFF + SUBSTITUTE + CANCEL
+]
+
+# An escape byte at the very end of the data has nothing to unescape, and is
+# dropped.
+_UNSTUFF_RE = re.compile(re.escape(ESCAPE) + b'(.?)', re.DOTALL)
+_UNSTUFFING = {bytes([c]): bytes([c ^ 0x20]) for c in range(256)}
+_UNSTUFFING[b''] = b''
+
+# Bytes with a meaning of their own in the received byte stream. They never
+# occur unescaped within a frame.
+CONTROL_RE = re.compile(b'[' + re.escape(FLAG + CANCEL + SUBSTITUTE + XON + XOFF) + b']')
+
+
+def _pseudo_random_sequence():
+    """Generate one period of the data randomization sequence"""
+    rand = 0x42
+    out = bytearray()
+    while True:
+        out.append(rand)
+        if rand % 2:
+            rand = (rand >> 1) ^ 0xB8
+        else:
+            rand = rand >> 1
+        if rand == 0x42:
+            return bytes(out)
+
+
+_RANDOM_SEQUENCE = _pseudo_random_sequence()
+
+
+def randomize(data):
+    """XOR data with the ASH pseudo-random sequence
+
+    The operation is its own inverse, so this is used both before sending and
+    after receiving the data field of a DATA frame.
+    """
+    length = len(data)
+    sequence = _RANDOM_SEQUENCE
+    if length > len(sequence):
+        sequence *= length // len(sequence) + 1
+    r = int.from_bytes(data, 'big') ^ int.from_bytes(sequence[:length], 'big')
+    return r.to_bytes(length, 'big')
+
+
+def stuff(data):
+    """Byte stuff (escape) data for transmission"""
+    data = bytes(data)
+    for reserved, escaped in _STUFFING:
+        data = data.replace(reserved, escaped)
+    return data
+
+
+def _unescape(match):
+    return _UNSTUFFING[match.group(1)]
+
+
+def unstuff(data):
+    """Unstuff (unescape) data after receipt
+
+    Any bytes-like object is accepted, including a memoryview slice of a
+    receive buffer.
+    """
+    return _UNSTUFF_RE.sub(_unescape, data)
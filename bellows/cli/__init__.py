@@ -1,5 +0,0 @@
-# flake8: noqa
-from . import application
-from . import dump
-from . import ncp
-from . import network
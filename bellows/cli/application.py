@@ -25,10 +25,10 @@ def form(ctx, database, channel, pan_id, extended_pan_id):
     """Form a new ZigBee network"""
     ctx.obj['database_file'] = database
 
-    def inner(ctx):
+    async def inner(ctx):
         app = ctx.obj['app']
-        yield from app.initialize()
-        yield from app.form_network(channel, pan_id, extended_pan_id)
+        await app.initialize()
+        await app.form_network(channel, pan_id, extended_pan_id)
 
     return util.app(inner, app_startup=False)(ctx)
 
@@ -60,12 +60,12 @@ def permit(ctx, database, duration_s):
     """Allow devices to join this ZigBee network"""
     ctx.obj['database_file'] = database
 
-    def inner(ctx):
+    async def inner(ctx):
         app = ctx.obj['app']
-        yield from app.permit(duration_s)
+        await app.permit(duration_s)
 
         click.echo("Joins are permitted for the next %ss..." % (duration_s, ))
-        yield from asyncio.sleep(duration_s + 1)
+        await asyncio.sleep(duration_s + 1)
         click.echo("Done")
 
     return util.app(inner)(ctx)
@@ -82,13 +82,13 @@ def permit_with_key(ctx, database, duration_s, node, code):
     ctx.obj['database_file'] = database
     code = binascii.unhexlify(code)
 
-    def inner(ctx):
+    async def inner(ctx):
         app = ctx.obj['app']
         try:
-            yield from app.permit_with_key(node, code, duration_s)
+            await app.permit_with_key(node, code, duration_s)
 
             click.echo("Joins are permitted for the next %ss..." % (duration_s, ))
-            yield from asyncio.sleep(duration_s + 1)
+            await asyncio.sleep(duration_s + 1)
             click.echo("Done")
         except Exception as e:
             click.echo(e)
@@ -148,7 +148,7 @@ def zdo(ctx, node, database):
 @zdo.command()
 @click.pass_context
 @util.app
-def endpoints(ctx):
+async def endpoints(ctx):
     """List endpoints on a device"""
     app = ctx.obj['app']
     node = ctx.obj['node']
@@ -157,7 +157,7 @@ def endpoints(ctx):
     if dev is None:
         return
 
-    v = yield from dev.zdo.request(ZDO_CLUSTER_ID.Active_EP_req, dev.nwk)
+    v = await dev.zdo.request(ZDO_CLUSTER_ID.Active_EP_req, dev.nwk)
     if v[0] != 0:
         click.echo("Non-success response: %s" % (v, ))
     else:
@@ -168,7 +168,7 @@ def endpoints(ctx):
 @click.pass_context
 @util.app
 @click.argument('endpoint', type=click.IntRange(1, 255))
-def get_endpoint(ctx, endpoint):
+async def get_endpoint(ctx, endpoint):
     """Show an endpoint's simple descriptor"""
     app = ctx.obj['app']
     node = ctx.obj['node']
@@ -177,7 +177,7 @@ def get_endpoint(ctx, endpoint):
     if endp is None:
         return
 
-    v = yield from dev.zdo.request(0x0004, dev.nwk, endpoint)
+    v = await dev.zdo.request(0x0004, dev.nwk, endpoint)
     if v[0] != 0:
         click.echo("Non-success response: %s" % (v, ))
     else:
@@ -189,7 +189,7 @@ def get_endpoint(ctx, endpoint):
 @click.argument('endpoint', type=click.IntRange(1, 255))
 @click.argument('cluster', type=click.IntRange(0, 65535))
 @util.app
-def bind(ctx, endpoint, cluster):
+async def bind(ctx, endpoint, cluster):
     """Bind to a cluster on a node"""
     app = ctx.obj['app']
     node = ctx.obj['node']
@@ -198,7 +198,7 @@ def bind(ctx, endpoint, cluster):
     if clust is None:
         return
 
-    v = yield from dev.zdo.bind(endpoint, cluster)
+    v = await dev.zdo.bind(endpoint, cluster)
     click.echo(v)
 
 
@@ -207,7 +207,7 @@ def bind(ctx, endpoint, cluster):
 @click.argument('endpoint', type=click.IntRange(1, 255))
 @click.argument('cluster', type=click.IntRange(0, 65535))
 @util.app
-def unbind(ctx, endpoint, cluster):
+async def unbind(ctx, endpoint, cluster):
     """Unbind a cluster on a node"""
     app = ctx.obj['app']
     node = ctx.obj['node']
@@ -216,18 +216,18 @@ def unbind(ctx, endpoint, cluster):
     if clust is None:
         return
 
-    v = yield from dev.zdo.unbind(endpoint, cluster)
+    v = await dev.zdo.unbind(endpoint, cluster)
     click.echo(v)
 
 
 @zdo.command()
 @click.pass_context
 @util.app
-def leave(ctx):
+async def leave(ctx):
     """Tell a node to leave the network"""
     app = ctx.obj['app']
 
-    v = yield from app.remove(ctx.obj['node'])
+    v = await app.remove(ctx.obj['node'])
     click.echo(v)
 
 
@@ -249,7 +249,7 @@ def zcl(ctx, database, node, cluster, endpoint):
 @click.pass_context
 @opts.arg_attribute
 @util.app
-def read_attribute(ctx, attribute):
+async def read_attribute(ctx, attribute):
     app = ctx.obj['app']
     node = ctx.obj['node']
     endpoint_id = ctx.obj['endpoint']
@@ -259,7 +259,7 @@ def read_attribute(ctx, attribute):
     if cluster is None:
         return
 
-    v = yield from cluster.read_attributes([attribute], allow_cache=False)
+    v = await cluster.read_attributes([attribute], allow_cache=False)
     if not v:
         click.echo("Received empty response")
     elif attribute not in v[0]:
@@ -275,7 +275,7 @@ def read_attribute(ctx, attribute):
 @opts.arg_attribute
 @opts.arg_attribute_value
 @util.app
-def write_attribute(ctx, attribute, value):
+async def write_attribute(ctx, attribute, value):
     app = ctx.obj['app']
     node = ctx.obj['node']
     endpoint_id = ctx.obj['endpoint']
@@ -285,7 +285,7 @@ def write_attribute(ctx, attribute, value):
     if cluster is None:
         return
 
-    v = yield from cluster.write_attributes({attribute: value})
+    v = await cluster.write_attributes({attribute: value})
     click.echo(v)
 
 
@@ -313,7 +313,7 @@ def commands(ctx):
 @click.argument('command')
 @click.argument('parameters', nargs=-1)
 @util.app
-def command(ctx, command, parameters):
+async def command(ctx, command, parameters):
     app = ctx.obj['app']
     node = ctx.obj['node']
     endpoint_id = ctx.obj['endpoint']
@@ -324,7 +324,7 @@ def command(ctx, command, parameters):
         return
 
     try:
-        v = yield from getattr(cluster, command)(*parameters)
+        v = await getattr(cluster, command)(*parameters)
         click.echo(v)
     except ValueError as e:
         click.echo(e)
@@ -337,11 +337,11 @@ def command(ctx, command, parameters):
 @click.argument('max_interval', type=click.IntRange(0, 65535))
 @click.argument('reportable_change', type=click.INT)
 @util.app
-def configure_reporting(ctx,
-                        attribute,
-                        min_interval,
-                        max_interval,
-                        reportable_change):
+async def configure_reporting(ctx,
+                              attribute,
+                              min_interval,
+                              max_interval,
+                              reportable_change):
     app = ctx.obj['app']
     node = ctx.obj['node']
     endpoint_id = ctx.obj['endpoint']
@@ -351,7 +351,7 @@ def configure_reporting(ctx,
     if cluster is None:
         return
 
-    v = yield from cluster.configure_reporting(
+    v = await cluster.configure_reporting(
         attribute,
         min_interval,
         max_interval,
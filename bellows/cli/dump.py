@@ -30,15 +30,14 @@ def dump(ctx, channel, outfile):
             ctx.obj['ezsp'].close()
 
 
-@asyncio.coroutine
-def _dump(ctx, channel, outfile):
-    s = yield from util.setup(ctx.obj['device'], ctx.obj['baudrate'])
+async def _dump(ctx, channel, outfile):
+    s = await util.setup(ctx.obj['device'], ctx.obj['baudrate'])
     ctx.obj['ezsp'] = s
 
-    v = yield from s.mfglibStart(True)
+    v = await s.mfglibStart(True)
     util.check(v[0], "Unable to start mfglib")
 
-    v = yield from s.mfglibSetChannel(channel)
+    v = await s.mfglibSetChannel(channel)
     util.check(v[0], "Unable to set channel")
 
     pcap = pure_pcapy.Dumper(outfile, 128, 195)  # DLT_IEEE_15_4
@@ -47,17 +46,15 @@ def _dump(ctx, channel, outfile):
     ctx.obj['start_time'] = time.time()
     ctx.obj['captured'] = 0
 
-    def cb(frame_name, response):
-        if frame_name == 'mfglibRxHandler':
-            data = response[2]
-            ts = time.time()
-            ts_sec = int(ts)
-            ts_usec = int((ts - ts_sec) * 1000000)
-            hdr = pure_pcapy.Pkthdr(ts_sec, ts_usec, len(data), len(data))
-            pcap.dump(hdr, data)
-            ctx.obj['captured'] += 1
+    def cb(link_quality, rssi, data):
+        ts = time.time()
+        ts_sec = int(ts)
+        ts_usec = int((ts - ts_sec) * 1000000)
+        hdr = pure_pcapy.Pkthdr(ts_sec, ts_usec, len(data), len(data))
+        pcap.dump(hdr, data)
+        ctx.obj['captured'] += 1
 
-    s.add_callback(cb)
+    s.subscribe('mfglibRxHandler', cb)
 
     while True:
-        yield from asyncio.sleep(1)
+        await asyncio.sleep(1)
@@ -1,3 +1,4 @@
+import importlib
 import logging
 
 import click
@@ -6,7 +7,44 @@ import click_log
 from . import opts
 
 
-@click.group()
+# Module defining each subcommand, imported when the subcommand is used
+COMMANDS = {
+    'config': 'ncp',
+    'devices': 'application',
+    'dump': 'dump',
+    'form': 'application',
+    'info': 'ncp',
+    'join': 'network',
+    'leave': 'network',
+    'permit': 'application',
+    'permit_with_key': 'application',
+    'scan': 'network',
+    'standalone': 'application',
+    'zcl': 'application',
+    'zdo': 'application',
+}
+
+
+class LazyGroup(click.Group):
+    """Group importing the module of a subcommand only on dispatch"""
+
+    def _load(self, module):
+        importlib.import_module('%s.%s' % (__package__, module))
+
+    def list_commands(self, ctx):
+        for module in sorted(set(COMMANDS.values())):
+            self._load(module)
+        return super().list_commands(ctx)
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.commands:
+            module = COMMANDS.get(cmd_name.replace('-', '_'))
+            if module is not None:
+                self._load(module)
+        return super().get_command(ctx, cmd_name)
+
+
+@click.group(cls=LazyGroup)
 @click_log.simple_verbosity_option(logging.getLogger())
 @opts.device
 @opts.baudrate
@@ -1,5 +1,4 @@
 import asyncio
-import functools
 import logging
 import math
 
@@ -20,14 +19,10 @@ LOGGER = logging.getLogger(__name__)
 @opts.extended_pan
 @opts.pan
 @click.pass_context
-@util.async
-def join(ctx, channels, pan_id, extended_pan_id):
+@util.background
+async def join(ctx, channels, pan_id, extended_pan_id):
     """Join an existing ZigBee network as an end device"""
-    def cb(fut, frame_name, response):
-        if frame_name == 'stackStatusHandler':
-            fut.set_result(response)
-
-    s = yield from util.setup(ctx.obj['device'], ctx.obj['baudrate'])
+    s = await util.setup(ctx.obj['device'], ctx.obj['baudrate'])
 
     channel = None
 
@@ -45,9 +40,18 @@ def join(ctx, channels, pan_id, extended_pan_id):
         click.echo("PAN not provided, scanning channels %s..." % (
             ' '.join(map(str, channels)),
         ))
-        v = yield from s.startScan(scan_type, channel_mask, 3)
+        networks = []
+        async with s.start_scan_iter(scan_type, channel_mask, 3) as scan:
+            async for network, lqi, rssi in scan:
+                click.echo("Found network %s %s on channel %s%s" % (
+                    network.panId,
+                    network.extendedPanId,
+                    network.channel,
+                    "" if network.allowingJoin else " (not joinable)",
+                ))
+                if network.allowingJoin:
+                    networks.append(network)
 
-        networks = [n[0] for n in v if n[0].allowingJoin]
         if len(networks) == 0:
             click.echo("No joinable networks found")
             return 1
@@ -61,10 +65,6 @@ def join(ctx, channels, pan_id, extended_pan_id):
         extended_pan_id = network.extendedPanId
         channel = network.channel
 
-        click.echo("Found network %s %s on channel %s" % (
-            pan_id, extended_pan_id, channel,
-        ))
-
     if pan_id is None:
         pan_id = t.uint16_t(0)
     else:
@@ -72,18 +72,18 @@ def join(ctx, channels, pan_id, extended_pan_id):
     if isinstance(extended_pan_id, str):
         extended_pan_id = util.parse_epan(extended_pan_id)
     if extended_pan_id is None:
-        extended_pan_id = t.fixed_list(8, t.uint8_t)([t.uint8_t(0)] * 8)
+        extended_pan_id = t.fixed_bytes(8)(b'\x00' * 8)
 
-    v = yield from util.network_init(s)
+    v = await util.network_init(s)
 
     if v[0] == t.EmberStatus.SUCCESS:
         LOGGER.debug("Network was up, leaving...")
-        v = yield from s.leaveNetwork()
+        v = await s.leaveNetwork()
         util.check(v[0], "Failure leaving network: %s" % (v[0], ))
-        yield from asyncio.sleep(1)  # TODO
+        await asyncio.sleep(1)  # TODO
 
     initial_security_state = zutil.zha_security()
-    v = yield from s.setInitialSecurityState(initial_security_state)
+    v = await s.setInitialSecurityState(initial_security_state)
     util.check(v[0], "Setting security state failed: %s" % (v[0], ))
 
     parameters = t.EmberNetworkParameters()
@@ -97,29 +97,26 @@ def join(ctx, channels, pan_id, extended_pan_id):
     parameters.channels = t.uint32_t(0)
     click.echo(parameters)
 
-    fut = asyncio.Future()
-    cbid = s.add_callback(functools.partial(cb, fut))
-    v = yield from s.joinNetwork(t.EmberNodeType.END_DEVICE, parameters)
+    fut = s.wait_for('stackStatusHandler')
+    v = await s.joinNetwork(t.EmberNodeType.END_DEVICE, parameters)
     util.check(v[0], "Joining network failed: %s" % (v[0], ))
-    v = yield from fut
+    v = await fut
     click.echo(v)
 
-    s.remove_callback(cbid)
-
     s.close()
 
 
 @main.command()
 @click.pass_context
-@util.async
-def leave(ctx):
+@util.background
+async def leave(ctx):
     """Leave the ZigBee network"""
-    s = yield from util.setup(ctx.obj['device'], ctx.obj['baudrate'])
-    v = yield from util.network_init(s)
+    s = await util.setup(ctx.obj['device'], ctx.obj['baudrate'])
+    v = await util.network_init(s)
     if v[0] == t.EmberStatus.NOT_JOINED:
         click.echo("Not joined, not leaving")
     else:
-        v = yield from s.leaveNetwork()
+        v = await s.leaveNetwork()
         util.check(v[0], "Failure leaving network: %s" % (v[0], ))
 
     s.close()
@@ -130,10 +127,10 @@ def leave(ctx):
 @opts.duration_ms
 @click.option('-e', '--energy', 'energy_scan', is_flag=True)
 @click.pass_context
-@util.async
-def scan(ctx, channels, duration_ms, energy_scan):
+@util.background
+async def scan(ctx, channels, duration_ms, energy_scan):
     """Scan for networks or radio interference"""
-    s = yield from util.setup(ctx.obj['device'], ctx.obj['baudrate'])
+    s = await util.setup(ctx.obj['device'], ctx.obj['baudrate'])
 
     channel_mask = util.channel_mask(channels)
     click.echo("Scanning channels %s" % (' '.join(map(str, channels)), ))
@@ -152,8 +149,8 @@ def scan(ctx, channels, duration_ms, energy_scan):
     if energy_scan:
         scan_type = t.EzspNetworkScanType.ENERGY_SCAN
 
-    v = yield from s.startScan(scan_type, channel_mask, duration_symbol_exp)
-    for network in v:
-        click.echo(network)
+    async with s.start_scan_iter(scan_type, channel_mask, duration_symbol_exp) as scan:
+        async for result in scan:
+            click.echo(result)
 
     s.close()
@@ -33,7 +33,7 @@ class ZigbeeNodeParamType(click.ParamType):
         return t.EmberEUI64([t.uint8_t(p, base=16) for p in value.split(':')])
 
 
-def async(f):
+def background(f):
     @functools.wraps(f)
     def inner(*args, **kwargs):
         loop = asyncio.get_event_loop()
@@ -45,19 +45,18 @@ def async(f):
 def app(f, app_startup=True, run_forever=False, shutdown_cb=None):
     database_file = None
 
-    @asyncio.coroutine
-    def async_inner(ctx, *args, **kwargs):
+    async def async_inner(ctx, *args, **kwargs):
         nonlocal database_file
         database_file = ctx.obj['database_file']
-        app = yield from setup_application(
+        app = await setup_application(
             ctx.obj['device'],
             ctx.obj['baudrate'],
             database_file,
             startup=app_startup,
         )
         ctx.obj['app'] = app
-        yield from f(ctx, *args, **kwargs)
-        yield from asyncio.sleep(0.5)
+        await f(ctx, *args, **kwargs)
+        await asyncio.sleep(0.5)
 
     def shutdown():
         try:
@@ -99,43 +98,43 @@ def channel_mask(channels):
     return mask
 
 
-@asyncio.coroutine
-def setup(dev, baudrate=57600, cbh=None, configure=True):
+async def setup(dev, baudrate=57600, cbh=None, configure=True):
     s = bellows.ezsp.EZSP()
     if cbh:
         s.add_callback(cbh)
     try:
-        yield from s.connect(dev, baudrate)
+        await s.connect(dev, baudrate)
     except Exception as e:
         LOGGER.error(e)
         raise click.Abort()
     LOGGER.debug("Connected. Resetting.")
-    yield from s.reset()
-    yield from s.version()
+    await s.reset()
+    await s.version()
 
-    @asyncio.coroutine
-    def cfg(config_id, value):
-        v = yield from s.setConfigurationValue(config_id, value)
-        check(v[0], 'Setting config %s to %s: %s' % (config_id, value, v[0]))
     c = t.EzspConfigId
 
     if configure:
         LOGGER.debug("Configuring...")
-        yield from cfg(c.CONFIG_STACK_PROFILE, 2)
-        yield from cfg(c.CONFIG_SECURITY_LEVEL, 5)
-        yield from cfg(c.CONFIG_SUPPORTED_NETWORKS, 1)
-        yield from cfg(c.CONFIG_PACKET_BUFFER_COUNT, 0xff)
+        config = [
+            (c.CONFIG_STACK_PROFILE, 2),
+            (c.CONFIG_SECURITY_LEVEL, 5),
+            (c.CONFIG_SUPPORTED_NETWORKS, 1),
+            (c.CONFIG_PACKET_BUFFER_COUNT, 0xff),
+        ]
+        statuses = await s.update_config(config)
+        for config_id, value in config:
+            status = statuses[config_id]
+            check(status, 'Setting config %s to %s: %s' % (config_id, value, status))
 
     return s
 
 
-@asyncio.coroutine
-def setup_application(dev, baudrate, database_file, startup=True):
+async def setup_application(dev, baudrate, database_file, startup=True):
     s = bellows.ezsp.EZSP()
-    yield from s.connect(dev, baudrate)
+    await s.connect(dev, baudrate)
     app = bellows.zigbee.application.ControllerApplication(s, database_file)
     if startup:
-        yield from app.startup()
+        await app.startup()
     return app
 
 
@@ -147,9 +146,8 @@ def check(ret, message, expected=0):
     raise click.ClickException(message)
 
 
-@asyncio.coroutine
-def network_init(s):
-    v = yield from s.networkInit()
+async def network_init(s):
+    v = await s.networkInit()
     check(
         v[0],
         "Failure initializing network: %s" % (v[0], ),
@@ -160,32 +158,26 @@ def network_init(s):
 
 def parse_epan(epan):
     """Parse a user specified extended PAN ID"""
-    l = [t.uint8_t(x, 16) for x in epan.split(":")]
-    return t.fixed_list(8, t.uint8_t)(l)
-
-
-@asyncio.coroutine
-def basic_tc_permits(s):
-    @asyncio.coroutine
-    def set_policy(policy, decision):
-        v = yield from s.setPolicy(policy, decision)
+    return t.fixed_bytes(8)(int(x, 16) for x in epan.split(":"))
+
+
+async def basic_tc_permits(s):
+    policies = [
+        (t.EzspPolicyId.TC_KEY_REQUEST_POLICY,
+         t.EzspDecisionId.DENY_TC_KEY_REQUESTS),
+        (t.EzspPolicyId.APP_KEY_REQUEST_POLICY,
+         t.EzspDecisionId.ALLOW_APP_KEY_REQUESTS),
+        (t.EzspPolicyId.TRUST_CENTER_POLICY,
+         t.EzspDecisionId.ALLOW_PRECONFIGURED_KEY_JOINS),
+    ]
+    results = await asyncio.gather(*[
+        s.setPolicy(policy, decision) for policy, decision in policies
+    ])
+    for (policy, decision), v in zip(policies, results):
         check(v[0], "Failed to set policy %s to %s: %s" % (
             policy, decision, v[0],
         ))
 
-    yield from set_policy(
-        t.EzspPolicyId.TC_KEY_REQUEST_POLICY,
-        t.EzspDecisionId.DENY_TC_KEY_REQUESTS,
-    )
-    yield from set_policy(
-        t.EzspPolicyId.APP_KEY_REQUEST_POLICY,
-        t.EzspDecisionId.ALLOW_APP_KEY_REQUESTS,
-    )
-    yield from set_policy(
-        t.EzspPolicyId.TRUST_CENTER_POLICY,
-        t.EzspDecisionId.ALLOW_PRECONFIGURED_KEY_JOINS,
-    )
-
 
 def get_device(app, node):
     if node not in app.devices:
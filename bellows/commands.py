@@ -25,8 +25,8 @@ COMMANDS = {
     'invalidCommand': (0x58, (), (t.EzspStatus, )),
     'callback': (0x06, (), ()),
     'noCallbacks': (0x07, (), ()),
-    'setToken': (0x09, (t.uint8_t, t.fixed_list(8, t.uint8_t)), (t.EmberStatus, )),
-    'getToken': (0x0A, (t.uint8_t, ), (t.EmberStatus, t.fixed_list(8, t.uint8_t))),
+    'setToken': (0x09, (t.uint8_t, t.fixed_bytes(8)), (t.EmberStatus, )),
+    'getToken': (0x0A, (t.uint8_t, ), (t.EmberStatus, t.fixed_bytes(8))),
     'getMfgToken': (0x0B, (t.EzspMfgTokenId, ), (t.LVBytes, )),
     'setMfgToken': (0x0C, (t.EzspMfgTokenId, t.LVBytes), (t.EmberStatus, )),
     'stackTokenChangedHandler': (0x0D, (), (t.uint16_t, )),
@@ -193,7 +193,7 @@ COMMANDS = {
     'getStandaloneBootloaderVersionPlatMicroPhy': (0x91, (), (t.uint16_t, t.uint8_t, t.uint8_t, t.uint8_t)),
     'incomingBootloadMessageHandler': (0x92, (), (t.EmberEUI64, t.uint8_t, t.int8s, t.LVBytes)),
     'bootloadTransmitCompleteHandler': (0x93, (), (t.EmberStatus, t.LVBytes)),
-    'aesEncrypt': (0x94, (t.fixed_list(16, t.uint8_t), t.fixed_list(16, t.uint8_t)), (t.fixed_list(16, t.uint8_t), )),
+    'aesEncrypt': (0x94, (t.fixed_bytes(16), t.fixed_bytes(16)), (t.fixed_bytes(16), )),
     'overrideCurrentChannel': (0x95, (t.uint8_t, ), (t.EmberStatus, )),
     # 14. ZLL Frames
     'zllNetworkOps': (0xB2, (t.EmberZllNetwork, t.EzspZllNetworkOperation, t.int8s), (t.EmberStatus, )),
@@ -239,7 +239,7 @@ COMMANDS = {
     'rf4ceGetMaxPayload': (0xF3, (t.uint8_t, t.EmberRf4ceTxOption), (t.uint8_t, )),
     'rf4ceGetNetworkParameters': (0xF4, (), (t.EmberStatus, t.EmberNodeType, t.EmberNetworkParameters)),
     # 16 Green Power Frames
-    'gpProxyTableProcessGpPairing': (0xC9, (t.uint32_t, t.EmberGpAddress, t.uint8_t, t.uint16_t, t.uint16_t, t.uint16_t, t.fixed_list(8, t.uint8_t), t.EmberKeyData), ()),
+    'gpProxyTableProcessGpPairing': (0xC9, (t.uint32_t, t.EmberGpAddress, t.uint8_t, t.uint16_t, t.uint16_t, t.uint16_t, t.fixed_bytes(8), t.EmberKeyData), ()),
     'dGpSend': (0xC6, (t.Bool, t.Bool, t.EmberGpAddress, t.uint8_t, t.LVBytes, t.uint8_t, t.uint16_t), (t.EmberStatus, )),
     'dGpSentHandler': (0xC7, (), (t.EmberStatus, t.uint8_t)),
     'gpepIncomingMessageHandler': (0xC5, (), (t.EmberStatus, t.uint8_t, t.uint8_t, t.EmberGpAddress, t.EmberGpSecurityLevel, t.EmberGpKeyType, t.Bool, t.Bool, t.uint32_t, t.uint8_t, t.uint32_t, t.EmberGpSinkListEntry, t.LVBytes)),
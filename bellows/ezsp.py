@@ -1,5 +1,7 @@
 import asyncio
+import collections
 import functools
+import itertools
 import logging
 
 import bellows.types as t
@@ -10,42 +12,241 @@ from bellows.commands import COMMANDS
 LOGGER = logging.getLogger(__name__)
 
 
+class Stats(uart.BaseStats):
+    """EZSP command statistics
+
+    in_flight is the number of commands awaiting a response and queued the
+    number waiting for room in the command window. latency is the round trip
+    time of the last command answered, in seconds. late_responses counts the
+    responses dropped because their command had already timed out.
+    """
+    def __init__(self):
+        self.commands_sent = 0
+        self.responses = 0
+        self.timeouts = 0
+        self.late_responses = 0
+        self.sequence_skips = 0
+        self.in_flight = 0
+        self.in_flight_max = 0
+        self.queued = 0
+        self.latency = None
+        self.latency_max = 0
+        self.latency_total = 0
+
+
+class ListStream:
+    """Results of a list command, as their callbacks arrive
+
+    Iterate with `async for`, within `async with` so the stream is closed
+    when done. The command is sent when iteration starts, and an
+    unsuccessful command or completion status is raised once the results
+    received before it have been consumed.
+
+    The NCP cannot be paused, so at most `maxsize` results are buffered
+    (0 for no limit). Older results are dropped, and counted in `dropped`,
+    when the consumer falls behind. close() stops listening and, if the
+    command has not completed yet, sends `stop_command`.
+    """
+    def __init__(self, ezsp, name, args, item_frames, completion_frame,
+                 spos, stop_command=None, maxsize=0):
+        self._ezsp = ezsp
+        self._name = name
+        self._args = args
+        self._item_frames = item_frames
+        self._completion_frame = completion_frame
+        self._spos = spos
+        self._stop_command = stop_command
+        self._maxsize = maxsize
+        self._buffer = collections.deque()
+        self._waiter = None
+        self._subscriptions = None
+        self._completion = None
+        self._started = False
+        self._done = False
+        self._error = None
+        self.dropped = 0
+
+    def _start(self):
+        self._started = True
+        self._subscriptions = [
+            self._ezsp.subscribe(frame, self._item)
+            for frame in self._item_frames
+        ]
+        self._completion = self._ezsp.wait_for(self._completion_frame)
+        self._completion.add_done_callback(self._completed)
+        sent = asyncio.ensure_future(self._ezsp._command(self._name, *self._args))
+        sent.add_done_callback(self._sent)
+
+    def _item(self, *args):
+        if self._maxsize and len(self._buffer) >= self._maxsize:
+            self._buffer.popleft()
+            self.dropped += 1
+            LOGGER.warning("Dropping %s result, consumer too slow", self._name)
+        self._buffer.append(list(args))
+        self._wake()
+
+    def _sent(self, future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None and future.result()[0] != 0:
+            error = Exception(future.result())
+        if error is not None:
+            self._finish(error)
+
+    def _completed(self, future):
+        if future.cancelled():
+            return
+        v = future.result()
+        self._finish(Exception(v) if v[self._spos] != 0 else None)
+
+    def _finish(self, error):
+        if self._done:
+            return
+        self._done = True
+        self._error = error
+        for subscription in self._subscriptions:
+            self._ezsp.unsubscribe(subscription)
+        self._completion.cancel()
+        self._wake()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def next(self):
+        if not self._started:
+            self._start()
+        while not self._buffer:
+            if self._done:
+                error, self._error = self._error, None
+                if error is not None:
+                    raise error
+                raise StopAsyncIteration
+            self._waiter = asyncio.get_event_loop().create_future()
+            await self._waiter
+        return self._buffer.popleft()
+
+    async def close(self):
+        if not self._started or self._done:
+            self._done = True
+            return
+        self._finish(None)
+        self._buffer.clear()
+        if self._stop_command is not None:
+            await self._ezsp._command(self._stop_command)
+
+    def __aiter__(self):
+        return self
+
+    __anext__ = next
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
 class EZSP:
 
     COMMANDS = COMMANDS
     ezsp_version = 4
 
-    def __init__(self):
+    # Maximum number of commands awaiting a response. Further commands are
+    # queued until a response arrives or a command times out.
+    COMMAND_WINDOW = 4
+    # Seconds to wait for the response to a command
+    COMMAND_TIMEOUT = 10
+    # Results buffered by the list command iterators
+    LIST_BUFFER_SIZE = 64
+
+    def __init__(self, window_size=None, timeout=None):
+        if window_size is None:
+            window_size = self.COMMAND_WINDOW
+        if not 1 <= window_size <= 255:
+            raise ValueError("window_size must be between 1 and 255")
+        self._window_size = window_size
+        self._timeout = self.COMMAND_TIMEOUT if timeout is None else timeout
+        self._queue = collections.deque()
+        self._deadlines = {}
+        # Frame ID of each timed out command by sequence, for a while
+        self._timed_out = {}
+        self.stats = Stats()
         self._callbacks = {}
+        self._subscriptions = {}
+        self._subscription_frames = {}
+        self._subscription_ids = itertools.count()
+        self._waiters = {}
         self._seq = 0
         self._gw = None
+        self._device = None
+        self._baudrate = None
         self._awaiting = {}
         self.COMMANDS_BY_ID = {}
         for name, details in self.COMMANDS.items():
-            self.COMMANDS_BY_ID[details[0]] = (name, details[1], details[2])
+            self.COMMANDS_BY_ID[details[0]] = (
+                name,
+                t.Schema(details[1]),
+                t.Schema(details[2]),
+            )
 
-    @asyncio.coroutine
-    def connect(self, device, baudrate):
+    async def connect(self, device, baudrate):
         assert self._gw is None
-        self._gw = yield from uart.connect(device, baudrate, self)
+        self._device = device
+        self._baudrate = baudrate
+        self._gw = await uart.connect(device, baudrate, self)
+
+    async def reconnect(self):
+        """Open a new connection to the device last connected to"""
+        LOGGER.debug("Reconnecting to %s", self._device)
+        if self._gw is not None:
+            self._gw.close()
+            self._gw = None
+        await self.connect(self._device, self._baudrate)
 
     def reset(self):
         return self._gw.reset()
 
-    @asyncio.coroutine
-    def version(self):
+    async def version(self):
         version = self.ezsp_version
-        result = yield from self._command('version', version)
+        result = await self._command('version', version)
         if result[0] != version:
             LOGGER.debug("Switching to eszp version %d", result[0])
-            yield from self._command('version', result[0])
+            await self._command('version', result[0])
 
     def close(self):
         return self._gw.close()
 
+    @property
+    def ash_stats(self):
+        """Retransmission and round trip statistics of the UART link"""
+        return self._gw.stats
+
+    def enter_failed_state(self, error):
+        """The UART link has failed
+
+        Commands awaiting a response are failed, and the application is
+        notified so it can reset the NCP.
+        """
+        LOGGER.error("NCP entered failed state: %s", error)
+        awaiting, self._awaiting = self._awaiting, {}
+        queue, self._queue = self._queue, collections.deque()
+        self._timed_out = {}
+        for _, timer in self._deadlines.values():
+            timer.cancel()
+        self._deadlines = {}
+        self._update_depth()
+        futures = [future for _, _, future in awaiting.values()]
+        futures.extend(future for _, _, future in queue)
+        for future in futures:
+            if not future.done():
+                future.set_exception(Exception("NCP failure: %s" % (error, )))
+        self.handle_callback('_reset_controller_application', (error, ))
+
     def _ezsp_frame(self, name, *args):
         c = self.COMMANDS[name]
-        data = t.serialize(args, c[1])
+        data = self.COMMANDS_BY_ID[c[0]][1].serialize(args)
         frame = [
             self._seq & 0xff,
             0,    # Frame control. TODO.
@@ -58,40 +259,113 @@ class EZSP:
         return bytes(frame) + data
 
     def _command(self, name, *args):
+        """Send a command, returning a future for its response
+
+        The command is queued while the command window is full. The future
+        fails with asyncio.TimeoutError if no response arrives in time.
+        """
+        future = asyncio.get_event_loop().create_future()
+        if len(self._awaiting) < self._window_size and not self._queue:
+            self._send_command(name, args, future)
+        else:
+            LOGGER.debug("Queue command %s", name)
+            self._queue.append((name, args, future))
+            self._update_depth()
+        return future
+
+    def _send_command(self, name, args, future):
         LOGGER.debug("Send command %s", name)
+        while self._seq in self._awaiting:
+            # Still awaiting the response to a command 256 commands ago
+            self.stats.sequence_skips += 1
+            self._seq = (self._seq + 1) % 256
         data = self._ezsp_frame(name, *args)
         self._gw.data(data)
         c = self.COMMANDS[name]
-        future = asyncio.Future()
-        self._awaiting[self._seq] = (c[0], c[2], future)
+        seq = self._seq
+        # A response with this sequence now belongs to this command
+        self._timed_out.pop(seq, None)
+        loop = asyncio.get_event_loop()
+        self._awaiting[seq] = (c[0], c[2], future)
+        self._deadlines[seq] = (
+            loop.time(),
+            loop.call_later(self._timeout, self._command_timeout, seq),
+        )
         self._seq = (self._seq + 1) % 256
-        return future
+        self.stats.commands_sent += 1
+        self._update_depth()
+
+    def _send_queued(self):
+        while self._queue and len(self._awaiting) < self._window_size:
+            name, args, future = self._queue.popleft()
+            if future.done():
+                continue
+            try:
+                self._send_command(name, args, future)
+            except Exception as e:
+                future.set_exception(e)
+        self._update_depth()
+
+    def _update_depth(self):
+        self.stats.in_flight = len(self._awaiting)
+        self.stats.in_flight_max = max(self.stats.in_flight_max, self.stats.in_flight)
+        self.stats.queued = len(self._queue)
+
+    def _command_timeout(self, seq):
+        self._deadlines.pop(seq)
+        frame_id, _, future = self._awaiting.pop(seq)
+        LOGGER.warning(
+            "No response to command %s (seq %s)",
+            self.COMMANDS_BY_ID[frame_id][0],
+            seq,
+        )
+        self.stats.timeouts += 1
+        if not future.done():
+            future.set_exception(asyncio.TimeoutError())
+        # Recognize the response if it arrives late, until it is unlikely to
+        self._timed_out[seq] = frame_id
+        asyncio.get_event_loop().call_later(
+            self._timeout, self._forget_timed_out, seq, frame_id,
+        )
+        self._send_queued()
+
+    def _forget_timed_out(self, seq, frame_id):
+        if self._timed_out.get(seq) == frame_id:
+            del self._timed_out[seq]
+
+    def _command_done(self, seq, result):
+        _, _, future = self._awaiting.pop(seq)
+        deadline = self._deadlines.pop(seq, None)
+        if deadline is not None:
+            sent, timer = deadline
+            timer.cancel()
+            latency = asyncio.get_event_loop().time() - sent
+            self.stats.latency = latency
+            self.stats.latency_max = max(self.stats.latency_max, latency)
+            self.stats.latency_total += latency
+        self.stats.responses += 1
+        if not future.done():
+            future.set_result(result)
+        self._send_queued()
 
-    @asyncio.coroutine
-    def _list_command(self, name, item_frames, completion_frame, spos, *args):
+    async def _list_command(self, name, item_frames, completion_frame, spos, *args):
         """Run a command, returning result callbacks as a list"""
-        fut = asyncio.Future()
         results = []
-
-        def cb(frame_name, response):
-            if frame_name in item_frames:
-                results.append(response)
-            elif frame_name == completion_frame:
-                fut.set_result(response)
-
-        cbid = self.add_callback(cb)
-        try:
-            v = yield from self._command(name, *args)
-            if v[0] != 0:
-                raise Exception(v)
-            v = yield from fut
-            if v[spos] != 0:
-                raise Exception(v)
-        finally:
-            self.remove_callback(cbid)
-
+        async with ListStream(self, name, args, item_frames, completion_frame, spos) as stream:
+            async for result in stream:
+                results.append(result)
         return results
 
+    def _list_stream(self, name, item_frames, completion_frame, spos,
+                     stop_command, *args, maxsize=None):
+        """Run a command, returning a ListStream of its result callbacks"""
+        if maxsize is None:
+            maxsize = self.LIST_BUFFER_SIZE
+        return ListStream(
+            self, name, args, item_frames, completion_frame, spos,
+            stop_command, maxsize,
+        )
+
     startScan = functools.partialmethod(
         _list_command,
         'startScan',
@@ -99,6 +373,14 @@ class EZSP:
         'scanCompleteHandler',
         1,
     )
+    start_scan_iter = functools.partialmethod(
+        _list_stream,
+        'startScan',
+        ['energyScanResultHandler', 'networkFoundHandler'],
+        'scanCompleteHandler',
+        1,
+        'stopScan',
+    )
     pollForData = functools.partialmethod(
         _list_command,
         'pollForData',
@@ -106,6 +388,14 @@ class EZSP:
         'pollCompleteHandler',
         0,
     )
+    poll_for_data_iter = functools.partialmethod(
+        _list_stream,
+        'pollForData',
+        ['pollHandler'],
+        'pollCompleteHandler',
+        0,
+        None,
+    )
     zllStartScan = functools.partialmethod(
         _list_command,
         'zllStartScan',
@@ -113,6 +403,14 @@ class EZSP:
         'zllScanCompleteHandler',
         0,
     )
+    zll_start_scan_iter = functools.partialmethod(
+        _list_stream,
+        'zllStartScan',
+        ['zllNetworkFoundHandler'],
+        'zllScanCompleteHandler',
+        0,
+        None,
+    )
     rf4ceDiscovery = functools.partialmethod(
         _list_command,
         'rf4ceDiscovery',
@@ -120,22 +418,54 @@ class EZSP:
         'rf4ceDiscoveryCompleteHandler',
         0,
     )
+    rf4ce_discovery_iter = functools.partialmethod(
+        _list_stream,
+        'rf4ceDiscovery',
+        ['rf4ceDiscoveryResponseHandler'],
+        'rf4ceDiscoveryCompleteHandler',
+        0,
+        None,
+    )
 
-    @asyncio.coroutine
-    def formNetwork(self, parameters):  # noqa: N802
-        fut = asyncio.Future()
-
-        def cb(frame_name, response):
-            nonlocal fut
-            if frame_name == 'stackStatusHandler':
-                fut.set_result(response)
+    async def update_config(self, config):
+        """Set configuration values which differ from those on the NCP
 
-        self.add_callback(cb)
-        v = yield from self._command('formNetwork', parameters)
-        if v[0] != 0:
-            raise Exception("Failure forming network: %s" % (v, ))
+        config is a sequence of (config_id, value) pairs. The current values
+        are all read, then the differing ones written, each batch pipelined
+        in the command window. Writes reach the NCP in the given order.
+        Returns the EzspStatus of each config_id; values which were already
+        set count as SUCCESS.
+        """
+        config = list(config)
+        current = await asyncio.gather(*[
+            self.getConfigurationValue(config_id) for config_id, _ in config
+        ])
+        writes = [
+            (config_id, value)
+            for (config_id, value), (status, current_value) in zip(config, current)
+            if status != t.EzspStatus.SUCCESS or current_value != value
+        ]
+        LOGGER.debug("Writing %d of %d configuration values", len(writes), len(config))
+        results = await asyncio.gather(*[
+            self.setConfigurationValue(config_id, value)
+            for config_id, value in writes
+        ])
+
+        statuses = {config_id: t.EzspStatus.SUCCESS for config_id, _ in config}
+        for (config_id, _), result in zip(writes, results):
+            statuses[config_id] = result[0]
+        return statuses
+
+    async def formNetwork(self, parameters):  # noqa: N802
+        fut = self.wait_for('stackStatusHandler')
+        try:
+            v = await self._command('formNetwork', parameters)
+            if v[0] != 0:
+                raise Exception("Failure forming network: %s" % (v, ))
 
-        v = yield from fut
+            v = await fut
+        finally:
+            fut.cancel()
         if v[0] != t.EmberStatus.NETWORK_UP:
             raise Exception("Failure forming network: %s" % (v, ))
 
@@ -168,21 +498,71 @@ class EZSP:
             frame_name,
         )
 
-        if sequence in self._awaiting:
-            expected_id, schema, future = self._awaiting.pop(sequence)
-            assert expected_id == frame_id
-            result, data = t.deserialize(data, schema)
-            future.set_result(result)
+        result, data = self.COMMANDS_BY_ID[frame_id][2].deserialize(data)
+        awaiting = self._awaiting.get(sequence)
+        if awaiting is not None and awaiting[0] == frame_id:
+            self._command_done(sequence, result)
+        elif self._timed_out.get(sequence) == frame_id:
+            del self._timed_out[sequence]
+            LOGGER.debug(
+                "Dropping late response to command %s (seq %s)",
+                frame_name,
+                sequence,
+            )
+            self.stats.late_responses += 1
         else:
-            schema = self.COMMANDS_BY_ID[frame_id][2]
-            frame_name = self.COMMANDS_BY_ID[frame_id][0]
-            result, data = t.deserialize(data, schema)
             self.handle_callback(frame_name, result)
 
         if frame_id == 0x00:
             self.ezsp_version = result[0]
 
+    def _frame_name(self, frame):
+        if isinstance(frame, int):
+            return self.COMMANDS_BY_ID[frame][0]
+        return frame
+
+    def subscribe(self, frame, handler):
+        """Call handler(*args) for every unsolicited `frame`
+
+        `frame` is a frame name or frame ID. Returns an ID which can be passed
+        to unsubscribe.
+        """
+        frame_name = self._frame_name(frame)
+        id_ = next(self._subscription_ids)
+        self._subscriptions.setdefault(frame_name, {})[id_] = handler
+        self._subscription_frames[id_] = frame_name
+        return id_
+
+    def unsubscribe(self, id_):
+        frame_name = self._subscription_frames.pop(id_)
+        handlers = self._subscriptions[frame_name]
+        handler = handlers.pop(id_)
+        if not handlers:
+            del self._subscriptions[frame_name]
+        return handler
+
+    def wait_for(self, frame):
+        """Future for the arguments of the next unsolicited `frame`
+
+        Cancel the future to stop waiting.
+        """
+        frame_name = self._frame_name(frame)
+        future = asyncio.get_event_loop().create_future()
+        self._waiters.setdefault(frame_name, []).append(future)
+        future.add_done_callback(
+            functools.partial(self._remove_waiter, frame_name)
+        )
+        return future
+
+    def _remove_waiter(self, frame_name, future):
+        waiters = self._waiters.get(frame_name)
+        if waiters and future in waiters:
+            waiters.remove(future)
+            if not waiters:
+                del self._waiters[frame_name]
+
     def add_callback(self, cb):
+        """Call cb(frame_name, args) for every unsolicited frame"""
         id_ = hash(cb)
         while id_ in self._callbacks:
             id_ += 1
@@ -192,9 +572,23 @@ class EZSP:
     def remove_callback(self, id_):
         return self._callbacks.pop(id_)
 
-    def handle_callback(self, *args):
-        for callback_id, handler in self._callbacks.items():
+    def handle_callback(self, frame_name, args):
+        waiters = self._waiters.pop(frame_name, None)
+        if waiters:
+            for future in waiters:
+                if not future.done():
+                    future.set_result(args)
+
+        handlers = self._subscriptions.get(frame_name)
+        if handlers:
+            for handler in list(handlers.values()):
+                try:
+                    handler(*args)
+                except Exception as e:
+                    LOGGER.exception("Exception running handler", exc_info=e)
+
+        for handler in list(self._callbacks.values()):
             try:
-                handler(*args)
+                handler(frame_name, args)
             except Exception as e:
                 LOGGER.exception("Exception running handler", exc_info=e)
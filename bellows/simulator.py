@@ -0,0 +1,508 @@
+"""In-process NCP simulator
+
+Emulates an EmberZNet NCP and a network of virtual Zigbee devices, so that
+bellows can be exercised without a radio. The simulator speaks ASH and EZSP
+over an in-memory transport, and is selected with a sim:// URL in place of a
+serial port:
+
+    ezsp = bellows.ezsp.EZSP()
+    await ezsp.connect('sim://?devices=1000&latency=0.05&loss=0.01', 0)
+
+Supported query parameters are devices (number of virtual devices), latency
+and jitter (seconds a device takes to receive a request and to reply), loss
+(probability of a request or reply being lost), seed (for the random number
+generator), formed (0 to start without a network) and report_interval
+(seconds between attribute reports of every joined device).
+
+The virtual devices join when joining is permitted, and reply to the ZDO
+requests used for device initialization and to ZCL attribute reads and
+writes.
+"""
+
+import asyncio
+import logging
+import random
+import urllib.parse
+
+import bellows.types as t
+import bellows.uart as uart
+from bellows.commands import COMMANDS
+from bellows.zigbee.zcl import foundation
+from bellows.zigbee.zdo import types as zdo_t
+
+
+LOGGER = logging.getLogger(__name__)
+
+ZDO_ENDPOINT = 0
+ZHA_PROFILE = 0x0104
+EMBER_MANUFACTURER_CODE = 0x1002
+
+
+def _default(type_):
+    """Zero value of an EZSP type"""
+    if issubclass(type_, t.EzspStruct):
+        value = type_()
+        for field_name, field_type in type_._fields:
+            setattr(value, field_name, _default(field_type))
+        return value
+    if issubclass(type_, t.basic._FixedList):
+        return type_([_default(type_._itemtype)] * type_._length)
+    if issubclass(type_, t.basic._FixedBytes):
+        return type_(b'\x00' * type_._length)
+    if issubclass(type_, (list, bytes)):
+        return type_()
+    try:
+        return type_(0)
+    except ValueError:
+        return next(iter(type_))
+
+
+class VirtualDevice:
+    """A Zigbee device on the simulated network"""
+
+    def __init__(self, ieee, nwk, manufacturer=b'bellows', model=b'sim'):
+        self.ieee = ieee
+        self.nwk = nwk
+        self.joined = False
+        # endpoint: (profile, device type, input clusters, output clusters)
+        self.endpoints = {
+            1: (ZHA_PROFILE, 0x0100, [0x0000, 0x0006], []),
+        }
+        # cluster: {attribute: (ZCL data type, value)}
+        self.attributes = {
+            0x0000: {
+                0x0004: (0x42, t.LVBytes(manufacturer)),
+                0x0005: (0x42, t.LVBytes(model)),
+            },
+            0x0006: {
+                0x0000: (0x10, t.Bool.false),
+            },
+        }
+
+    def handle_request(self, aps_frame, message):
+        """Process a request, returning the reply APS frame and message
+
+        None is returned for requests which get no reply.
+        """
+        if aps_frame.destinationEndpoint == ZDO_ENDPOINT:
+            cluster_id = aps_frame.clusterId | 0x8000
+            message = self._zdo_request(aps_frame.clusterId, message)
+        else:
+            cluster_id = aps_frame.clusterId
+            message = self._zcl_request(aps_frame.clusterId, message)
+        if message is None:
+            return None
+
+        reply = t.EmberApsFrame(aps_frame)
+        reply.clusterId = t.uint16_t(cluster_id)
+        reply.sourceEndpoint = aps_frame.destinationEndpoint
+        reply.destinationEndpoint = aps_frame.sourceEndpoint
+        return reply, message
+
+    def _zdo_request(self, cluster_id, message):
+        tsn, data = message[:1], message[1:]
+        if cluster_id not in zdo_t.CLUSTERS:
+            return None
+        args, data = t.deserialize(data, zdo_t.CLUSTERS[cluster_id][2])
+
+        cid = zdo_t.CLUSTER_ID
+        if cluster_id == cid.Node_Desc_req:
+            response = (0, self.nwk, self._node_descriptor())
+        elif cluster_id == cid.Active_EP_req:
+            response = (0, self.nwk, [t.uint8_t(ep) for ep in sorted(self.endpoints)])
+        elif cluster_id == cid.Simple_Desc_req:
+            if args[1] not in self.endpoints:
+                # Status, address and an empty, zero length descriptor
+                status = zdo_t.Status.NOT_ACTIVE.value
+                return tsn + bytes([status]) + t.uint16_t(self.nwk).serialize() + b'\x00'
+            response = (0, self.nwk, self._simple_descriptor(args[1]))
+        elif cluster_id in (cid.NWK_addr_req, cid.IEEE_addr_req):
+            response = (0, self.ieee, self.nwk, 0, 0, [])
+        elif cluster_id in (
+            cid.Bind_req,
+            cid.Unbind_req,
+            cid.Mgmt_Leave_req,
+            cid.Mgmt_Permit_Joining_req,
+        ):
+            response = (0, )
+        else:
+            return None
+
+        return tsn + t.serialize(response, zdo_t.CLUSTERS[cluster_id | 0x8000][2])
+
+    def _node_descriptor(self):
+        descriptor = zdo_t.NodeDescriptor()
+        descriptor.byte1 = t.uint8_t(0x01)  # Router
+        descriptor.byte2 = t.uint8_t(0x40)  # 2.4 GHz
+        descriptor.mac_capability_flags = t.uint8_t(0x8e)
+        descriptor.manufacturer_code = t.uint16_t(EMBER_MANUFACTURER_CODE)
+        descriptor.maximum_buffer_size = t.uint8_t(82)
+        descriptor.maximum_incoming_transfer_size = t.uint16_t(82)
+        descriptor.server_mask = t.uint16_t(0)
+        descriptor.maximum_outgoing_transfer_size = t.uint16_t(82)
+        descriptor.descriptor_capability_field = t.uint8_t(0)
+        return descriptor
+
+    def _simple_descriptor(self, endpoint):
+        profile, device_type, in_clusters, out_clusters = self.endpoints[endpoint]
+        descriptor = zdo_t.SizePrefixedSimpleDescriptor()
+        descriptor.endpoint = t.uint8_t(endpoint)
+        descriptor.profile = t.uint16_t(profile)
+        descriptor.device_type = t.uint16_t(device_type)
+        descriptor.device_version = t.uint8_t(0)
+        descriptor.input_clusters = t.LVList(t.uint16_t)(map(t.uint16_t, in_clusters))
+        descriptor.output_clusters = t.LVList(t.uint16_t)(map(t.uint16_t, out_clusters))
+        return descriptor
+
+    def _zcl_request(self, cluster_id, message):
+        frame_control = message[0]
+        if frame_control & 0b1000:
+            # Not a request
+            return None
+        offset = 3 if frame_control & 0b0100 else 1
+        tsn, command_id = message[offset], message[offset + 1]
+        data = message[offset + 2:]
+        attributes = self.attributes.setdefault(cluster_id, {})
+
+        if frame_control & 0b0011 == 0 and command_id == 0x00:
+            attrids, _ = t.List(t.uint16_t).deserialize(data)
+            response_id = 0x01
+            response = b''
+            for attrid in attrids:
+                response += t.uint16_t(attrid).serialize()
+                if attrid in attributes:
+                    type_id, value = attributes[attrid]
+                    response += bytes([0, type_id]) + value.serialize()
+                else:
+                    response += bytes([foundation.Status.UNSUPPORTED_ATTRIBUTE])
+        elif frame_control & 0b0011 == 0 and command_id in (0x02, 0x03, 0x05):
+            records, _ = t.List(foundation.Attribute).deserialize(data)
+            response_id = 0x04
+            response = b''
+            for record in records:
+                attributes[record.attrid] = (record.value.type, record.value.value)
+                response += bytes([0]) + t.uint16_t(record.attrid).serialize()
+            if command_id == 0x05:
+                return None
+        else:
+            if frame_control & 0b00010000:
+                # Default response disabled
+                return None
+            response_id = 0x0b
+            response = bytes([command_id, foundation.Status.SUCCESS])
+
+        # Server to client, default response disabled
+        return bytes([0b00011000, tsn, response_id]) + response
+
+    def attribute_report(self, cluster_id, attrid, endpoint=1):
+        """Report attributes frame of the current value of an attribute"""
+        aps_frame = t.EmberApsFrame()
+        aps_frame.profileId = t.uint16_t(self.endpoints[endpoint][0])
+        aps_frame.clusterId = t.uint16_t(cluster_id)
+        aps_frame.sourceEndpoint = t.uint8_t(endpoint)
+        aps_frame.destinationEndpoint = t.uint8_t(1)
+        aps_frame.options = t.EmberApsOption(0)
+        aps_frame.groupId = t.uint16_t(0)
+        aps_frame.sequence = t.uint8_t(0)
+        type_id, value = self.attributes[cluster_id][attrid]
+        message = bytes([0b00011000, 0, 0x0a])
+        message += t.uint16_t(attrid).serialize() + bytes([type_id])
+        message += value.serialize()
+        return aps_frame, message
+
+
+class _NcpGateway(uart.Gateway):
+    """The NCP end of the ASH connection"""
+
+    def rst_frame_received(self, data):
+        LOGGER.debug("Simulated NCP reset")
+        self._send_seq = 0
+        self._rec_seq = 0
+        self._clear_unacked()
+        self._cancel_delayed_ack()
+        self._application.reset()
+        # Version 2, software reset
+        self.write(self._frame(b'\xC1', b'\x02\x0B'))
+
+    def connection_lost(self, exc):
+        self.close()
+
+
+class Simulator:
+    """An emulated NCP, with virtual devices on its network"""
+
+    EZSP_VERSION = 4
+
+    def __init__(self, devices=0, latency=0.0, jitter=0.0, loss=0.0,
+                 seed=None, formed=True, report_interval=None, loop=None):
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        self._loop = loop
+        self._random = random.Random(seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.report_interval = report_interval
+        self.formed = formed
+        self.ieee = self._eui64(0)
+        self.nwk = 0x0000
+        self.config = {}
+        self.devices = {}
+        for i in range(devices):
+            device = VirtualDevice(self._eui64(i + 1), i + 1)
+            self.devices[device.nwk] = device
+        self._gw = None
+        self._seq = 0
+        self._closed = False
+        self._report_handle = None
+        self.COMMANDS_BY_ID = {
+            details[0]: (name, details[1], details[2])
+            for name, details in COMMANDS.items()
+        }
+
+    @staticmethod
+    def _eui64(index):
+        return t.EmberEUI64((0x000d6f0000000000 + index).to_bytes(8, 'big'))
+
+    def connect(self, protocol_factory):
+        """Connect a host protocol, returning its transport and itself"""
+        protocol = protocol_factory()
+        host_transport = LoopbackTransport(self._loop, protocol, self)
+        self._gw = _NcpGateway(self, self._loop.create_future(),
+                               window_size=7, ack_frames=1)
+        ncp_transport = LoopbackTransport(self._loop, self._gw, self)
+        host_transport.set_peer(ncp_transport)
+        ncp_transport.set_peer(host_transport)
+        self._gw.connection_made(ncp_transport)
+        protocol.connection_made(host_transport)
+        return host_transport, protocol
+
+    def close(self):
+        self._closed = True
+        if self._report_handle is not None:
+            self._report_handle.cancel()
+            self._report_handle = None
+
+    def reset(self):
+        """The host reset the NCP"""
+        self.config = {}
+
+    def enter_failed_state(self, error):
+        LOGGER.error("Simulated NCP link failure: %s", error)
+
+    def frame_received(self, data):
+        """Handle an EZSP command frame from the host"""
+        self._seq, frame_id, data = data[0], data[2], data[3:]
+        if frame_id == 0xFF:
+            frame_id, data = data[1], data[2:]
+        name, request_schema, response_schema = self.COMMANDS_BY_ID[frame_id]
+        args, _ = t.deserialize(data, request_schema)
+        LOGGER.debug("Simulated NCP command %s: %s", name, args)
+
+        handler = getattr(self, '_cmd_' + name, None)
+        if handler is None:
+            response = [_default(type_) for type_ in response_schema]
+        else:
+            response = handler(*args)
+        self._send(0x80, frame_id, t.serialize(response, response_schema))
+
+    def _send(self, frame_control, frame_id, data):
+        if self._closed:
+            return
+        self._gw.data(bytes([self._seq, frame_control, frame_id]) + data)
+
+    def callback(self, name, *args):
+        """Send a callback frame to the host"""
+        frame_id, _, schema = COMMANDS[name]
+        self._send(0x90, frame_id, t.serialize(args, schema))
+
+    def _delay(self):
+        return self.latency + self._random.uniform(0, self.jitter)
+
+    def _lost(self):
+        return self.loss and self._random.random() < self.loss
+
+    def _call_later(self, callback, *args):
+        self._loop.call_later(self._delay(), self._run, callback, args)
+
+    def _run(self, callback, args):
+        if not self._closed:
+            callback(*args)
+
+    def _cmd_version(self, version):
+        return (self.EZSP_VERSION, 2, 0x5a00)
+
+    def _cmd_getConfigurationValue(self, config_id):  # noqa: N802
+        return (t.EzspStatus.SUCCESS, self.config.get(config_id, 0))
+
+    def _cmd_setConfigurationValue(self, config_id, value):  # noqa: N802
+        self.config[config_id] = value
+        return (t.EzspStatus.SUCCESS, )
+
+    def _cmd_networkInit(self):  # noqa: N802
+        if not self.formed:
+            return (t.EmberStatus.NOT_JOINED, )
+        self._call_later(self.callback, 'stackStatusHandler', t.EmberStatus.NETWORK_UP)
+        self._schedule_reports()
+        return (t.EmberStatus.SUCCESS, )
+
+    def _cmd_formNetwork(self, parameters):  # noqa: N802
+        self.formed = True
+        self._call_later(self.callback, 'stackStatusHandler', t.EmberStatus.NETWORK_UP)
+        self._schedule_reports()
+        return (t.EmberStatus.SUCCESS, )
+
+    def _cmd_leaveNetwork(self):  # noqa: N802
+        self.formed = False
+        self._call_later(self.callback, 'stackStatusHandler', t.EmberStatus.NETWORK_DOWN)
+        return (t.EmberStatus.SUCCESS, )
+
+    def _cmd_getNetworkParameters(self):  # noqa: N802
+        parameters = _default(t.EmberNetworkParameters)
+        if not self.formed:
+            return (t.EmberStatus.NOT_JOINED, t.EmberNodeType.UNKNOWN_DEVICE, parameters)
+        parameters.panId = t.uint16_t(0x1234)
+        parameters.radioChannel = t.uint8_t(15)
+        return (t.EmberStatus.SUCCESS, t.EmberNodeType.COORDINATOR, parameters)
+
+    def _cmd_getNodeId(self):  # noqa: N802
+        return (self.nwk, )
+
+    def _cmd_getEui64(self):  # noqa: N802
+        return (self.ieee, )
+
+    def _cmd_permitJoining(self, duration):  # noqa: N802
+        if duration:
+            for device in self.devices.values():
+                if not device.joined:
+                    self._call_later(self._join, device)
+        return (t.EmberStatus.SUCCESS, )
+
+    def _cmd_sendUnicast(self, message_type, nwk, aps_frame, tag, message):  # noqa: N802
+        device = self.devices.get(nwk)
+        if device is None or not device.joined or self._lost():
+            status = t.EmberStatus.DELIVERY_FAILED
+        else:
+            status = t.EmberStatus.SUCCESS
+            reply = device.handle_request(aps_frame, message)
+            if reply is not None and not self._lost():
+                self._loop.call_later(
+                    2 * self._delay(),
+                    self._run,
+                    self._incoming_message,
+                    (device, ) + reply,
+                )
+        self._call_later(
+            self.callback,
+            'messageSentHandler',
+            message_type,
+            nwk,
+            aps_frame,
+            tag,
+            status,
+            b'',
+        )
+        return (t.EmberStatus.SUCCESS, tag)
+
+    def _join(self, device):
+        if device.joined:
+            return
+        device.joined = True
+        self.callback(
+            'trustCenterJoinHandler',
+            device.nwk,
+            device.ieee,
+            t.EmberDeviceUpdate.STANDARD_SECURITY_UNSECURED_JOIN,
+            t.EmberJoinDecision.USE_PRECONFIGURED_KEY,
+            self.nwk,
+        )
+
+    def _incoming_message(self, device, aps_frame, message):
+        self.callback(
+            'incomingMessageHandler',
+            t.EmberIncomingMessageType.INCOMING_UNICAST,
+            aps_frame,
+            255,
+            -30,
+            device.nwk,
+            0xff,
+            0xff,
+            message,
+        )
+
+    def report(self, device, cluster_id, attrid):
+        """Send an attribute report from a device"""
+        self._incoming_message(device, *device.attribute_report(cluster_id, attrid))
+
+    def _schedule_reports(self):
+        if self.report_interval is None or self._report_handle is not None:
+            return
+        self._report_handle = self._loop.call_later(
+            self.report_interval,
+            self._send_reports,
+        )
+
+    def _send_reports(self):
+        self._report_handle = None
+        if self._closed:
+            return
+        for device in self.devices.values():
+            if device.joined and not self._lost():
+                self.report(device, 0x0006, 0x0000)
+        self._schedule_reports()
+
+
+class LoopbackTransport(asyncio.Transport):
+    """One end of an in-memory byte stream between two protocols"""
+
+    def __init__(self, loop, protocol, simulator):
+        super().__init__(extra={'simulator': simulator})
+        self._loop = loop
+        self._protocol = protocol
+        self._peer = None
+        self._closing = False
+
+    def set_peer(self, peer):
+        self._peer = peer
+
+    def write(self, data):
+        if self._closing:
+            return
+        self._loop.call_soon(self._peer._protocol.data_received, bytes(data))
+
+    def close(self):
+        if self._closing:
+            return
+        self._closing = True
+        self.get_extra_info('simulator').close()
+        self._loop.call_soon(self._protocol.connection_lost, None)
+        self._peer.close()
+
+    def is_closing(self):
+        return self._closing
+
+
+def _parse_url(url):
+    """Simulator arguments from a sim:// URL"""
+    query = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)
+    converters = {
+        'devices': int,
+        'latency': float,
+        'jitter': float,
+        'loss': float,
+        'seed': int,
+        'formed': lambda v: v not in ('0', 'false', 'no'),
+        'report_interval': float,
+    }
+    kwargs = {}
+    for name, values in query.items():
+        if name not in converters:
+            raise ValueError("Unknown simulator parameter: %s" % (name, ))
+        kwargs[name] = converters[name](values[-1])
+    return kwargs
+
+
+async def create_connection(loop, protocol_factory, url):
+    """Connect a protocol to a new simulator, configured by a sim:// URL"""
+    simulator = Simulator(loop=loop, **_parse_url(url))
+    return simulator.connect(protocol_factory)
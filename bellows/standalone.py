@@ -7,6 +7,9 @@ import json
 import logging
 import websockets
 
+import bellows.zigbee.counters
+import bellows.zigbee.scheduler
+
 
 log = logging.getLogger(__name__)
 
@@ -39,14 +42,15 @@ class RestServer:
         for method, endpoints in self.mapping.items():
             for epname, epfun in endpoints.items():
                 self.wapp.router.add_route(method, epname, self._rwrap(epfun))
+        self.wapp.router.add_route('GET', '/metrics', self._get_metrics)
 
     def _rwrap(self, handler_func):
         """Errors are handled and put in json format. """
         @functools.wraps(handler_func)
-        def wrapper(request):
+        async def wrapper(request):
             error_code = None
             try:
-                result = yield from handler_func(request)
+                result = await handler_func(request)
             except web.HTTPClientError as e:
                 log.warning('Http error: %r %r', e.status_code, e.reason,
                             exc_info=True)
@@ -71,13 +75,20 @@ class RestServer:
 
         return wrapper
 
-    @asyncio.coroutine
-    def _get_index(self, request):
+    async def _get_metrics(self, request):
+        """Prometheus metrics of the NCP counters and request scheduler"""
+        body = bellows.zigbee.scheduler.prometheus(self.app.scheduler)
+        if self.app.counters is not None:
+            body += bellows.zigbee.counters.prometheus(self.app.counters)
+        response = web.Response(body=body.encode('utf-8'))
+        response.headers['Content-Type'] = 'text/plain; version=0.0.4'
+        return response
+
+    async def _get_index(self, request):
         log.info('Get config')
         return dict(answer=42)
 
-    @asyncio.coroutine
-    def _reinit_light(self, request):
+    async def _reinit_light(self, request):
         log.info('Reinit light')
         print([hex(d.nwk) for d in self.app.devices.values()])
         try:
@@ -86,23 +97,21 @@ class RestServer:
                 light = self.app.get_device(nwk=light_id)
             except KeyError:
                 raise web.HTTPNotFound()
-            yield from light.refresh_endpoints()
+            await light.refresh_endpoints()
         except json.decoder.JSONDecodeError as err:
             log.info("Invalid json data")
         finally:
             pass
         return dict()
 
-    @asyncio.coroutine
-    def _get_light(self, request):
+    async def _get_light(self, request):
         log.info('Get light')
         return dict(answer=42)
 
-    @asyncio.coroutine
-    def _put_config(self, request):
+    async def _put_config(self, request):
         log.info('Put config')
         try:
-            data = yield from request.json()
+            data = await request.json()
             if "permitjoin" in data:
                 self.app.permit(int(data["permitjoin"]))
                 log.info('Permitting join for %d seconds.', int(data["permitjoin"]))
@@ -112,8 +121,7 @@ class RestServer:
             pass
         return dict()
 
-    @asyncio.coroutine
-    def _put_light(self, request):
+    async def _put_light(self, request):
         log.info('Put light')
         try:
             light_id = int(request.match_info['id'], 16)
@@ -122,26 +130,25 @@ class RestServer:
             except KeyError:
                 log.info(str([hex(d.nwk) for d in self.app.devices.values()]))
                 raise web.HTTPNotFound()
-            data = yield from request.json()
+            data = await request.json()
             if "on" in data:
                 if data["on"]:
                     log.info('Turn light on')
-                    yield from light[1].on_off.on()
+                    await light[1].on_off.on()
                 else:
                     log.info('Turn light off')
-                    yield from light[1].on_off.off()
+                    await light[1].on_off.off()
         except json.decoder.JSONDecodeError as err:
             log.info("Invalid json data")
         finally:
             pass
         return dict()
 
-    @asyncio.coroutine
-    def start(self):
+    async def start(self):
         """Start."""
         loop = asyncio.get_event_loop()
-        self.srv = yield from loop.create_server(self.wapp.make_handler(),
-                                                 self.host, self.port)
+        self.srv = await loop.create_server(self.wapp.make_handler(),
+                                            self.host, self.port)
 
     def shutdown(self):
         """Shutdown."""
@@ -158,17 +165,15 @@ class WsConnection:
         self.socket = socket
         self.path = path
 
-    @asyncio.coroutine
-    def _handle_message(self, message):
+    async def _handle_message(self, message):
         """Handle message."""
         pass
 
-    @asyncio.coroutine
-    def handle(self):
+    async def handle(self):
         """Handle connection."""
         while True:
-            message = yield from self.socket.recv()
-            yield from self._handle_message(message)
+            message = await self.socket.recv()
+            await self._handle_message(message)
 
 
 class WsServer:
@@ -183,25 +188,22 @@ class WsServer:
         self.srv = None
         self.connected = set()
 
-    @asyncio.coroutine
-    def start(self):
+    async def start(self):
         """Start."""
-        self.srv = yield from websockets.serve(self._handler,
-                                               self.host, self.port)
+        self.srv = await websockets.serve(self._handler,
+                                          self.host, self.port)
 
-    @asyncio.coroutine
-    def broadcast(self, *args, **kwargs):
+    async def broadcast(self, *args, **kwargs):
         """Write to all sockets."""
         for conn in self.connected:
-            yield from conn.socket.send(*args, **kwargs)
+            await conn.socket.send(*args, **kwargs)
 
-    @asyncio.coroutine
-    def _handler(self, socket, path):
+    async def _handler(self, socket, path):
         """Handle connection."""
         conn = WsConnection(self, socket, path)
         self.connected.add(conn)
         try:
-            yield from conn.handle()
+            await conn.handle()
         finally:
             self.connected.remove(conn)
 
@@ -214,8 +216,7 @@ class WsServer:
         self.broadcast("OK")
 
 
-@asyncio.coroutine
-def start(ctx):
+async def start(ctx):
     """Start websocket server."""
     ctx.obj['wsserver'] = WsServer(ctx.obj['app'],
                                    ctx.obj['wshost'],
@@ -224,12 +225,15 @@ def start(ctx):
                                        ctx.obj['resthost'],
                                        ctx.obj['restport'],
                                        ctx.obj['rest_api_key'])
-    yield from ctx.obj['wsserver'].start()
-    yield from ctx.obj['restserver'].start()
-    yield from ctx.obj['app'].startup(auto_form=True)
+    await ctx.obj['wsserver'].start()
+    await ctx.obj['restserver'].start()
+    await ctx.obj['app'].startup(auto_form=True)
+    ctx.obj['app'].start_counter_sampler()
 
 
 def shutdown(ctx):
     """Shutdown servers."""
+    if ctx.obj['app'].counters is not None:
+        ctx.obj['app'].counters.stop()
     ctx.obj['restserver'].shutdown()
     ctx.obj['wsserver'].shutdown()
@@ -1,14 +1,16 @@
 from .basic import *  # noqa: F401,F403
 from .named import *  # noqa: F401,F403
 from .struct import *  # noqa: F401,F403
+from .codec import Schema  # noqa: F401
 
 
 def deserialize(data, schema):
     result = []
+    offset = 0
     for type_ in schema:
-        value, data = type_.deserialize(data)
+        value, offset = type_.deserialize_from(data, offset)
         result.append(value)
-    return result, data
+    return result, data[offset:]
 
 
 def serialize(data, schema):
@@ -1,18 +1,101 @@
+import functools
 import struct
 
 
+_INT_FORMATS = {
+    (1, False): 'B',
+    (1, True): 'b',
+    (2, False): 'H',
+    (2, True): 'h',
+    (4, False): 'I',
+    (4, True): 'i',
+    (8, False): 'Q',
+    (8, True): 'q',
+}
+
+
+def _owner(cls, name):
+    """The class in the MRO of cls which defines name"""
+    for klass in cls.__mro__:
+        if name in klass.__dict__:
+            return klass
+
+
+def _append(value, items):
+    items.append(value)
+
+
 class int_t(int):  # noqa: N801
     _signed = True
+    # Value to member table of enums, see named.py
+    _members = None
 
     def serialize(self):
         return self.to_bytes(self._size, 'little', signed=self._signed)
 
     @classmethod
     def deserialize(cls, data):
+        r, offset = cls.deserialize_from(data, 0)
+        return r, data[offset:]
+
+    @classmethod
+    def deserialize_from(cls, data, offset):
+        end = offset + cls._size
         # Work around https://bugs.python.org/issue23640
-        r = cls(int.from_bytes(data[:cls._size], 'little', signed=cls._signed))
-        data = data[cls._size:]
-        return r, data
+        value = int.from_bytes(data[offset:end], 'little', signed=cls._signed)
+        members = cls._members
+        if members is None:
+            return cls(value), end
+        if value in members:
+            return members[value], end
+        return cls._member(value), end
+
+    @classmethod
+    def _member(cls, value):
+        """Enum member with the given value
+
+        A value missing from the enum is decoded into a pseudo-member named
+        after the value, so that a single unknown status does not make the
+        whole frame undecodable. Calling the enum with such a value still
+        raises ValueError.
+        """
+        try:
+            return cls._members[value]
+        except KeyError:
+            pass
+        member = int.__new__(cls, value)
+        member._name_ = 'undefined_0x%02x' % (value, )
+        member._value_ = value
+        return member
+
+    @classmethod
+    def _fixed_codec(cls):
+        """struct format, encoder and decoder of a fixed-width type, or None
+
+        encode(value, items) appends the struct items of value to items, and
+        decode(items, i) builds a value from items[i:] and returns it together
+        with the index of the next item. Types which customise their wire
+        format return None.
+        """
+        if any(_owner(cls, name) is not int_t
+               for name in ('serialize', 'deserialize', 'deserialize_from')):
+            return None
+        fmt = _INT_FORMATS.get((cls._size, cls._signed))
+        if fmt is None:
+            return None
+
+        members = cls._members
+        if members is None:
+            def decode(items, i):
+                return cls(items[i]), i + 1
+        else:
+            def decode(items, i):
+                value = items[i]
+                if value in members:
+                    return members[value], i + 1
+                return cls._member(value), i + 1
+
+        return fmt, _append, decode
 
 
 class int8s(int_t):  # noqa: N801
@@ -89,7 +172,12 @@ class Single(float):
 
     @classmethod
     def deserialize(cls, data):
-        return struct.unpack('<f', data)[0], data[4:]
+        r, offset = cls.deserialize_from(data, 0)
+        return r, data[offset:]
+
+    @classmethod
+    def deserialize_from(cls, data, offset):
+        return struct.unpack_from('<f', data, offset)[0], offset + 4
 
 
 class Double(float):
@@ -98,7 +186,12 @@ class Double(float):
 
     @classmethod
     def deserialize(cls, data):
-        return struct.unpack('<d', data)[0], data[8:]
+        r, offset = cls.deserialize_from(data, 0)
+        return r, data[offset:]
+
+    @classmethod
+    def deserialize_from(cls, data, offset):
+        return struct.unpack_from('<d', data, offset)[0], offset + 8
 
 
 class LVBytes(bytes):
@@ -109,25 +202,65 @@ class LVBytes(bytes):
 
     @classmethod
     def deserialize(cls, data):
-        l = int.from_bytes(data[:1], 'little')
-        s = data[1:l + 1]
-        return s, data[l + 1:]
+        r, offset = cls.deserialize_from(data, 0)
+        return r, data[offset:]
+
+    @classmethod
+    def deserialize_from(cls, data, offset):
+        length = int.from_bytes(data[offset:offset + 1], 'little')
+        end = offset + 1 + length
+        return bytes(data[offset + 1:end]), end
+
+
+def _int_format(itemtype):
+    """struct format character of a plain integer item type, or None"""
+    if isinstance(itemtype, type) and issubclass(itemtype, int_t):
+        codec = itemtype._fixed_codec()
+        if codec is not None:
+            return codec[0]
+    return None
 
 
 class _List(list):
     _length = None
+    # Set for lists of plain integers, which are packed and unpacked with
+    # a single struct call
+    _item_format = None
 
     def serialize(self):
         assert self._length is None or len(self) == self._length
+        if self._item_format is not None:
+            try:
+                return struct.pack('<%d%s' % (len(self), self._item_format), *self)
+            except struct.error:
+                # Raise the errors of the generic path
+                pass
         return b''.join([i.serialize() for i in self])
 
     @classmethod
     def deserialize(cls, data):
-        r = cls()
-        while data:
-            item, data = r._itemtype.deserialize(data)
+        r, offset = cls.deserialize_from(data, 0)
+        return r, data[offset:]
+
+    @classmethod
+    def deserialize_from(cls, data, offset):
+        end = len(data)
+        if cls._item_format is not None and offset < end:
+            r, offset = cls._unpack(data, offset, (end - offset) // cls._itemtype._size)
+        else:
+            r = cls()
+        # Anything left is a truncated item
+        while offset < end:
+            item, offset = r._itemtype.deserialize_from(data, offset)
             r.append(item)
-        return r, data
+        return r, offset
+
+    @classmethod
+    def _unpack(cls, data, offset, count):
+        values = struct.unpack_from('<%d%s' % (count, cls._item_format), data, offset)
+        itemtype = cls._itemtype
+        convert = itemtype if itemtype._members is None else itemtype._member
+        return cls(map(convert, values)), offset + count * itemtype._size
 
 
 class _LVList(_List):
@@ -137,40 +270,134 @@ class _LVList(_List):
         return head + data
 
     @classmethod
-    def deserialize(cls, data):
+    def deserialize_from(cls, data, offset):
+        length = data[offset]
+        offset += 1
+        if cls._item_format is not None and \
+                offset + length * cls._itemtype._size <= len(data):
+            return cls._unpack(data, offset, length)
         r = cls()
-        length, data = data[0], data[1:]
         for i in range(length):
-            item, data = r._itemtype.deserialize(data)
+            item, offset = r._itemtype.deserialize_from(data, offset)
             r.append(item)
-        return r, data
+        return r, offset
 
 
+@functools.lru_cache(maxsize=None)
 def List(itemtype):  # noqa: N802
     class List(_List):
         _itemtype = itemtype
+        _item_format = _int_format(itemtype)
     return List
 
 
+@functools.lru_cache(maxsize=None)
 def LVList(itemtype):  # noqa: N802
     class LVList(_LVList):
         _itemtype = itemtype
+        _item_format = _int_format(itemtype)
     return LVList
 
 
 class _FixedList(_List):
     @classmethod
-    def deserialize(cls, data):
+    def deserialize_from(cls, data, offset):
+        if cls._item_format is not None and \
+                offset + cls._length * cls._itemtype._size <= len(data):
+            return cls._unpack(data, offset, cls._length)
         r = cls()
         for i in range(r._length):
-            item, data = r._itemtype.deserialize(data)
+            item, offset = r._itemtype.deserialize_from(data, offset)
             r.append(item)
-        return r, data
-
+        return r, offset
 
+    @classmethod
+    def _fixed_codec(cls):
+        if _owner(cls, 'serialize') is not _List or \
+                _owner(cls, 'deserialize_from') is not _FixedList:
+            return None
+        length, itemtype = cls._length, cls._itemtype
+        if not issubclass(itemtype, int_t):
+            return None
+        item = itemtype._fixed_codec()
+        if item is None:
+            return None
+        convert = itemtype if itemtype._members is None else itemtype._member
+
+        def encode(value, items):
+            if len(value) != length or type(value).serialize is not _List.serialize:
+                raise struct.error("not a list of %d items" % (length, ))
+            items.extend(value)
+
+        def decode(items, i):
+            end = i + length
+            return cls(map(convert, items[i:end])), end
+
+        return '%d%s' % (length, item[0]), encode, decode
+
+
+@functools.lru_cache(maxsize=None)
 def fixed_list(length, itemtype):
     class FixedList(_FixedList):
         _length = length
         _itemtype = itemtype
+        _item_format = _int_format(itemtype)
 
     return FixedList
+
+
+class _FixedBytes(bytes):
+    _length = None
+
+    def serialize(self):
+        assert len(self) == self._length
+        return bytes(self)
+
+    @classmethod
+    def deserialize(cls, data):
+        r, offset = cls.deserialize_from(data, 0)
+        return r, data[offset:]
+
+    @classmethod
+    def deserialize_from(cls, data, offset):
+        end = offset + cls._length
+        return cls(cls._octets(data, offset, end)), end
+
+    @classmethod
+    def _octets(cls, data, offset, end):
+        r = data[offset:end]
+        if len(r) < cls._length:
+            # Zero filled, like the integer types
+            r = bytes(r).ljust(cls._length, b'\x00')
+        return r
+
+    @classmethod
+    def _fixed_codec(cls):
+        if _owner(cls, 'serialize') is not _FixedBytes or \
+                _owner(cls, 'deserialize_from') is not _FixedBytes:
+            return None
+        length = cls._length
+
+        def encode(value, items):
+            if len(value) != length or \
+                    getattr(type(value), 'serialize', None) is not _FixedBytes.serialize:
+                raise struct.error("not %d octets" % (length, ))
+            items.append(value)
+
+        def decode(items, i):
+            return cls(items[i]), i + 1
+
+        return '%ds' % (length, ), encode, decode
+
+    def __repr__(self):
+        return ':'.join('%02x' % b for b in self)
+
+    __str__ = __repr__
+
+
+@functools.lru_cache(maxsize=None)
+def fixed_bytes(length):
+    class FixedBytes(_FixedBytes):
+        _length = length
+
+    return FixedBytes
@@ -0,0 +1,88 @@
+import struct
+
+
+def _fixed_codec(type_):
+    codec = getattr(type_, '_fixed_codec', None)
+    if codec is None:
+        return None
+    return codec()
+
+
+class Schema(tuple):
+    """A tuple of types, compiled into a codec on first use
+
+    The longest prefix of fixed-width types, such as integers and structs
+    made only of fixed-width fields, is packed and unpacked with a single
+    struct.Struct. The remaining types use their own serialize and
+    deserialize methods. Values and errors are the same as those of
+    bellows.types.serialize and bellows.types.deserialize.
+    """
+    _prefix = None
+
+    def _compile(self):
+        fmt = '<'
+        fields = []
+        for type_ in self:
+            codec = _fixed_codec(type_)
+            if codec is None:
+                break
+            fmt += codec[0]
+            fields.append((type_, codec[1], codec[2]))
+
+        self._prefix_fields = fields
+        self._rest = self[len(fields):]
+        self._prefix = struct.Struct(fmt)
+
+    def serialize(self, values):
+        if self._prefix is None:
+            self._compile()
+        if len(values) != len(self):
+            return self._serialize(values)
+
+        items = []
+        try:
+            for (type_, encode, _), value in zip(self._prefix_fields, values):
+                if type(value) is not type_:
+                    # Validates enums and copies structs, like the generic path
+                    value = type_(value)
+                encode(value, items)
+            data = self._prefix.pack(*items)
+        except struct.error:
+            # Raise the errors of the generic path
+            return self._serialize(values)
+
+        n = len(self._prefix_fields)
+        return data + b''.join(
+            t(v).serialize() for t, v in zip(self._rest, values[n:])
+        )
+
+    def _serialize(self, values):
+        return b''.join(t(v).serialize() for t, v in zip(self, values))
+
+    def deserialize(self, data):
+        if self._prefix is None:
+            self._compile()
+        prefix = self._prefix
+        if len(data) < prefix.size:
+            return self._deserialize(data)
+
+        raw = prefix.unpack_from(data)
+        result = []
+        i = 0
+        for _, _, decode in self._prefix_fields:
+            value, i = decode(raw, i)
+            result.append(value)
+
+        offset = prefix.size
+        for type_ in self._rest:
+            value, offset = type_.deserialize_from(data, offset)
+            result.append(value)
+        return result, data[offset:]
+
+    def _deserialize(self, data):
+        result = []
+        offset = 0
+        for type_ in self:
+            value, offset = type_.deserialize_from(data, offset)
+            result.append(value)
+        return result, data[offset:]
@@ -1,4 +1,5 @@
 import enum
+import struct
 
 from . import basic
 
@@ -46,22 +47,37 @@ class EmberMulticastId(basic.uint16_t):
     pass
 
 
-class EmberEUI64(basic.fixed_list(8, basic.uint8_t)):
-    # EUI 64-bit ID (an IEEE address).
+class EmberEUI64(basic._FixedBytes):
+    # EUI 64-bit ID (an IEEE address), most significant byte first. It is
+    # transmitted least significant byte first.
+    _length = 8
+
     @classmethod
-    def deserialize(cls, data):
-        r, data = super().deserialize(data)
-        return cls(r[::-1]), data
+    def deserialize_from(cls, data, offset):
+        end = offset + 8
+        return cls(cls._octets(data, offset, end)[::-1]), end
 
     def serialize(self):
         assert self._length == len(self)
-        return b''.join([i.serialize() for i in self[::-1]])
+        return self[::-1]
+
+    @classmethod
+    def _fixed_codec(cls):
+        def encode(value, items):
+            if len(value) != 8 or \
+                    getattr(type(value), 'serialize', None) is not EmberEUI64.serialize:
+                raise struct.error("not an EUI64")
+            items.append(value[::-1])
+
+        def decode(items, i):
+            return cls(items[i][::-1]), i + 1
+
+        return '8s', encode, decode
 
     def __repr__(self):
-        return ':'.join('%02x' % i for i in self)
+        return '%02x:%02x:%02x:%02x:%02x:%02x:%02x:%02x' % tuple(self)
 
-    def __hash__(self):
-        return hash(repr(self))
+    __str__ = __repr__
 
 
 class EmberLibraryStatus(basic.uint8_t):
@@ -1676,3 +1692,13 @@ class EmberNetworkInitBitmask(basic.uint16_t):
     # Save parent info (node ID and EUI64) in a token during joining/rejoin,
     # and restore on reboot.
     NETWORK_INIT_PARENT_INFO_IN_TOKEN = 0x0001
+
+
+def _member_tables():
+    """Precompute the value to member table of every enum in this module"""
+    for type_ in list(globals().values()):
+        if isinstance(type_, enum.EnumMeta) and issubclass(type_, basic.int_t):
+            type_._members = {member.value: member for member in type_}
+
+
+_member_tables()
@@ -1,15 +1,95 @@
+import struct
+
 from . import basic
 from . import named
 
 
-class EzspStruct:
+class _EzspStructMeta(type):
+    """Generates __slots__ for the fields of each struct"""
+    def __new__(mcls, name, bases, namespace):  # noqa: N804
+        if '__slots__' not in namespace:
+            inherited = set()
+            for base in bases:
+                for klass in base.__mro__:
+                    inherited.update(klass.__dict__.get('__slots__', ()))
+            namespace['__slots__'] = tuple(
+                field[0] for field in namespace.get('_fields', ())
+                if field[0] not in inherited and field[0] not in namespace
+            )
+        # Compiled on first use, see EzspStruct._compile
+        namespace['_layout'] = None
+        return super().__new__(mcls, name, bases, namespace)
+
+
+class EzspStruct(metaclass=_EzspStructMeta):
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         if len(args) == 1 and isinstance(args[0], self.__class__):
             # copy constructor
             for field in self._fields:
                 setattr(self, field[0], getattr(args[0], field[0]))
 
+    @classmethod
+    def _compile(cls):
+        """Pack structs made only of fixed-width fields with a struct.Struct
+
+        Anything else, like a struct with a list of variable length, keeps
+        using the serialize and deserialize methods of every field.
+        """
+        codec = cls._fixed_codec()
+        if codec is None:
+            cls._layout = False
+        else:
+            fmt, encode, decode = codec
+            cls._layout = (struct.Struct('<' + fmt), encode, decode)
+        return cls._layout
+
+    @classmethod
+    def _fixed_codec(cls):
+        if any(basic._owner(cls, name) is not EzspStruct
+               for name in ('serialize', 'deserialize', 'deserialize_from')):
+            return None
+        fmt = ''
+        encoders = []
+        decoders = []
+        for field_name, field_type in cls._fields:
+            codec = getattr(field_type, '_fixed_codec', None)
+            codec = codec() if codec is not None else None
+            if codec is None:
+                return None
+            fmt += codec[0]
+            encoders.append((field_name, codec[1]))
+            decoders.append((field_name, codec[2]))
+
+        def encode(value, items):
+            if type(value) is not cls:
+                raise struct.error("not a %s" % (cls.__name__, ))
+            for field_name, field_encode in encoders:
+                field_encode(getattr(value, field_name), items)
+
+        def decode(items, i):
+            r = cls()
+            for field_name, field_decode in decoders:
+                v, i = field_decode(items, i)
+                setattr(r, field_name, v)
+            return r, i
+
+        return fmt, encode, decode
+
     def serialize(self):
+        layout = self._layout
+        if layout is None:
+            layout = self._compile()
+        if layout:
+            items = []
+            try:
+                layout[1](self, items)
+                return layout[0].pack(*items)
+            except struct.error:
+                # Raise the errors of the generic path
+                pass
+
         r = b''
         for field in self._fields:
             r += getattr(self, field[0]).serialize()
@@ -17,11 +97,23 @@ class EzspStruct:
 
     @classmethod
     def deserialize(cls, data):
+        r, offset = cls.deserialize_from(data, 0)
+        return r, data[offset:]
+
+    @classmethod
+    def deserialize_from(cls, data, offset):
+        layout = cls._layout
+        if layout is None:
+            layout = cls._compile()
+        if layout and len(data) - offset >= layout[0].size:
+            r, _ = layout[2](layout[0].unpack_from(data, offset), 0)
+            return r, offset + layout[0].size
+
         r = cls()
         for field_name, field_type in cls._fields:
-            v, data = field_type.deserialize(data)
+            v, offset = field_type.deserialize_from(data, offset)
             setattr(r, field_name, v)
-        return r, data
+        return r, offset
 
     def __repr__(self):
         r = '<%s ' % (self.__class__.__name__, )
@@ -36,7 +128,7 @@ class EmberNetworkParameters(EzspStruct):
     # Network parameters.
     _fields = [
         # The network's extended PAN identifier.
-        ('extendedPanId', basic.fixed_list(8, basic.uint8_t)),
+        ('extendedPanId', basic.fixed_bytes(8)),
         # The network's PAN identifier.
         ('panId', basic.uint16_t),
         # A power setting, in dBm.
@@ -70,7 +162,7 @@ class EmberZigbeeNetwork(EzspStruct):
         # The network's PAN identifier.
         ('panId', basic.uint16_t),
         # The network's extended PAN identifier.
-        ('extendedPanId', basic.fixed_list(8, basic.uint8_t)),
+        ('extendedPanId', basic.fixed_bytes(8)),
         # Whether the network is allowing MAC associations.
         ('allowingJoin', named.Bool),
         # The Stack Profile associated with the network.
@@ -143,7 +235,7 @@ class EmberKeyData(EzspStruct):
     # A 128-bit key.
     _fields = [
         # The key data.
-        ('contents', basic.fixed_list(16, basic.uint8_t)),
+        ('contents', basic.fixed_bytes(16)),
     ]
 
 
@@ -151,7 +243,7 @@ class EmberCertificateData(EzspStruct):
     # The implicit certificate used in CBKE.
     _fields = [
         # The certificate data.
-        ('contents', basic.fixed_list(48, basic.uint8_t)),
+        ('contents', basic.fixed_bytes(48)),
     ]
 
 
@@ -159,7 +251,7 @@ class EmberPublicKeyData(EzspStruct):
     # The public key data used in CBKE.
     _fields = [
         # The public key data.
-        ('contents', basic.fixed_list(22, basic.uint8_t)),
+        ('contents', basic.fixed_bytes(22)),
     ]
 
 
@@ -167,7 +259,7 @@ class EmberPrivateKeyData(EzspStruct):
     # The private key data used in CBKE.
     _fields = [
         # The private key data.
-        ('contents', basic.fixed_list(21, basic.uint8_t)),
+        ('contents', basic.fixed_bytes(21)),
     ]
 
 
@@ -190,7 +282,7 @@ class EmberSmacData(EzspStruct):
     # The Shared Message Authentication Code data used in CBKE.
     _fields = [
         # The Shared Message Authentication Code data.
-        ('contents', basic.fixed_list(16, basic.uint8_t)),
+        ('contents', basic.fixed_bytes(16)),
     ]
 
 
@@ -198,7 +290,7 @@ class EmberSignatureData(EzspStruct):
     # An ECDSA signature
     _fields = [
         # The signature data.
-        ('contents', basic.fixed_list(42, basic.uint8_t)),
+        ('contents', basic.fixed_bytes(42)),
     ]
 
 
@@ -206,7 +298,7 @@ class EmberCertificate283k1Data(EzspStruct):
     # The implicit certificate used in CBKE.
     _fields = [
         # The 283k1 certificate data.
-        ('contents', basic.fixed_list(74, basic.uint8_t)),
+        ('contents', basic.fixed_bytes(74)),
     ]
 
 
@@ -214,7 +306,7 @@ class EmberPublicKey283k1Data(EzspStruct):
     # The public key data used in CBKE.
     _fields = [
         # The 283k1 public key data.
-        ('contents', basic.fixed_list(37, basic.uint8_t)),
+        ('contents', basic.fixed_bytes(37)),
     ]
 
 
@@ -222,7 +314,7 @@ class EmberPrivateKey283k1Data(EzspStruct):
     # The private key data used in CBKE.
     _fields = [
         # The 283k1 private key data.
-        ('contents', basic.fixed_list(36, basic.uint8_t)),
+        ('contents', basic.fixed_bytes(36)),
     ]
 
 
@@ -230,7 +322,7 @@ class EmberSignature283k1Data(EzspStruct):
     # An ECDSA signature
     _fields = [
         # The 283k1 signature data.
-        ('contents', basic.fixed_list(72, basic.uint8_t)),
+        ('contents', basic.fixed_bytes(72)),
     ]
 
 
@@ -238,7 +330,7 @@ class EmberMessageDigest(EzspStruct):
     # The calculated digest of a message
     _fields = [
         # The calculated digest of a message.
-        ('contents', basic.fixed_list(16, basic.uint8_t)),
+        ('contents', basic.fixed_bytes(16)),
     ]
 
 
@@ -246,7 +338,7 @@ class EmberAesMmoHashContext(EzspStruct):
     # The hash context for an ongoing hash operation.
     _fields = [
         # The result of ongoing the hash operation.
-        ('result', basic.fixed_list(16, basic.uint8_t)),
+        ('result', basic.fixed_bytes(16)),
         # The total length of the data that has been hashed so far.
         ('length', basic.uint32_t),
     ]
@@ -493,9 +585,9 @@ class EmberTokTypeStackZllSecurity(EzspStruct):
         # Key index.
         ('keyIndex', basic.uint8_t),
         # Encryption key.
-        ('encryptionKey', basic.fixed_list(16, basic.uint8_t)),
+        ('encryptionKey', basic.fixed_bytes(16)),
         # Preconfigured key.
-        ('preconfiguredKey', basic.fixed_list(16, basic.uint8_t)),
+        ('preconfiguredKey', basic.fixed_bytes(16)),
     ]
 
 
@@ -506,7 +598,7 @@ class EmberRf4ceVendorInfo(EzspStruct):
         # the node.
         ('vendorId', basic.uint16_t),
         # The vendor string field shall contain the vendor string of the node.
-        ('vendorString', basic.fixed_list(7, basic.uint8_t)),
+        ('vendorString', basic.fixed_bytes(7)),
     ]
 
 
@@ -518,7 +610,7 @@ class EmberRf4ceApplicationInfo(EzspStruct):
         ('capabilities', named.EmberRf4ceApplicationCapabilities),
         # The user string field shall contain the user specified identification
         # string.
-        ('userString', basic.fixed_list(15, basic.uint8_t)),
+        ('userString', basic.fixed_bytes(15)),
         # The device type list field shall contain the list of device types
         # supported by the node.
         ('deviceTypeList', basic.fixed_list(3, basic.uint8_t)),
@@ -1,71 +1,163 @@
 import asyncio
 import binascii
+import collections
 import logging
 import serial_asyncio
 import serial
 
+import bellows.ash as ash
 import bellows.types as t
 
 
 LOGGER = logging.getLogger(__name__)
 
 
-class Gateway(asyncio.Protocol):
-    FLAG = b'\x7E'  # Marks end of frame
-    ESCAPE = b'\x7D'
-    XON = b'\x11'  # Resume transmission
-    XOFF = b'\x13'  # Stop transmission
-    SUBSTITUTE = b'\x18'
-    CANCEL = b'\x1A'  # Terminates a frame in progress
+class BaseStats:
+    """Counters, represented with all their values"""
+    def __repr__(self):
+        return '<%s %s>' % (
+            self.__class__.__name__,
+            ' '.join('%s=%s' % item for item in sorted(self.__dict__.items())),
+        )
+
+
+class Stats(BaseStats):
+    """ASH link statistics
 
-    RESERVED = FLAG + ESCAPE + XON + XOFF + SUBSTITUTE + CANCEL
+    t_rx_ack is the current ACK timeout and rtt the last round trip time
+    measured, both in seconds.
+    """
+    def __init__(self, t_rx_ack):
+        self.frames_sent = 0
+        self.retransmits = 0
+        self.naks_received = 0
+        self.ack_timeouts = 0
+        self.acks_sent = 0
+        self.acks_saved = 0
+        self.rtt = None
+        self.t_rx_ack = t_rx_ack
+
+
+class Gateway(asyncio.Protocol):
+    FLAG = ash.FLAG
+    ESCAPE = ash.ESCAPE
+    XON = ash.XON
+    XOFF = ash.XOFF
+    SUBSTITUTE = ash.SUBSTITUTE
+    CANCEL = ash.CANCEL
+
+    RESERVED = ash.RESERVED
+
+    # Maximum number of DATA frames sent without being acknowledged. The 3 bit
+    # frame numbers allow for at most 7.
+    TX_K = 3
+    # Bounds of the adaptive ACK timeout, in seconds
+    T_RX_ACK_INIT = 1.6
+    T_RX_ACK_MIN = 0.4
+    T_RX_ACK_MAX = 3.2
+    # Consecutive ACK timeouts after which the link is considered failed
+    ACK_TIMEOUTS = 4
+    # A received DATA frame is acknowledged by the next DATA frame sent, or
+    # by an ACK frame once ACK_DELAY seconds have passed or ACK_FRAMES frames
+    # are awaiting acknowledgement.
+    ACK_DELAY = 0.01
+    ACK_FRAMES = 3
 
     class Terminator:
         pass
 
-    def __init__(self, application, connected_future=None):
+    class _SentFrame:
+        """Retransmit state of a DATA frame awaiting acknowledgement"""
+        def __init__(self, data, seq, sent):
+            self.data = data
+            self.seq = seq
+            self.sent = sent
+            self.retransmits = 0
+
+    def __init__(self, application, connected_future=None, window_size=None,
+                 ack_delay=None, ack_frames=None):
+        if window_size is None:
+            window_size = self.TX_K
+        if not 1 <= window_size <= 7:
+            raise ValueError("window_size must be between 1 and 7")
+        if ack_frames is None:
+            ack_frames = self.ACK_FRAMES
+        if ack_frames < 1:
+            raise ValueError("ack_frames must be at least 1")
+        self._ack_delay = self.ACK_DELAY if ack_delay is None else ack_delay
+        self._ack_frames = ack_frames
+        self._ack_pending = 0
+        self._delayed_ack = None
         self._send_seq = 0
         self._rec_seq = 0
-        self._buffer = b''
+        self._buffer = bytearray()
+        self._discarding = False
         self._application = application
         self._reset_future = None
         self._connected_future = connected_future
         self._sendq = asyncio.Queue()
-        self._pending = (-1, None)
+        self._window = asyncio.Semaphore(window_size)
+        self._unacked = collections.OrderedDict()
+        self._loop = asyncio.get_event_loop()
+        self._write_buffer = []
+        self._flush_scheduled = False
+        self._xoff = False
+        self._ack_timer = None
+        self._ack_timeouts = 0
+        self.stats = Stats(self.T_RX_ACK_INIT)
 
     def connection_made(self, transport):
         """Callback when the uart is connected"""
         self._transport = transport
         if self._connected_future is not None:
             self._connected_future.set_result(True)
-            asyncio.async(self._send_task())
+            self._loop.create_task(self._send_task())
 
     def data_received(self, data):
-        """Callback when there is data received from the uart"""
-        # TODO: Fix this handling for multiple instances of the characters
-        # If a Cancel Byte or Substitute Byte is received, the bytes received
-        # so far are discarded. In the case of a Substitute Byte, subsequent
-        # bytes will also be discarded until the next Flag Byte.
-        if self.CANCEL in data:
-            self._buffer = b''
-            data = data[data.rfind(self.CANCEL) + 1:]
-        if self.SUBSTITUTE in data:
-            self._buffer = b''
-            data = data[data.find(self.FLAG) + 1:]
-
-        self._buffer += data
-        while self._buffer:
-            frame, self._buffer = self._extract_frame(self._buffer)
-            if frame is None:
-                break
-            self.frame_received(frame)
+        """Callback when there is data received from the uart
 
-    def _extract_frame(self, data):
-        """Extract a frame from the data buffer"""
-        if self.FLAG in data:
-            place = data.find(self.FLAG)
-            return self._unstuff(data[:place + 1]), data[place + 1:]
-        return None, data
+        The chunk is scanned once for control bytes. Frames held entirely
+        in the chunk are unstuffed straight from it, only the incomplete
+        frame at its end is copied into the receive buffer.
+
+        If a Cancel Byte or Substitute Byte is received, the bytes received
+        so far are discarded. In the case of a Substitute Byte, subsequent
+        bytes will also be discarded until the next Flag Byte.
+        """
+        with memoryview(data) as view:
+            buffer = self._buffer
+            start = 0
+            for match in ash.CONTROL_RE.finditer(data):
+                pos = match.start()
+                byte = view[pos]
+                if byte == self.FLAG[0]:
+                    if self._discarding:
+                        self._discarding = False
+                    elif buffer:
+                        buffer += view[start:pos + 1]
+                        frame = self._unstuff(buffer)
+                        buffer.clear()
+                        self.frame_received(frame)
+                    elif pos > start:
+                        self.frame_received(self._unstuff(view[start:pos + 1]))
+                elif byte == self.CANCEL[0]:
+                    buffer.clear()
+                    self._discarding = False
+                elif byte == self.SUBSTITUTE[0]:
+                    buffer.clear()
+                    self._discarding = True
+                else:
+                    # XON/XOFF may be inserted anywhere by flow control
+                    if not self._discarding:
+                        buffer += view[start:pos]
+                    if byte == self.XOFF[0]:
+                        self._xoff_received()
+                    else:
+                        self._xon_received()
+                start = pos + 1
+
+            if not self._discarding:
+                buffer += view[start:]
 
     def frame_received(self, data):
         """Frame receive handler"""
@@ -89,7 +181,14 @@ class Gateway(asyncio.Protocol):
         LOGGER.debug("Data frame: %s", binascii.hexlify(data))
         seq = (data[0] & 0b01110000) >> 4
         self._rec_seq = (seq + 1) % 8
-        self.write(self._ack_frame())
+        self._ack_pending += 1
+        if self._ack_pending >= self._ack_frames:
+            self._send_ack()
+        elif self._delayed_ack is None:
+            self._delayed_ack = self._loop.call_later(
+                self._ack_delay,
+                self._send_ack,
+            )
         self._handle_ack(data[0])
         self._application.frame_received(self._randomize(data[1:-3]))
 
@@ -111,6 +210,9 @@ class Gateway(asyncio.Protocol):
         """Reset acknowledgement frame receive handler"""
         self._send_seq = 0
         self._rec_seq = 0
+        # Anything unacknowledged was lost with the NCP's state
+        self._clear_unacked()
+        self._cancel_delayed_ack()
         try:
             code = t.NcpResetCode(data[2])
         except:
@@ -132,11 +234,41 @@ class Gateway(asyncio.Protocol):
         LOGGER.debug("Error frame: %s", binascii.hexlify(data))
 
     def write(self, data):
-        """Send data to the uart"""
+        """Send data to the uart
+
+        Frames written during one event loop iteration are passed to the
+        transport together, with a single write at the end of it.
+        """
         LOGGER.debug("Sending: %s", binascii.hexlify(data))
+        self._write_buffer.append(data)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._loop.call_soon(self._flush)
+
+    def _flush(self):
+        """Pass the buffered frames to the transport"""
+        self._flush_scheduled = False
+        if self._xoff or not self._write_buffer:
+            return
+        data = b''.join(self._write_buffer)
+        self._write_buffer.clear()
         self._transport.write(data)
 
+    def _xoff_received(self):
+        """The NCP asked us to stop transmitting"""
+        LOGGER.debug("XOFF received")
+        self._xoff = True
+
+    def _xon_received(self):
+        """The NCP asked us to resume transmitting"""
+        LOGGER.debug("XON received")
+        self._xoff = False
+        self._flush()
+
     def close(self):
+        self._stop_ack_timer()
+        self._cancel_delayed_ack()
+        self._flush()
         self._sendq.put_nowait(self.Terminator)
         self._transport.close()
 
@@ -147,37 +279,144 @@ class Gateway(asyncio.Protocol):
             raise TypeError("reset can only be called on a new connection")
 
         self.write(self._rst_frame())
-        self._reset_future = asyncio.Future()
+        self._reset_future = self._loop.create_future()
         return self._reset_future
 
-    @asyncio.coroutine
-    def _send_task(self):
-        """Send queue handler"""
+    async def _send_task(self):
+        """Send queue handler
+
+        Up to the window size DATA frames are sent before waiting for the NCP
+        to acknowledge them.
+        """
         while True:
-            item = yield from self._sendq.get()
+            item = await self._sendq.get()
             if item is self.Terminator:
                 break
+            await self._window.acquire()
             data, seq = item
-            success = False
-            rxmit = 0
-            while not success:
-                self._pending = (seq, asyncio.Future())
-                self.write(self._data_frame(data, seq, rxmit))
-                rxmit = 1
-                success = yield from self._pending[1]
+            self._unacked[seq] = self._SentFrame(data, seq, self._loop.time())
+            self.stats.frames_sent += 1
+            self._write_data(data, seq, 0)
+            if self._ack_timer is None:
+                self._start_ack_timer()
 
     def _handle_ack(self, control):
-        """Handle an acknowledgement frame"""
+        """Handle an acknowledgement frame
+
+        The ackNum is the number of the next frame the NCP expects, so it
+        acknowledges every outstanding frame before it.
+        """
         ack = ((control & 0b00000111) - 1) % 8
-        if ack == self._pending[0]:
-            pending, self._pending = self._pending, (-1, None)
-            pending[1].set_result(True)
+        if ack not in self._unacked:
+            # Duplicate, or nothing new acknowledged
+            return
+        while self._unacked:
+            seq, frame = self._unacked.popitem(last=False)
+            self._window.release()
+            if seq == ack:
+                break
+
+        # Retransmitted frames give an ambiguous round trip time
+        if frame.retransmits == 0:
+            self._update_t_rx_ack(self._loop.time() - frame.sent)
+        self._ack_timeouts = 0
+        self._stop_ack_timer()
+        self._start_ack_timer()
 
     def _handle_nak(self, control):
-        """Handle negative acknowledgment frame"""
+        """Handle negative acknowledgment frame
+
+        Frames before the ackNum have been received. Everything from the
+        ackNum onwards is sent again.
+        """
+        self._handle_ack(control)
+        self.stats.naks_received += 1
         nak = control & 0b00000111
-        if nak == self._pending[0]:
-            self._pending[1].set_result(False)
+        if nak not in self._unacked:
+            return
+        self._retransmit()
+        self._stop_ack_timer()
+        self._start_ack_timer()
+
+    def _retransmit(self):
+        """Send every unacknowledged frame again, with the rxmit bit set"""
+        for frame in self._unacked.values():
+            frame.retransmits += 1
+            self.stats.retransmits += 1
+            self._write_data(frame.data, frame.seq, 1)
+
+    def _write_data(self, data, seq, rxmit):
+        """Send a DATA frame, which also acknowledges the frames received"""
+        self.write(self._data_frame(data, seq, rxmit))
+        self._ack_sent(piggybacked=True)
+
+    def _send_ack(self):
+        """Send an ACK frame for the DATA frames received so far"""
+        self.write(self._ack_frame())
+        self.stats.acks_sent += 1
+        self._ack_sent()
+
+    def _ack_sent(self, piggybacked=False):
+        """The received DATA frames have been acknowledged
+
+        Every frame acknowledged without an ACK frame of its own saved one.
+        """
+        if self._ack_pending:
+            self.stats.acks_saved += self._ack_pending - (not piggybacked)
+        self._cancel_delayed_ack()
+
+    def _cancel_delayed_ack(self):
+        self._ack_pending = 0
+        if self._delayed_ack is not None:
+            self._delayed_ack.cancel()
+            self._delayed_ack = None
+
+    def _update_t_rx_ack(self, rtt):
+        """Adapt the ACK timeout to a measured round trip time"""
+        self.stats.rtt = rtt
+        t_rx_ack = self.stats.t_rx_ack * 7 / 8 + rtt / 2
+        t_rx_ack = max(self.T_RX_ACK_MIN, min(t_rx_ack, self.T_RX_ACK_MAX))
+        self.stats.t_rx_ack = t_rx_ack
+
+    def _start_ack_timer(self):
+        if self._unacked:
+            self._ack_timer = self._loop.call_later(
+                self.stats.t_rx_ack,
+                self._ack_timeout,
+            )
+
+    def _stop_ack_timer(self):
+        if self._ack_timer is not None:
+            self._ack_timer.cancel()
+            self._ack_timer = None
+
+    def _ack_timeout(self):
+        """The NCP did not acknowledge the outstanding frames in time"""
+        self._ack_timer = None
+        self._ack_timeouts += 1
+        self.stats.ack_timeouts += 1
+        self.stats.t_rx_ack = min(self.stats.t_rx_ack * 2, self.T_RX_ACK_MAX)
+        LOGGER.debug(
+            "ACK timeout %d, t_rx_ack is now %.2fs",
+            self._ack_timeouts,
+            self.stats.t_rx_ack,
+        )
+        if self._ack_timeouts >= self.ACK_TIMEOUTS:
+            LOGGER.error("Too many ACK timeouts, NCP is not responding")
+            self._clear_unacked()
+            self._application.enter_failed_state(
+                t.NcpResetCode.ERROR_EXCEEDED_MAXIMUM_ACK_TIMEOUT_COUNT
+            )
+            return
+        self._retransmit()
+        self._start_ack_timer()
+
+    def _clear_unacked(self):
+        self._stop_ack_timer()
+        self._ack_timeouts = 0
+        while self._unacked:
+            self._unacked.popitem()
+            self._window.release()
 
     def data(self, data):
         """Send a data frame"""
@@ -213,59 +452,42 @@ class Gateway(asyncio.Protocol):
 
         Used only in data frames
         """
-        rand = 0x42
-        out = b''
-        for c in s:
-            out += bytes([c ^ rand])
-            if rand % 2:
-                rand = (rand >> 1) ^ 0xB8
-            else:
-                rand = rand >> 1
-        return out
+        return ash.randomize(s)
 
     def _stuff(self, s):
         """Byte stuff (escape) a string for transmission"""
-        out = b''
-        for c in s:
-            if c in self.RESERVED:
-                out += self.ESCAPE + bytes([c ^ 0x20])
-            else:
-                out += bytes([c])
-        return out
+        return ash.stuff(s)
 
     def _unstuff(self, s):
         """Unstuff (unescape) a string after receipt"""
-        out = b''
-        escaped = False
-        for c in s:
-            if escaped:
-                out += bytes([c ^ 0x20])
-                escaped = False
-            elif c == 0x7D:
-                escaped = True
-            else:
-                out += bytes([c])
-        return out
-
-
-@asyncio.coroutine
-def connect(port, baudrate, application, loop=None):
-    if loop is None:
-        loop = asyncio.get_event_loop()
+        return ash.unstuff(s)
 
-    connection_future = asyncio.Future()
-    protocol = Gateway(application, connection_future)
 
-    transport, protocol = yield from serial_asyncio.create_serial_connection(
-        loop,
-        lambda: protocol,
-        url=port,
-        baudrate=baudrate,
-        parity=serial.PARITY_NONE,
-        stopbits=serial.STOPBITS_ONE,
-        xonxoff=True,
-    )
+async def connect(port, baudrate, application, loop=None, **kwargs):
+    if loop is None:
+        loop = asyncio.get_event_loop()
 
-    yield from connection_future
+    connection_future = loop.create_future()
+    protocol = Gateway(application, connection_future, **kwargs)
+
+    if isinstance(port, str) and port.startswith('sim://'):
+        import bellows.simulator
+        transport, protocol = await bellows.simulator.create_connection(
+            loop,
+            lambda: protocol,
+            url=port,
+        )
+    else:
+        transport, protocol = await serial_asyncio.create_serial_connection(
+            loop,
+            lambda: protocol,
+            url=port,
+            baudrate=baudrate,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE,
+            xonxoff=True,
+        )
+
+    await connection_future
 
     return protocol
@@ -1,5 +1,5 @@
+import binascii
 import logging
-import sqlite3
 
 import bellows.types as t
 import bellows.zigbee.device
@@ -11,18 +11,21 @@ LOGGER = logging.getLogger(__name__)
 
 
 def _sqlite_adapters():
+    import sqlite3
+
     def adapt_ieee(eui64):
         return repr(eui64)
     sqlite3.register_adapter(t.EmberEUI64, adapt_ieee)
 
     def convert_ieee(s):
-        l = [t.uint8_t(p, base=16) for p in s.split(b':')]
-        return t.EmberEUI64(l)
+        return t.EmberEUI64(binascii.unhexlify(s.replace(b':', b'')))
     sqlite3.register_converter("ieee", convert_ieee)
 
 
 class PersistingListener:
     def __init__(self, database_file, application):
+        import sqlite3
+
         self._database_file = database_file
         _sqlite_adapters()
         self._db = sqlite3.connect(database_file,
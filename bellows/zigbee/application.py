@@ -1,90 +1,195 @@
 import asyncio
+import collections
 import logging
 import os
 
 import bellows.types as t
 import bellows.zigbee.appdb
+import bellows.zigbee.counters
 import bellows.zigbee.device
+import bellows.zigbee.scheduler
+import bellows.zigbee.transactions
 import bellows.zigbee.util
 import bellows.zigbee.zcl
 import bellows.zigbee.zdo
 from bellows.zigbee.exceptions import DeliveryError
+from bellows.zigbee.zdo.types import CLUSTER_ID as ZDO_CLUSTER_ID
 
 LOGGER = logging.getLogger(__name__)
 
+RESET_ATTEMPT_BACKOFF_TIME = 5
+# Seconds a request may take from admission to its reply
+REQUEST_TIMEOUT = 10
+# Seconds between sweeps for transactions past their deadline
+PENDING_SWEEP_INTERVAL = 60
+
+# Handler method for each unsolicited EZSP frame the application uses
+EZSP_HANDLERS = {
+    'incomingMessageHandler': '_handle_frame',
+    'messageSentHandler': '_handle_message_sent',
+    'trustCenterJoinHandler': '_handle_trust_center_join',
+    '_reset_controller_application': '_handle_reset_request',
+}
+
 
 class ControllerApplication(bellows.zigbee.util.ListenableMixin):
     direct = t.EmberOutgoingMessageType.OUTGOING_DIRECT
 
     def __init__(self, ezsp, database_file=None):
-        self._send_sequence = 0
         self._ezsp = ezsp
         self.devices = {}
-        self._pending = {}
+        self._nwk_index = {}
+        self._pending = bellows.zigbee.transactions.TransactionManager()
+        self.scheduler = bellows.zigbee.scheduler.RequestScheduler()
         self._listeners = {}
         self._ieee = None
         self._nwk = None
+        self._ezsp_subscriptions = None
+        self._reset_task = None
+        self._sweep_handle = None
+        self.startup_timings = collections.OrderedDict()
+        self.counters = None
 
         if database_file is not None:
             self._dblistener = bellows.zigbee.appdb.PersistingListener(database_file, self)
             self.add_listener(self._dblistener)
             self._dblistener.load()
 
-    @asyncio.coroutine
-    def initialize(self):
+    def _phase_done(self, phase, start):
+        """Record the duration of a startup phase begun at `start`"""
+        now = asyncio.get_event_loop().time()
+        self.startup_timings[phase] = now - start
+        return now
+
+    async def initialize(self):
         """Perform basic NCP initialization steps"""
         e = self._ezsp
+        self.startup_timings.clear()
+        start = asyncio.get_event_loop().time()
 
-        yield from e.reset()
-        yield from e.version()
+        await e.reset()
+        await e.version()
+        start = self._phase_done('reset', start)
 
         c = t.EzspConfigId
-        yield from self._cfg(c.CONFIG_STACK_PROFILE, 2)
-        yield from self._cfg(c.CONFIG_SECURITY_LEVEL, 5)
-        yield from self._cfg(c.CONFIG_SUPPORTED_NETWORKS, 1)
         zdo = (
             t.EmberZdoConfigurationFlags.APP_RECEIVES_SUPPORTED_ZDO_REQUESTS |
             t.EmberZdoConfigurationFlags.APP_HANDLES_UNSUPPORTED_ZDO_REQUESTS
         )
-        yield from self._cfg(c.CONFIG_APPLICATION_ZDO_FLAGS, zdo)
-        yield from self._cfg(c.CONFIG_TRUST_CENTER_ADDRESS_CACHE_SIZE, 2)
-        yield from self._cfg(c.CONFIG_PACKET_BUFFER_COUNT, 0xff)
-        yield from self._cfg(c.CONFIG_KEY_TABLE_SIZE, 1)
-        yield from self._cfg(c.CONFIG_TRANSIENT_KEY_TIMEOUT_S, 180, True)
-
-    @asyncio.coroutine
-    def startup(self, auto_form=False):
-        """Perform a complete application startup"""
-        yield from self.initialize()
+        config = [
+            (c.CONFIG_STACK_PROFILE, 2),
+            (c.CONFIG_SECURITY_LEVEL, 5),
+            (c.CONFIG_SUPPORTED_NETWORKS, 1),
+            (c.CONFIG_APPLICATION_ZDO_FLAGS, zdo),
+            (c.CONFIG_TRUST_CENTER_ADDRESS_CACHE_SIZE, 2),
+            (c.CONFIG_PACKET_BUFFER_COUNT, 0xff),
+            (c.CONFIG_KEY_TABLE_SIZE, 1),
+            (c.CONFIG_TRANSIENT_KEY_TIMEOUT_S, 180),
+        ]
+        optional = {c.CONFIG_TRANSIENT_KEY_TIMEOUT_S}
+        statuses = await e.update_config(config)
+        for config_id, status in statuses.items():
+            if config_id not in optional:
+                assert status == 0  # TODO: Better check
+        await self._size_scheduler()
+        self._phase_done('config', start)
+
+    async def _size_scheduler(self):
+        """Limit the requests in flight to what the NCP has buffers for"""
+        c = t.EzspConfigId
+        values = await asyncio.gather(
+            self._ezsp.getConfigurationValue(c.CONFIG_PACKET_BUFFER_COUNT),
+            self._ezsp.getConfigurationValue(c.CONFIG_APS_UNICAST_MESSAGE_COUNT),
+        )
+        buffers, messages = [
+            value if status == t.EzspStatus.SUCCESS else None
+            for status, value in values
+        ]
+        limit = bellows.zigbee.scheduler.limit_from_config(buffers, messages)
+        LOGGER.debug(
+            "%s packet buffers and %s APS unicast messages, %d requests in flight",
+            buffers, messages, limit,
+        )
+        self.scheduler.max_in_flight = limit
+
+    async def startup(self, auto_form=False):
+        """Perform a complete application startup
+
+        The durations of the startup phases are kept in startup_timings.
+        """
+        await self.initialize()
         e = self._ezsp
+        start = asyncio.get_event_loop().time()
 
-        v = yield from e.networkInit()
+        v = await e.networkInit()
         if v[0] != 0:
             if not auto_form:
                 raise Exception("Could not initialize network")
-            yield from self.form_network()
+            await self.form_network()
 
-        v = yield from e.getNetworkParameters()
+        v = await e.getNetworkParameters()
         assert v[0] == 0  # TODO: Better check
         if v[1] != t.EmberNodeType.COORDINATOR:
             if not auto_form:
                 raise Exception("Network not configured as coordinator")
 
             LOGGER.info("Forming network")
-            yield from self._ezsp.leaveNetwork()
-            yield from asyncio.sleep(1)  # TODO
-            yield from self.form_network()
+            await self._ezsp.leaveNetwork()
+            await asyncio.sleep(1)  # TODO
+            await self.form_network()
+
+        start = self._phase_done('network', start)
 
-        yield from self._policy()
-        nwk = yield from e.getNodeId()
+        # Independent of each other, so sent together
+        _, nwk, ieee = await asyncio.gather(
+            self._policy(),
+            e.getNodeId(),
+            e.getEui64(),
+        )
         self._nwk = nwk[0]
-        ieee = yield from e.getEui64()
         self._ieee = ieee[0]
+        self._phase_done('policy', start)
+        LOGGER.info(
+            "Startup took %.3fs (%s)",
+            sum(self.startup_timings.values()),
+            ', '.join('%s %.3fs' % item for item in self.startup_timings.items()),
+        )
 
-        e.add_callback(self.ezsp_callback_handler)
-
-    @asyncio.coroutine
-    def form_network(self, channel=15, pan_id=None, extended_pan_id=None):
+        if self._ezsp_subscriptions is None:
+            self._ezsp_subscriptions = [
+                e.subscribe(frame_name, getattr(self, method))
+                for frame_name, method in EZSP_HANDLERS.items()
+            ]
+        if self._sweep_handle is None:
+            self._sweep_handle = asyncio.get_event_loop().call_later(
+                PENDING_SWEEP_INTERVAL, self._sweep_pending,
+            )
+
+    def _sweep_pending(self):
+        """End the transactions which outlived their deadline, periodically
+
+        Requests end their own transactions, so anything found is a bug or a
+        lost callback, and is logged.
+        """
+        loop = asyncio.get_event_loop()
+        swept = self._pending.sweep(loop.time())
+        if swept:
+            LOGGER.warning("Swept %d orphaned transactions", swept)
+        self._sweep_handle = loop.call_later(PENDING_SWEEP_INTERVAL, self._sweep_pending)
+
+    def start_counter_sampler(self, interval=60, history=60):
+        """Start sampling the NCP counters every `interval` seconds
+
+        The sampler is kept in `counters`.
+        """
+        if self.counters is None:
+            self.counters = bellows.zigbee.counters.CounterSampler(
+                self._ezsp, interval, history,
+            )
+        self.counters.start()
+        return self.counters
+
+    async def form_network(self, channel=15, pan_id=None, extended_pan_id=None):
         channel = t.uint8_t(channel)
 
         if pan_id is None:
@@ -92,10 +197,10 @@ class ControllerApplication(bellows.zigbee.util.ListenableMixin):
         pan_id = t.uint16_t(pan_id)
 
         if extended_pan_id is None:
-            extended_pan_id = t.fixed_list(8, t.uint8_t)([t.uint8_t(0)] * 8)
+            extended_pan_id = t.fixed_bytes(8)(b'\x00' * 8)
 
         initial_security_state = bellows.zigbee.util.zha_security(controller=True)
-        v = yield from self._ezsp.setInitialSecurityState(initial_security_state)
+        v = await self._ezsp.setInitialSecurityState(initial_security_state)
         assert v[0] == 0  # TODO: Better check
 
         parameters = t.EmberNetworkParameters()
@@ -108,75 +213,117 @@ class ControllerApplication(bellows.zigbee.util.ListenableMixin):
         parameters.nwkUpdateId = t.uint8_t(0)
         parameters.channels = t.uint32_t(0)
 
-        yield from self._ezsp.formNetwork(parameters)
-        yield from self._ezsp.setValue(t.EzspValueId.VALUE_STACK_TOKEN_WRITING, 1)
+        await self._ezsp.formNetwork(parameters)
+        await self._ezsp.setValue(t.EzspValueId.VALUE_STACK_TOKEN_WRITING, 1)
 
-    @asyncio.coroutine
-    def _cfg(self, config_id, value, optional=False):
-        v = yield from self._ezsp.setConfigurationValue(config_id, value)
-        if not optional:
-            assert v[0] == 0  # TODO: Better check
-
-    @asyncio.coroutine
-    def _policy(self):
+    async def _policy(self):
         """Set up the policies for what the NCP should do"""
         e = self._ezsp
-        v = yield from e.setPolicy(
-            t.EzspPolicyId.TC_KEY_REQUEST_POLICY,
-            t.EzspDecisionId.DENY_TC_KEY_REQUESTS,
-        )
-        assert v[0] == 0  # TODO: Better check
-        v = yield from e.setPolicy(
-            t.EzspPolicyId.APP_KEY_REQUEST_POLICY,
-            t.EzspDecisionId.ALLOW_APP_KEY_REQUESTS,
-        )
-        assert v[0] == 0  # TODO: Better check
-        v = yield from e.setPolicy(
-            t.EzspPolicyId.TRUST_CENTER_POLICY,
-            t.EzspDecisionId.ALLOW_PRECONFIGURED_KEY_JOINS,
+        results = await asyncio.gather(
+            e.setPolicy(
+                t.EzspPolicyId.TC_KEY_REQUEST_POLICY,
+                t.EzspDecisionId.DENY_TC_KEY_REQUESTS,
+            ),
+            e.setPolicy(
+                t.EzspPolicyId.APP_KEY_REQUEST_POLICY,
+                t.EzspDecisionId.ALLOW_APP_KEY_REQUESTS,
+            ),
+            e.setPolicy(
+                t.EzspPolicyId.TRUST_CENTER_POLICY,
+                t.EzspDecisionId.ALLOW_PRECONFIGURED_KEY_JOINS,
+            ),
         )
-        assert v[0] == 0  # TODO: Better check
+        for v in results:
+            assert v[0] == 0  # TODO: Better check
 
     def add_device(self, ieee, nwk, manufacturer=None):
         assert isinstance(ieee, t.EmberEUI64)
         # TODO: Shut down existing device
+        old = self.devices.get(ieee)
+        if old is not None:
+            self._unindex_nwk(old, old.nwk)
         dev = bellows.zigbee.device.Device(self, ieee, nwk, manufacturer)
         self.devices[ieee] = dev
+        self._index_nwk(dev)
         return dev
 
-    @asyncio.coroutine
-    def remove(self, ieee):
+    def _index_nwk(self, dev):
+        """Make `dev` the device found by its NWK address"""
+        other = self._nwk_index.get(dev.nwk)
+        if other is not None and other is not dev:
+            LOGGER.warning(
+                "NWK address conflict: 0x%04x moved from %s to %s",
+                dev.nwk,
+                other.ieee,
+                dev.ieee,
+            )
+        self._nwk_index[dev.nwk] = dev
+
+    def _unindex_nwk(self, dev, nwk):
+        if self._nwk_index.get(nwk) is dev:
+            del self._nwk_index[nwk]
+
+    def device_nwk_changed(self, dev, old_nwk):
+        """Called by a Device when its NWK address changes"""
+        if self.devices.get(dev.ieee) is not dev:
+            return
+        self._unindex_nwk(dev, old_nwk)
+        self._index_nwk(dev)
+
+    async def remove(self, ieee):
         assert isinstance(ieee, t.EmberEUI64)
         dev = self.devices.pop(ieee, None)
         if not dev:
             LOGGER.debug("Device not found for removal: %s", ieee)
             return
+        self._unindex_nwk(dev, dev.nwk)
         LOGGER.info("Removing device 0x%04x (%s)", dev.nwk, ieee)
         zdo_worked = False
         try:
-            resp = yield from dev.zdo.leave()
+            resp = await dev.zdo.leave()
             zdo_worked = resp[0] == 0
         except Exception:
             pass
         if not zdo_worked:
             # This should probably be delivered to the parent device instead
             # of the device itself.
-            yield from self._ezsp.removeDevice(dev.nwk, dev.ieee, dev.ieee)
+            await self._ezsp.removeDevice(dev.nwk, dev.ieee, dev.ieee)
         self.listener_event('device_removed', dev)
 
     def ezsp_callback_handler(self, frame_name, args):
-        if frame_name == 'incomingMessageHandler':
-            self._handle_frame(*args)
-        elif frame_name == 'messageSentHandler':
-            if args[4] != 0:
-                self._handle_frame_failure(*args)
-            else:
-                self._handle_frame_sent(*args)
-        elif frame_name == 'trustCenterJoinHandler':
-            if args[2] == t.EmberDeviceUpdate.DEVICE_LEFT:
-                self._handle_leave(*args)
-            else:
-                self._handle_join(*args)
+        method = EZSP_HANDLERS.get(frame_name)
+        if method is not None:
+            getattr(self, method)(*args)
+
+    def _handle_message_sent(self, *args):
+        if args[4] != 0:
+            self._handle_frame_failure(*args)
+        else:
+            self._handle_frame_sent(*args)
+
+    def _handle_trust_center_join(self, *args):
+        if args[2] == t.EmberDeviceUpdate.DEVICE_LEFT:
+            self._handle_leave(*args)
+        else:
+            self._handle_join(*args)
+
+    def _handle_reset_request(self, error):
+        """Reconnect to and restart the NCP after the link failed"""
+        LOGGER.warning("Resetting ControllerApplication. Cause: %s", error)
+        if self._reset_task is not None and not self._reset_task.done():
+            return
+        self._reset_task = asyncio.ensure_future(self._reset_controller_loop())
+
+    async def _reset_controller_loop(self):
+        while True:
+            try:
+                await self._ezsp.reconnect()
+                await self.startup()
+                break
+            except Exception as exc:
+                LOGGER.warning("ControllerApplication reset unsuccessful: %s", exc)
+            await asyncio.sleep(RESET_ATTEMPT_BACKOFF_TIME)
+        LOGGER.info("ControllerApplication reset complete")
 
     def _handle_frame(self, message_type, aps_frame, lqi, rssi, sender, binding_index, address_index, message):
         try:
@@ -191,26 +338,29 @@ class ControllerApplication(bellows.zigbee.util.ListenableMixin):
 
         tsn, command_id, is_reply, args = deserialize(aps_frame.clusterId, message)
 
+        if aps_frame.destinationEndpoint == 0 and command_id == ZDO_CLUSTER_ID.Device_annce:
+            self._handle_announce(*args)
+
         if is_reply:
             self._handle_reply(sender, aps_frame, tsn, command_id, args)
         else:
             self._handle_message(False, sender, aps_frame, tsn, command_id, args)
 
     def _handle_reply(self, sender, aps_frame, tsn, command_id, args):
-        try:
-            send_fut, reply_fut = self._pending[tsn]
-            if send_fut.done():
-                self._pending.pop(tsn)
-            reply_fut.set_result(args)
-            return
-        except KeyError:
-            LOGGER.warning("Unexpected response TSN=%s command=%s args=%s", tsn, command_id, args)
-        except asyncio.futures.InvalidStateError as exc:
-            LOGGER.debug("Invalid state on future - probably duplicate response: %s", exc)
-            # We've already handled, don't drop through to device handler
+        transaction = self._pending.get(sender, tsn)
+        if transaction is None:
+            LOGGER.warning(
+                "Unexpected response from 0x%04x TSN=%s command=%s args=%s",
+                sender, tsn, command_id, args,
+            )
+            self._handle_message(True, sender, aps_frame, tsn, command_id, args)
             return
 
-        self._handle_message(True, sender, aps_frame, tsn, command_id, args)
+        try:
+            transaction.reply_fut.set_result(args)
+        except asyncio.InvalidStateError as exc:
+            # We've already handled, don't drop through to device handler
+            LOGGER.debug("Invalid state on future - probably duplicate response: %s", exc)
 
     def _handle_message(self, is_reply, sender, aps_frame, tsn, command_id, args):
         try:
@@ -221,6 +371,13 @@ class ControllerApplication(bellows.zigbee.util.ListenableMixin):
 
         device.handle_message(is_reply, aps_frame, tsn, command_id, args)
 
+    def _handle_announce(self, nwk, ieee, capability):
+        """A device announced itself, possibly with a new NWK address"""
+        dev = self.devices.get(ieee)
+        if dev is not None and dev.nwk != nwk:
+            LOGGER.info("Device %s announced new NWK address 0x%04x", ieee, nwk)
+            dev.nwk = nwk
+
     def _handle_join(self, nwk, ieee, device_update, join_dec, parent_nwk):
         LOGGER.info("Device 0x%04x (%s) joined the network", nwk, ieee)
         if ieee in self.devices:
@@ -242,85 +399,111 @@ class ControllerApplication(bellows.zigbee.util.ListenableMixin):
             self.listener_event('device_left', dev)
 
     def _handle_frame_failure(self, message_type, destination, aps_frame, message_tag, status, message):
+        transaction = self._pending.sent(message_tag)
+        if transaction is None:
+            # Not a request, or a reply we sent
+            LOGGER.debug("Message send failure for tag %s: %s", message_tag, status)
+            return
         try:
-            send_fut, reply_fut = self._pending.pop(message_tag)
-            send_fut.set_exception(DeliveryError("Message send failure: %s" % (status, )))
-            reply_fut.cancel()
-        except KeyError:
-            LOGGER.warning("Unexpected message send failure")
-        except asyncio.futures.InvalidStateError as exc:
+            transaction.send_fut.set_exception(DeliveryError("Message send failure: %s" % (status, )))
+        except asyncio.InvalidStateError as exc:
             LOGGER.debug("Invalid state on future - probably duplicate response: %s", exc)
 
     def _handle_frame_sent(self, message_type, destination, aps_frame, message_tag, status, message):
+        transaction = self._pending.sent(message_tag)
+        if transaction is None:
+            LOGGER.debug("Message send notification for tag %s", message_tag)
+            return
         try:
-            send_fut, reply_fut = self._pending[message_tag]
-            # Sometimes messageSendResult and a reply come out of order
-            # If we've already handled the reply, delete pending
-            if reply_fut.done():
-                self._pending.pop(message_tag)
-            send_fut.set_result(True)
-        except KeyError:
-            LOGGER.warning("Unexpected message send notification")
-        except asyncio.futures.InvalidStateError as exc:
+            transaction.send_fut.set_result(True)
+        except asyncio.InvalidStateError as exc:
             LOGGER.debug("Invalid state on future - probably duplicate response: %s", exc)
 
     @bellows.zigbee.util.retryable_request
-    @asyncio.coroutine
-    def request(self, nwk, aps_frame, data, timeout=10):
-        seq = aps_frame.sequence
-        assert seq not in self._pending
-        send_fut = asyncio.Future()
-        reply_fut = asyncio.Future()
-        self._pending[seq] = (send_fut, reply_fut)
-
-        v = yield from self._ezsp.sendUnicast(self.direct, nwk, aps_frame, seq, data)
+    async def request(self, nwk, aps_frame, data, timeout=REQUEST_TIMEOUT, expect_reply=True,
+                      priority=bellows.zigbee.scheduler.Priority.NORMAL):
+        """Send a request to `nwk`, returning the arguments of its reply
+
+        The request first waits for the scheduler to admit it with the given
+        priority. From then on it has `timeout` seconds to be sent, reported
+        sent by the NCP and replied to, or asyncio.TimeoutError is raised.
+        If no reply is expected, None is returned once the NCP reports the
+        message sent.
+
+        The reply is matched by `nwk` and the TSN in aps_frame.sequence. If
+        an earlier request to `nwk` with the same TSN is still in flight, this
+        one waits for it to complete.
+        """
+        slot = await self.scheduler.acquire(nwk, priority)
+        try:
+            deadline = asyncio.get_event_loop().time() + timeout
+            return await asyncio.wait_for(
+                self._request(nwk, aps_frame, data, expect_reply, slot, deadline),
+                timeout,
+            )
+        finally:
+            self.scheduler.release(slot)
+
+    async def _request(self, nwk, aps_frame, data, expect_reply, slot, deadline):
+        transaction = await self._pending.begin(
+            nwk, aps_frame.sequence, deadline, expect_reply,
+        )
+        try:
+            v = await self._ezsp.sendUnicast(self.direct, nwk, aps_frame, transaction.tag, data)
+            if v[0] != 0:
+                raise DeliveryError("Message send failure %s" % (v[0], ))
+
+            # Wait for messageSentHandler message. It may come after the reply
+            await transaction.send_fut
+            self.scheduler.sent(slot)
+            if not expect_reply:
+                return None
+            return await transaction.reply_fut
+        finally:
+            self._pending.end(transaction)
+
+    async def reply(self, nwk, aps_frame, data):
+        """Send a message to `nwk` which gets no reply
+
+        If every message tag is in use, this waits for one to be released.
+        Reusing a tag in use would have the NCP's report of this message
+        resolve another request.
+        """
+        deadline = asyncio.get_event_loop().time() + REQUEST_TIMEOUT
+        tag = await self._pending.reserve(deadline)
+        v = await self._ezsp.sendUnicast(self.direct, nwk, aps_frame, tag, data)
         if v[0] != 0:
-            self._pending.pop(seq)
-            send_fut.cancel()
-            reply_fut.cancel()
-            raise DeliveryError("Message send failure %s" % (v[0], ))
-
-        # Wait for messageSentHandler message
-        v = yield from send_fut
-        # Wait for reply
-        v = yield from asyncio.wait_for(reply_fut, timeout)
+            # No messageSentHandler follows a rejected message
+            self._pending.sent(tag)
         return v
 
-    def reply(self, nwk, aps_frame, data):
-        return self._ezsp.sendUnicast(self.direct, nwk, aps_frame, aps_frame.sequence, data)
-
     def permit(self, time_s=60):
         assert 0 <= time_s <= 254
         return self._ezsp.permitJoining(time_s)
 
-    def permit_with_key(self, node, code, time_s=60):
+    async def permit_with_key(self, node, code, time_s=60):
         if type(node) is not t.EmberEUI64:
-            node = t.EmberEUI64([t.uint8_t(p) for p in node])
+            node = t.EmberEUI64(node)
 
         key = bellows.zigbee.util.convert_install_code(code)
         if key is None:
             raise Exception("Invalid install code")
 
-        v = yield from self._ezsp.addTransientLinkKey(node, key)
+        v = await self._ezsp.addTransientLinkKey(node, key)
         if v[0] != 0:
             raise Exception("Failed to set link key")
 
         return self._ezsp.permitJoining(time_s, True)
 
-    def get_sequence(self):
-        self._send_sequence = (self._send_sequence + 1) % 256
-        return self._send_sequence
+    def get_sequence(self, nwk=None):
+        """A TSN for a new request to `nwk`, not in use by another one"""
+        return self._pending.next_tsn(nwk)
 
     def get_device(self, ieee=None, nwk=None):
         if ieee is not None:
             return self.devices[ieee]
 
-        for dev in self.devices.values():
-            # TODO: Make this not terrible
-            if dev.nwk == nwk:
-                return dev
-
-        raise KeyError
+        return self._nwk_index[nwk]
 
     @property
     def ieee(self):
@@ -0,0 +1,176 @@
+import array
+import asyncio
+import collections
+import logging
+import time
+
+import bellows.types as t
+
+LOGGER = logging.getLogger(__name__)
+
+COUNTER_TYPES = [
+    counter for counter in t.EmberCounterType
+    if counter != t.EmberCounterType.COUNTER_TYPE_COUNT
+]
+# NCP counters are 16 bit and wrap around
+COUNTER_MODULUS = 0x10000
+
+
+def counter_name(counter):
+    """Short name of an EmberCounterType, such as mac_rx_broadcast"""
+    name = counter.name
+    for prefix in ('COUNTER_TYPE_', 'COUNTER_'):
+        if name.startswith(prefix):
+            name = name[len(prefix):]
+            break
+    return name.lower()
+
+
+class Sample:
+    """Counter increments over one sampling interval
+
+    timestamp is the wall clock time the counters were read at and interval
+    the seconds since the previous read. deltas holds one increment per
+    EmberCounterType.
+    """
+    __slots__ = ('timestamp', 'interval', 'deltas')
+
+    def __init__(self, timestamp, interval, deltas):
+        self.timestamp = timestamp
+        self.interval = interval
+        self.deltas = deltas
+
+    def delta(self, counter):
+        return self.deltas[counter]
+
+    def rate(self, counter):
+        """Increments of `counter` per second"""
+        if self.interval <= 0:
+            return 0.0
+        return self.deltas[counter] / self.interval
+
+
+class CounterSampler:
+    """Periodically reads the NCP counters
+
+    Counters are read with readCounters every `interval` seconds, and the
+    increments of the last `history` intervals are kept in `samples`.
+    Increments account for counters wrapping around, including repeated
+    wraps reported by counterRolloverHandler. totals sums the increments
+    since sampling started.
+    """
+    def __init__(self, ezsp, interval=60, history=60):
+        self._ezsp = ezsp
+        self.interval = interval
+        self.samples = collections.deque(maxlen=history)
+        self.totals = array.array('Q', [0] * len(COUNTER_TYPES))
+        self._previous = None
+        self._previous_time = None
+        self._rollovers = array.array('L', [0] * len(COUNTER_TYPES))
+        self._subscriptions = []
+        self._task = None
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._subscriptions = [
+            self._ezsp.subscribe('counterRolloverHandler', self._handle_rollover),
+            self._ezsp.subscribe('_reset_controller_application', self._handle_reset),
+        ]
+        self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        self._task = None
+        for subscription in self._subscriptions:
+            self._ezsp.unsubscribe(subscription)
+        self._subscriptions = []
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sample()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                LOGGER.warning("Failed to read NCP counters: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def _handle_rollover(self, counter):
+        if counter < len(self._rollovers):
+            self._rollovers[counter] += 1
+
+    def _handle_reset(self, *args):
+        # The counters restart from zero on the NCP
+        self._previous = None
+
+    async def sample(self):
+        """Read the counters, returning the new Sample
+
+        The first read only sets the baseline, and returns None.
+        """
+        v = await self._ezsp.readCounters()
+        now = asyncio.get_event_loop().time()
+        counters = v[0]
+        rollovers = self._rollovers
+        self._rollovers = array.array('L', [0] * len(COUNTER_TYPES))
+
+        previous, previous_time = self._previous, self._previous_time
+        self._previous, self._previous_time = counters, now
+        if previous is None:
+            return None
+
+        deltas = array.array('L', [0] * len(COUNTER_TYPES))
+        for i in range(len(COUNTER_TYPES)):
+            delta = counters[i] - previous[i]
+            wraps = rollovers[i]
+            if delta < 0:
+                wraps = max(wraps, 1)
+            deltas[i] = delta + wraps * COUNTER_MODULUS
+            self.totals[i] += deltas[i]
+
+        sample = Sample(time.time(), now - previous_time, deltas)
+        self.samples.append(sample)
+        return sample
+
+    @property
+    def latest(self):
+        return self.samples[-1] if self.samples else None
+
+    def rates(self):
+        """Per second rates of the latest sample, by counter name"""
+        sample = self.latest
+        if sample is None:
+            return {}
+        return {
+            counter_name(counter): sample.rate(counter)
+            for counter in COUNTER_TYPES
+        }
+
+
+def prometheus(sampler):
+    """Render the sampler in the Prometheus text exposition format"""
+    lines = [
+        '# HELP bellows_ncp_counter_total NCP counter increments since sampling started.',
+        '# TYPE bellows_ncp_counter_total counter',
+    ]
+    for counter in COUNTER_TYPES:
+        lines.append('bellows_ncp_counter_total{counter="%s"} %d' % (
+            counter_name(counter),
+            sampler.totals[counter],
+        ))
+
+    sample = sampler.latest
+    if sample is not None:
+        lines.extend([
+            '# HELP bellows_ncp_counter_rate NCP counter increments per second over the last interval.',
+            '# TYPE bellows_ncp_counter_rate gauge',
+        ])
+        for counter in COUNTER_TYPES:
+            lines.append('bellows_ncp_counter_rate{counter="%s"} %s' % (
+                counter_name(counter),
+                repr(sample.rate(counter)),
+            ))
+    return '\n'.join(lines) + '\n'
@@ -4,6 +4,7 @@ import logging
 
 import bellows.types as t
 import bellows.zigbee.endpoint
+import bellows.zigbee.scheduler
 import bellows.zigbee.util as zutil
 import bellows.zigbee.zdo as zdo
 from bellows.zigbee.zdo.types import CLUSTER_ID
@@ -30,7 +31,7 @@ class Device(zutil.LocalLogMixin):
     def __init__(self, application, ieee, nwk, manufacturer=None):
         self._application = application
         self._ieee = ieee
-        self.nwk = nwk
+        self._nwk = nwk
         self.zdo = zdo.ZDO(self)
         self.endpoints = {0: self.zdo}
         self.lqi = None
@@ -38,17 +39,23 @@ class Device(zutil.LocalLogMixin):
         self.status = Status.NEW
         self.initializing = False
         self._manufacturer_code = manufacturer
+        self.single_flight = zutil.SingleFlight()
 
     def schedule_initialize(self):
         self.initializing = True
         loop = asyncio.get_event_loop()
-        loop.call_soon(asyncio.async, self._initialize())
+        loop.call_soon(loop.create_task, self._initialize())
 
-    @asyncio.coroutine
-    def _discover_endpoints(self):
+    async def _discover_endpoints(self):
         self.info("Discovering endpoints")
         try:
-            epr = yield from self.zdo.request(CLUSTER_ID.Active_EP_req, self.nwk, tries=3, delay=2)
+            epr = await self.zdo.request(
+                CLUSTER_ID.Active_EP_req,
+                self.nwk,
+                tries=3,
+                delay=2,
+                single_flight=True,
+            )
             if epr[0] != 0:
                 raise Exception("Endpoint request failed: %s", epr)
         except Exception as exc:
@@ -64,17 +71,17 @@ class Device(zutil.LocalLogMixin):
         for endpoint_id in self.endpoints.keys():
             if endpoint_id == 0:  # ZDO
                 continue
-            yield from self.endpoints[endpoint_id].initialize()
+            await self.endpoints[endpoint_id].initialize()
 
-    @asyncio.coroutine
-    def get_manufacturer_code(self):
+    async def get_manufacturer_code(self):
         if self._manufacturer_code is None:
             try:
-                ndr = yield from self.zdo.request(
+                ndr = await self.zdo.request(
                     CLUSTER_ID.Node_Desc_req,
                     self.nwk,
                     tries=3,
                     delay=2,
+                    single_flight=True,
                 )
 
                 if ndr[0] != 0:
@@ -91,14 +98,13 @@ class Device(zutil.LocalLogMixin):
     def manufacturer_code(self):
         return self._manufacturer_code
 
-    @asyncio.coroutine
-    def _initialize(self):
+    async def _initialize(self):
         if self.status == Status.NEW:
-            yield from self._discover_endpoints()
+            await self._discover_endpoints()
             self.status = Status.ZDO_INIT
 
         self.status = Status.ENDPOINTS_INIT
-        yield from self.get_manufacturer_code()
+        await self.get_manufacturer_code()
         self.status = Status.INITIALIZED
         self.initializing = False
         self._application.listener_event('device_initialized', self)
@@ -120,25 +126,27 @@ class Device(zutil.LocalLogMixin):
             t.EmberApsOption.APS_OPTION_ENABLE_ROUTE_DISCOVERY
         )
         f.groupId = t.uint16_t(0)
-        f.sequence = t.uint8_t(self._application.get_sequence())
+        f.sequence = t.uint8_t(self._application.get_sequence(self.nwk))
         return f
 
-    def request(self, aps, data):
-        return self._application.request(self.nwk, aps, data)
+    def request(self, aps, data, expect_reply=True,
+                priority=bellows.zigbee.scheduler.Priority.NORMAL):
+        return self._application.request(
+            self.nwk, aps, data, expect_reply=expect_reply, priority=priority,
+        )
 
     def handle_message(self, is_reply, aps_frame, tsn, command_id, args):
         asyncio.ensure_future(self.async_handle_message(
             is_reply, aps_frame, tsn, command_id, args))
 
-    @asyncio.coroutine
-    def async_handle_message(self, is_reply, aps_frame, tsn, command_id, args):
+    async def async_handle_message(self, is_reply, aps_frame, tsn, command_id, args):
         if aps_frame.destinationEndpoint not in self.endpoints:
             self.warn(
                 "Message on unknown endpoint %s",
                 aps_frame.destinationEndpoint,
             )
             self.add_endpoint(aps_frame.destinationEndpoint)
-            yield from self.endpoints[aps_frame.destinationEndpoint].initialize()
+            await self.endpoints[aps_frame.destinationEndpoint].initialize()
             self._application.listener_event('device_updated', self)
 
         endpoint = self.endpoints[aps_frame.destinationEndpoint]
@@ -165,5 +173,15 @@ class Device(zutil.LocalLogMixin):
     def ieee(self):
         return self._ieee
 
+    @property
+    def nwk(self):
+        return self._nwk
+
+    @nwk.setter
+    def nwk(self, nwk):
+        old_nwk, self._nwk = self._nwk, nwk
+        if nwk != old_nwk:
+            self._application.device_nwk_changed(self, old_nwk)
+
     def __getitem__(self, key):
         return self.endpoints[key]
@@ -1,4 +1,3 @@
-import asyncio
 import enum
 import logging
 
@@ -37,20 +36,20 @@ class Endpoint(zutil.LocalLogMixin, zutil.ListenableMixin):
         self.status = Status.NEW
         self._listeners = {}
 
-    @asyncio.coroutine
-    def initialize(self):
+    async def initialize(self):
         # if self.status != Status.NEW:
             # return
         self.status = Status.INITIALIZING
 
         self.info("Discovering endpoint information")
         try:
-            sdr = yield from self._device.zdo.request(
+            sdr = await self._device.zdo.request(
                 CLUSTER_ID.Simple_Desc_req,
                 self._device.nwk,
                 self._endpoint_id,
                 tries=3,
                 delay=2,
+                single_flight=True,
             )
             if sdr[0] != 0:
                 raise Exception("Failed to retrieve service descriptor: %s", sdr)
@@ -0,0 +1,225 @@
+import asyncio
+import collections
+import enum
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+# Used until the limit is sized from the NCP configuration
+DEFAULT_MAX_IN_FLIGHT = 8
+DEFAULT_PER_DEVICE = 3
+# APS unicast message slots left free for replies and other unscheduled sends
+RESERVED_APS_MESSAGES = 1
+# Packet buffers a unicast may hold on the NCP: the message, its APS retry
+# and the reply being received
+BUFFERS_PER_REQUEST = 4
+
+
+class Priority(enum.IntEnum):
+    """The priority class of a request, the lowest value going first"""
+    # Commands a user is waiting for
+    INTERACTIVE = 0
+    # Everything not classified otherwise
+    NORMAL = 1
+    # Periodic polling and other background traffic
+    BULK = 2
+
+
+def limit_from_config(packet_buffers, aps_unicast_messages):
+    """The number of requests the NCP can have in flight
+
+    Either value may be None or 0 if the NCP did not report it, and
+    DEFAULT_MAX_IN_FLIGHT is used if neither is known.
+    """
+    limits = []
+    if aps_unicast_messages:
+        limits.append(aps_unicast_messages - RESERVED_APS_MESSAGES)
+    if packet_buffers:
+        limits.append(packet_buffers // BUFFERS_PER_REQUEST)
+    if not limits:
+        return DEFAULT_MAX_IN_FLIGHT
+    return max(1, min(limits))
+
+
+class Slot:
+    """Permission from the scheduler to send a request
+
+    The slot counts against the global limit until sent() and against the
+    per device limit until release().
+    """
+    __slots__ = ('key', 'priority', 'sending')
+
+    def __init__(self, key, priority):
+        self.key = key
+        self.priority = priority
+        self.sending = True
+
+    def __repr__(self):
+        return '<%s key=%s priority=%s sending=%s>' % (
+            self.__class__.__name__, self.key, self.priority.name, self.sending,
+        )
+
+
+class RequestScheduler:
+    """Admission of requests to the NCP
+
+    At most max_in_flight requests are handed to the NCP and not yet
+    reported sent, which is when it holds their packet buffers and APS
+    message slots. At most per_device requests to a single device are
+    active until their reply, so one slow or unreachable device cannot take
+    every slot.
+
+    Waiting requests are started by priority class. Within a class, devices
+    take turns, one request each, so a device with a long queue does not
+    delay the others.
+    """
+    def __init__(self, max_in_flight=DEFAULT_MAX_IN_FLIGHT, per_device=DEFAULT_PER_DEVICE):
+        self._max_in_flight = max_in_flight
+        self.per_device = per_device
+        self._in_flight = 0
+        self._active = {}
+        # For each priority, the waiters of each device in turn order
+        self._queues = [collections.OrderedDict() for _ in Priority]
+        self.started = {priority: 0 for priority in Priority}
+
+    @property
+    def max_in_flight(self):
+        return self._max_in_flight
+
+    @max_in_flight.setter
+    def max_in_flight(self, value):
+        self._max_in_flight = value
+        self._dispatch()
+
+    @property
+    def in_flight(self):
+        """Number of requests not yet reported sent by the NCP"""
+        return self._in_flight
+
+    @property
+    def active(self):
+        """Number of requests started and not yet released"""
+        return sum(self._active.values())
+
+    def queued(self, priority=None):
+        """Number of requests waiting to start, of one or every priority"""
+        if priority is None:
+            return sum(self.queued(p) for p in Priority)
+        return sum(len(waiters) for waiters in self._queues[priority].values())
+
+    async def acquire(self, key, priority=Priority.NORMAL):
+        """Wait for a slot to send a request to the device `key`
+
+        The slot must be released with release() once the request is
+        complete.
+        """
+        priority = Priority(priority)
+        waiter = asyncio.get_event_loop().create_future()
+        self._queues[priority].setdefault(key, collections.deque()).append(waiter)
+        self._dispatch()
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            if waiter.cancelled():
+                self._discard(priority, key, waiter)
+            else:
+                self.release(waiter.result())
+            raise
+
+    def sent(self, slot):
+        """The NCP reported the request of `slot` sent"""
+        if not slot.sending:
+            return
+        slot.sending = False
+        self._in_flight -= 1
+        self._dispatch()
+
+    def release(self, slot):
+        """The request of `slot` is complete"""
+        if slot.sending:
+            slot.sending = False
+            self._in_flight -= 1
+        self._active[slot.key] -= 1
+        if not self._active[slot.key]:
+            del self._active[slot.key]
+        self._dispatch()
+
+    def _discard(self, priority, key, waiter):
+        waiters = self._queues[priority].get(key)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        if not waiters:
+            del self._queues[priority][key]
+
+    def _start_one(self, priority, key):
+        """Start the first request of `key` still waiting in `priority`"""
+        queue = self._queues[priority]
+        waiters = queue[key]
+        while waiters and waiters[0].done():
+            waiters.popleft()
+        if not waiters:
+            del queue[key]
+            return False
+
+        waiter = waiters.popleft()
+        if waiters:
+            queue.move_to_end(key)
+        else:
+            del queue[key]
+        self._in_flight += 1
+        self._active[key] = self._active.get(key, 0) + 1
+        self.started[priority] += 1
+        waiter.set_result(Slot(key, priority))
+        return True
+
+    def _dispatch(self):
+        """Start waiting requests while there is room, by priority and turn"""
+        while self._in_flight < self._max_in_flight:
+            for priority in Priority:
+                started = False
+                for key in list(self._queues[priority]):
+                    if self._in_flight >= self._max_in_flight:
+                        return
+                    if self._active.get(key, 0) >= self.per_device:
+                        continue
+                    started = self._start_one(priority, key) or started
+                if started:
+                    # Anything of a higher priority goes before another turn
+                    break
+            else:
+                return
+
+
+def prometheus(scheduler):
+    """Render the scheduler state in the Prometheus text exposition format"""
+    lines = [
+        '# HELP bellows_requests_queued Requests waiting for the scheduler.',
+        '# TYPE bellows_requests_queued gauge',
+    ]
+    for priority in Priority:
+        lines.append('bellows_requests_queued{priority="%s"} %d' % (
+            priority.name.lower(),
+            scheduler.queued(priority),
+        ))
+    lines.extend([
+        '# HELP bellows_requests_started_total Requests started by the scheduler.',
+        '# TYPE bellows_requests_started_total counter',
+    ])
+    for priority in Priority:
+        lines.append('bellows_requests_started_total{priority="%s"} %d' % (
+            priority.name.lower(),
+            scheduler.started[priority],
+        ))
+    lines.extend([
+        '# HELP bellows_requests_in_flight Requests handed to the NCP and not yet sent.',
+        '# TYPE bellows_requests_in_flight gauge',
+        'bellows_requests_in_flight %d' % (scheduler.in_flight, ),
+        '# HELP bellows_requests_in_flight_limit Limit of requests handed to the NCP.',
+        '# TYPE bellows_requests_in_flight_limit gauge',
+        'bellows_requests_in_flight_limit %d' % (scheduler.max_in_flight, ),
+        '# HELP bellows_requests_active Requests started and awaiting completion.',
+        '# TYPE bellows_requests_active gauge',
+        'bellows_requests_active %d' % (scheduler.active, ),
+    ])
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,230 @@
+import asyncio
+import collections
+import itertools
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+# TSNs and EZSP message tags are both 8 bit
+SEQUENCE_SPACE = 256
+
+
+def _expired(deadline, now):
+    return deadline is not None and deadline < now
+
+
+class Transaction:
+    """A request awaiting its send result and reply
+
+    send_fut resolves when the NCP reports the message sent, and reply_fut
+    with the arguments of the reply. reply_fut is unused if no reply is
+    expected. deadline is the loop time after which the transaction is
+    abandoned, or None.
+    """
+    __slots__ = ('nwk', 'tsn', 'tag', 'deadline', 'send_fut', 'reply_fut')
+
+    def __init__(self, nwk, tsn, tag, loop, deadline=None):
+        self.nwk = nwk
+        self.tsn = tsn
+        self.tag = tag
+        self.deadline = deadline
+        self.send_fut = loop.create_future()
+        self.reply_fut = loop.create_future()
+
+    def expire(self):
+        """Fail the future the request is waiting for with a timeout"""
+        for future in (self.send_fut, self.reply_fut):
+            if not future.done():
+                future.set_exception(asyncio.TimeoutError())
+                return
+
+    def discard(self):
+        """Settle the futures once the request no longer awaits them
+
+        A late callback then finds them done, and an exception nobody
+        awaited is not logged as never retrieved.
+        """
+        for future in (self.send_fut, self.reply_fut):
+            if not future.done():
+                future.cancel()
+            elif not future.cancelled():
+                future.exception()
+
+    def __repr__(self):
+        return '<%s nwk=0x%04x tsn=%s tag=%s>' % (
+            self.__class__.__name__, self.nwk, self.tsn, self.tag,
+        )
+
+
+class TransactionManager:
+    """Sequence numbers and reply correlation of the requests in flight
+
+    Every destination has its own space of 256 TSNs, so replies are matched
+    by (source NWK address, TSN). The EZSP message tags, which identify a
+    message to the NCP until it reports the message sent, come from a single
+    space of 256 shared by all destinations.
+
+    A request whose TSN is still in use by an earlier request to the same
+    destination, or which finds every message tag in use, waits in begin()
+    until one is released.
+
+    Every transaction should be ended by its request. sweep() ends those
+    past their deadline anyway, and releases reserved tags which the NCP
+    never reported sent, so a lost callback cannot leak either.
+    """
+    def __init__(self):
+        self._next_tsn = {}
+        self._pending = {}
+        self._tags = {}
+        self._reserved = {}
+        self._next_tag = 0
+        self._waiters = collections.deque()
+
+    def __len__(self):
+        return len(self._pending)
+
+    @property
+    def waiting(self):
+        """Number of requests waiting for a TSN or message tag"""
+        return len(self._waiters)
+
+    def next_tsn(self, nwk):
+        """A TSN for a new request to `nwk`, skipping those in use"""
+        tsn = self._next_tsn.get(nwk, 0)
+        for _ in range(SEQUENCE_SPACE):
+            tsn = (tsn + 1) % SEQUENCE_SPACE
+            if (nwk, tsn) not in self._pending:
+                break
+        self._next_tsn[nwk] = tsn
+        return tsn
+
+    def _available(self, key):
+        return (key is None or key not in self._pending) and len(self._tags) < SEQUENCE_SPACE
+
+    async def begin(self, nwk, tsn, deadline=None, expect_reply=True):
+        """Start a transaction for request `tsn` to `nwk`
+
+        It must be ended with end() once the request is complete. A request
+        which expects no reply only takes a message tag, and leaves `tsn`
+        free to be reused.
+        """
+        key = (nwk, tsn) if expect_reply else None
+        if not self._available(key):
+            LOGGER.debug("Waiting for TSN %s of 0x%04x or a message tag", tsn, nwk)
+            await self._wait(key)
+
+        loop = asyncio.get_event_loop()
+        transaction = Transaction(nwk, tsn, self._allocate_tag(), loop, deadline)
+        if key is not None:
+            self._pending[key] = transaction
+        self._tags[transaction.tag] = transaction
+        return transaction
+
+    def end(self, transaction):
+        """Release the TSN and message tag of a transaction"""
+        transaction.discard()
+        key = (transaction.nwk, transaction.tsn)
+        if self._pending.get(key) is transaction:
+            del self._pending[key]
+        self._release_tag(transaction.tag, transaction)
+        self._wake()
+
+    async def reserve(self, deadline=None):
+        """A message tag for a message which gets no reply
+
+        Waits for a tag to be released if all are in use. The tag is
+        released by sent(), or by sweep() after `deadline`.
+        """
+        if not self._available(None):
+            LOGGER.debug("Waiting for a message tag")
+            await self._wait(None)
+        return self.reserve_tag(deadline)
+
+    def reserve_tag(self, deadline=None):
+        """A message tag for a message which gets no reply, or None
+
+        None is returned if all tags are in use. The tag is released by
+        sent(), or by sweep() after `deadline`.
+        """
+        if len(self._tags) >= SEQUENCE_SPACE:
+            return None
+        tag = self._allocate_tag()
+        self._tags[tag] = None
+        self._reserved[tag] = deadline
+        return tag
+
+    def sent(self, tag):
+        """The NCP reported the message with `tag` sent
+
+        Releases the tag, returning the transaction it belonged to or None.
+        """
+        if tag not in self._tags:
+            return None
+        transaction = self._tags.pop(tag)
+        self._reserved.pop(tag, None)
+        self._wake()
+        return transaction
+
+    def sweep(self, now):
+        """End the transactions and release the reserved tags past deadline
+
+        Returns the number of transactions and tags swept.
+        """
+        expired = {
+            transaction
+            for transaction in itertools.chain(self._pending.values(), self._tags.values())
+            if transaction is not None and _expired(transaction.deadline, now)
+        }
+        tags = [tag for tag, deadline in self._reserved.items() if _expired(deadline, now)]
+        for transaction in expired:
+            LOGGER.debug("Sweeping expired %s", transaction)
+            transaction.expire()
+            self.end(transaction)
+        for tag in tags:
+            LOGGER.debug("Sweeping reserved tag %s", tag)
+            del self._reserved[tag]
+            del self._tags[tag]
+        if tags:
+            self._wake()
+        return len(expired) + len(tags)
+
+    def get(self, nwk, tsn):
+        """The transaction awaiting reply `tsn` from `nwk`, or None"""
+        return self._pending.get((nwk, tsn))
+
+    async def _wait(self, key):
+        """Wait until `key`, or None for no TSN, and a message tag are free"""
+        loop = asyncio.get_event_loop()
+        while not self._available(key):
+            waiter = loop.create_future()
+            entry = (key, waiter)
+            self._waiters.append(entry)
+            try:
+                await waiter
+            finally:
+                self._waiters.remove(entry)
+
+    def _allocate_tag(self):
+        tag = self._next_tag
+        while tag in self._tags:
+            tag = (tag + 1) % SEQUENCE_SPACE
+        self._next_tag = (tag + 1) % SEQUENCE_SPACE
+        return tag
+
+    def _release_tag(self, tag, transaction):
+        if tag in self._tags and self._tags[tag] is transaction:
+            del self._tags[tag]
+
+    def _wake(self):
+        """Wake the waiting requests which can now proceed, oldest first"""
+        free_tags = SEQUENCE_SPACE - len(self._tags)
+        keys = set()
+        for key, waiter in self._waiters:
+            if free_tags <= 0:
+                break
+            if waiter.done() or key in self._pending or key in keys:
+                continue
+            waiter.set_result(None)
+            if key is not None:
+                keys.add(key)
+            free_tags -= 1
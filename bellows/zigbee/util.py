@@ -2,8 +2,6 @@ import asyncio
 import functools
 import logging
 import os
-from crccheck.crc import CrcX25
-from Crypto.Cipher import AES
 
 import bellows.types as t
 from bellows.zigbee.exceptions import DeliveryError
@@ -44,11 +42,9 @@ class LocalLogMixin:
 
 def zha_security(controller=False):
     empty_key_data = t.EmberKeyData()
-    empty_key_data.contents = t.fixed_list(16, t.uint8_t)([t.uint8_t(0)] * 16)
+    empty_key_data.contents = t.fixed_bytes(16)(b'\x00' * 16)
     zha_key = t.EmberKeyData()
-    zha_key.contents = t.fixed_list(16, t.uint8_t)(
-        [t.uint8_t(c) for c in b'ZigBeeAlliance09']
-    )
+    zha_key.contents = t.fixed_bytes(16)(b'ZigBeeAlliance09')
 
     isc = t.EmberInitialSecurityState()
     isc.bitmask = t.uint16_t(
@@ -58,9 +54,7 @@ def zha_security(controller=False):
     isc.preconfiguredKey = zha_key
     isc.networkKey = empty_key_data
     isc.networkKeySequenceNumber = t.uint8_t(0)
-    isc.preconfiguredTrustCenterEui64 = t.EmberEUI64(
-        [t.uint8_t(0)] * 8
-    )
+    isc.preconfiguredTrustCenterEui64 = t.EmberEUI64(b'\x00' * 8)
 
     if controller:
         isc.bitmask |= (
@@ -68,28 +62,25 @@ def zha_security(controller=False):
             t.EmberInitialSecurityBitmask.HAVE_NETWORK_KEY
         )
         isc.bitmask = t.uint16_t(isc.bitmask)
-        random_key = t.fixed_list(16, t.uint8_t)(
-            [t.uint8_t(x) for x in os.urandom(16)]
-        )
+        random_key = t.fixed_bytes(16)(os.urandom(16))
         isc.networkKey = random_key
     return isc
 
 
-@asyncio.coroutine
-def retry(func, retry_exceptions, tries=3, delay=0.1):
+async def retry(func, retry_exceptions, tries=3, delay=0.1):
     """Retry a function in case of exception
 
     Only exceptions in `retry_exceptions` will be retried.
     """
     while True:
         try:
-            r = yield from func()
+            r = await func()
             return r
         except retry_exceptions:
             if tries <= 1:
                 raise
             tries -= 1
-            yield from asyncio.sleep(delay)
+            await asyncio.sleep(delay)
 
 
 def retryable(retry_exceptions, tries=1, delay=0.1):
@@ -118,7 +109,42 @@ def retryable(retry_exceptions, tries=1, delay=0.1):
 retryable_request = retryable((DeliveryError, asyncio.TimeoutError))
 
 
+class SingleFlight:
+    """Share one call between the identical calls made while it is running
+
+    The first call with a key runs, and later calls with the same key wait
+    for its result or exception instead of running again. A waiting caller
+    being cancelled does not cancel the call for the others.
+    """
+    def __init__(self):
+        self._running = {}
+        self.joined = 0
+
+    def __len__(self):
+        return len(self._running)
+
+    async def _run(self, key, func):
+        try:
+            return await func()
+        finally:
+            del self._running[key]
+
+    async def run(self, key, func):
+        """The result of `func()`, shared with other calls of `key`"""
+        future = self._running.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._run(key, func))
+            self._running[key] = future
+        else:
+            self.joined += 1
+        return await asyncio.shield(future)
+
+
 def aes_mmo_hash_update(length, result, data):
+    # Crypto is only imported once install codes are used, which keeps it
+    # out of the startup path
+    from Crypto.Cipher import AES
+
     while len(data) >= AES.block_size:
         # Encrypt
         aes = AES.new(bytes(result), AES.MODE_ECB)
@@ -135,6 +161,8 @@ def aes_mmo_hash_update(length, result, data):
 
 
 def aes_mmo_hash(data):
+    from Crypto.Cipher import AES
+
     result_len = 0
     remaining_length = 0
     length = len(data)
@@ -177,13 +205,14 @@ def aes_mmo_hash(data):
     (result_len, result) = aes_mmo_hash_update(result_len, result, temp)
 
     key = t.EmberKeyData()
-    key.contents = t.fixed_list(16, t.uint8_t)(
-        [t.uint8_t(c) for c in result]
-    )
+    key.contents = t.fixed_bytes(16)(result)
     return key
 
 
 def convert_install_code(code):
+    # Deferred like Crypto, see aes_mmo_hash_update()
+    from crccheck.crc import CrcX25
+
     if len(code) < 10:
         return None
 
@@ -1,23 +1,27 @@
 import asyncio
 import functools
+import importlib
 import logging
 
 import bellows.types as t
 from bellows.zigbee import util
-from bellows.zigbee.zcl import foundation
+from bellows.zigbee.scheduler import Priority
+from bellows.zigbee.zcl import clusters, foundation
 
 
 LOGGER = logging.getLogger(__name__)
 
 
 def deserialize(cluster_id, data):
-    frame_control, data = data[0], data[1:]
+    frame_control = data[0]
     frame_type = frame_control & 0b0011
     direction = (frame_control & 0b1000) >> 3
+    offset = 1
     if frame_control & 0b0100:
         # Manufacturer specific value present
-        data = data[2:]
-    tsn, command_id, data = data[0], data[1], data[2:]
+        offset += 2
+    tsn, command_id = data[offset], data[offset + 1]
+    data = data[offset + 2:]
 
     is_reply = bool(direction)
 
@@ -61,6 +65,61 @@ def deserialize(cluster_id, data):
     return tsn, command_id, is_reply, value
 
 
+class LazyRegistry(dict):
+    """Cluster classes by cluster ID, or by cluster ID range
+
+    The module defining a cluster is only imported when the cluster is first
+    looked up, and iterating over the registry imports all of them.
+    """
+    def __init__(self, index):
+        super().__init__()
+        self._index = index
+
+    def _load(self, module):
+        importlib.import_module('%s.%s' % (clusters.__name__, module))
+
+    def _load_all(self):
+        for module in set(self._index.values()):
+            self._load(module)
+
+    def __missing__(self, key):
+        module = self._index.get(key)
+        if module is not None:
+            self._load(module)
+            if dict.__contains__(self, key):
+                return dict.__getitem__(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self._index
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __iter__(self):
+        self._load_all()
+        return super().__iter__()
+
+    def __len__(self):
+        self._load_all()
+        return super().__len__()
+
+    def keys(self):
+        self._load_all()
+        return super().keys()
+
+    def values(self):
+        self._load_all()
+        return super().values()
+
+    def items(self):
+        self._load_all()
+        return super().items()
+
+
 class Registry(type):
     def __init__(cls, name, bases, nmspc):  # noqa: N805
         super(Registry, cls).__init__(name, bases, nmspc)
@@ -81,8 +140,8 @@ class Registry(type):
 
 class Cluster(util.ListenableMixin, util.LocalLogMixin, metaclass=Registry):
     """A cluster on an endpoint"""
-    _registry = {}
-    _registry_range = {}
+    _registry = LazyRegistry(clusters.CLUSTERS)
+    _registry_range = LazyRegistry(clusters.CLUSTER_RANGES)
     _server_command_idx = {}
 
     def __init__(self, endpoint):
@@ -106,11 +165,46 @@ class Cluster(util.ListenableMixin, util.LocalLogMixin, metaclass=Registry):
         c.cluster_id = cluster_id
         return c
 
+    def request(self, general, command_id, schema, *args, priority=None, expect_reply=True,
+                single_flight=False, **kwargs):
+        """Send a command, general or specific to the cluster
+
+        Unless a priority is given, cluster specific commands are sent as
+        interactive and general ones with normal priority. If no reply is
+        expected, the default response is disabled and the request is
+        complete once sent.
+
+        With single_flight, a request identical to one still in flight to
+        the device, with the same priority and expecting a reply as well, is
+        not sent but shares its result. The retries of the request in flight
+        are shared too, so the tries and delay of the first caller apply.
+        Only requests without side effects should use it.
+        """
+        if priority is None:
+            priority = Priority.NORMAL if general else Priority.INTERACTIVE
+        call = functools.partial(
+            self._request, general, command_id, schema, *args,
+            priority=priority, expect_reply=expect_reply, **kwargs
+        )
+        if not single_flight or len(schema) != len(args):
+            return call()
+
+        key = (
+            self._endpoint.endpoint_id,
+            self.cluster_id,
+            general,
+            command_id,
+            t.serialize(args, schema),
+            priority,
+            expect_reply,
+        )
+        return self._endpoint.device.single_flight.run(key, call)
+
     @util.retryable_request
-    def request(self, general, command_id, schema, *args):
+    def _request(self, general, command_id, schema, *args, priority, expect_reply):
         if len(schema) != len(args):
             self.error("Schema and args lengths do not match")
-            error = asyncio.Future()
+            error = asyncio.get_event_loop().create_future()
             error.set_exception(ValueError("Missing parameters for request, expected %d argument(s)" % len(schema)))
             return error
 
@@ -119,10 +213,14 @@ class Cluster(util.ListenableMixin, util.LocalLogMixin, metaclass=Registry):
             frame_control = 0x00
         else:
             frame_control = 0x01
+        if not expect_reply:
+            frame_control |= 0x10  # Disable default response
         data = bytes([frame_control, aps.sequence, command_id])
         data += t.serialize(args, schema)
 
-        return self._endpoint.device.request(aps, data)
+        return self._endpoint.device.request(
+            aps, data, expect_reply=expect_reply, priority=priority,
+        )
 
     def handle_message(self, is_reply, aps_frame, tsn, command_id, args):
         if is_reply:
@@ -152,15 +250,17 @@ class Cluster(util.ListenableMixin, util.LocalLogMixin, metaclass=Registry):
     def handle_cluster_request(self, aps_frame, tsn, command_id, args):
         self.debug("No handler for cluster command %s", command_id)
 
-    @asyncio.coroutine
-    def read_attributes_raw(self, attributes):
+    async def read_attributes_raw(self, attributes, priority=None, single_flight=False):
         schema = foundation.COMMANDS[0x00][1]
         attributes = [t.uint16_t(a) for a in attributes]
-        v = yield from self.request(True, 0x00, schema, attributes)
+        v = await self.request(
+            True, 0x00, schema, attributes,
+            priority=priority, single_flight=single_flight,
+        )
         return v
 
-    @asyncio.coroutine
-    def read_attributes(self, attributes, allow_cache=False, raw=False):
+    async def read_attributes(self, attributes, allow_cache=False, raw=False, priority=None,
+                              single_flight=False):
         if raw:
             assert len(attributes) == 1
         success, failure = {}, {}
@@ -189,7 +289,9 @@ class Cluster(util.ListenableMixin, util.LocalLogMixin, metaclass=Registry):
                 return success[attributes[0]]
             return success, failure
 
-        result = yield from self.read_attributes_raw(to_read)
+        result = await self.read_attributes_raw(
+            to_read, priority=priority, single_flight=single_flight,
+        )
         if not isinstance(result[0], list):
             for attrid in to_read:
                 orig_attribute = orig_attributes[attrid]
@@ -251,9 +353,9 @@ class Cluster(util.ListenableMixin, util.LocalLogMixin, metaclass=Registry):
         cfg.reportable_change = reportable_change
         return self.request(True, 0x06, schema, [cfg])
 
-    def command(self, command, *args):
+    def command(self, command, *args, expect_reply=True):
         schema = self.server_commands[command][1]
-        return self.request(False, command, schema, *args)
+        return self.request(False, command, schema, *args, expect_reply=expect_reply)
 
     @property
     def name(self):
@@ -291,7 +393,3 @@ class Cluster(util.ListenableMixin, util.LocalLogMixin, metaclass=Registry):
 
     def __getitem__(self, key):
         return self.read_attributes([key], allow_cache=True, raw=True)
-
-
-# Import to populate the registry
-from . import clusters  # noqa: F401, F402
@@ -1,12 +1,37 @@
-# flake8: noqa
-from . import closures
-from . import general
-from . import homeautomation
-from . import hvac
-from . import lighting
-from . import lightlink
-from . import manufacturer_specific
-from . import measurement
-from . import protocol
-from . import security
-from . import smartenergy
+"""ZCL cluster definitions
+
+Cluster modules are imported on demand by the cluster registry in
+bellows.zigbee.zcl, which looks the defining module up in these tables.
+"""
+
+# Cluster IDs defined by each module
+MODULES = {
+    'general': [
+        0x0000, 0x0001, 0x0002, 0x0003, 0x0004, 0x0005, 0x0006, 0x0007,
+        0x0008, 0x0009, 0x000a, 0x000b, 0x000c, 0x000d, 0x000e, 0x000f,
+        0x0010, 0x0011, 0x0012, 0x0013, 0x0014, 0x0015, 0x0016, 0x0019,
+        0x001a, 0x001b, 0x0020, 0x0021,
+    ],
+    'closures': [0x0100, 0x0101, 0x0102],
+    'hvac': [0x0200, 0x0201, 0x0202, 0x0203, 0x0204],
+    'lighting': [0x0300, 0x0301],
+    'measurement': [0x0400, 0x0401, 0x0402, 0x0403, 0x0404, 0x0405, 0x0406],
+    'security': [0x0500, 0x0501, 0x0502],
+    'protocol': list(range(0x0600, 0x0614)),
+    'smartenergy': [
+        0x0700, 0x0701, 0x0702, 0x0703, 0x0704, 0x0705, 0x0706, 0x0707,
+        0x0708, 0x0709, 0x070a, 0x0800,
+    ],
+    'homeautomation': [0x0b00, 0x0b01, 0x0b02, 0x0b03, 0x0b04, 0x0b05],
+    'lightlink': [0x1000],
+}
+
+CLUSTERS = {
+    cluster_id: module
+    for module, cluster_ids in MODULES.items()
+    for cluster_id in cluster_ids
+}
+
+CLUSTER_RANGES = {
+    (0xfc00, 0xffff): 'manufacturer_specific',
+}
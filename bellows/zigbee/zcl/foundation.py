@@ -124,40 +124,52 @@ class TypeValue():
 
     @classmethod
     def deserialize(cls, data):
+        self, offset = cls.deserialize_from(data, 0)
+        return self, data[offset:]
+
+    @classmethod
+    def deserialize_from(cls, data, offset):
         self = cls()
-        self.type, data = data[0], data[1:]
+        self.type = data[offset]
+        offset += 1
         if self.type in [0x48, 0x50, 0x51]:  # Array, set or bag
-            etype, data = t.basic.uint8_t.deserialize(data)
-            nofel, data = t.basic.uint16_t.deserialize(data)
+            etype, offset = t.basic.uint8_t.deserialize_from(data, offset)
+            nofel, offset = t.basic.uint16_t.deserialize_from(data, offset)
             actual_type = DATA_TYPES[etype][1]
             self.value = []
             for i in range(nofel):
-                val, data = actual_type.deserialize(data)
+                val, offset = actual_type.deserialize_from(data, offset)
                 self.value.append(val)
         elif self.type == 0x4c:  # Structure
-            nofel, data = t.basic.uint16_t.deserialize(data)
+            nofel, offset = t.basic.uint16_t.deserialize_from(data, offset)
             self.value = []
             for i in range(nofel):
-                etype, data = t.basic.uint8_t.deserialize(data)
+                etype, offset = t.basic.uint8_t.deserialize_from(data, offset)
                 actual_type = DATA_TYPES[etype][1]
-                val, data = actual_type.deserialize(data)
+                val, offset = actual_type.deserialize_from(data, offset)
                 self.value.append(val)
         else:
             actual_type = DATA_TYPES[self.type][1]
-            self.value, data = actual_type.deserialize(data)
-        return self, data
+            self.value, offset = actual_type.deserialize_from(data, offset)
+        return self, offset
 
 
 class ReadAttributeRecord():
     @classmethod
     def deserialize(cls, data):
+        r, offset = cls.deserialize_from(data, 0)
+        return r, data[offset:]
+
+    @classmethod
+    def deserialize_from(cls, data, offset):
         r = cls()
-        r.attrid, data = int.from_bytes(data[:2], 'little'), data[2:]
-        r.status, data = data[0], data[1:]
+        r.attrid = int.from_bytes(data[offset:offset + 2], 'little')
+        r.status = data[offset + 2]
+        offset += 3
         if r.status == 0:
-            r.value, data = TypeValue.deserialize(data)
+            r.value, offset = TypeValue.deserialize_from(data, offset)
 
-        return r, data
+        return r, offset
 
     def serialize(self):
         r = t.uint16_t(self.attrid).serialize()
@@ -209,22 +221,27 @@ class AttributeReportingConfig:
 
     @classmethod
     def deserialize(cls, data):
+        self, offset = cls.deserialize_from(data, 0)
+        return self, data[offset:]
+
+    @classmethod
+    def deserialize_from(cls, data, offset):
         self = cls()
-        self.direction, data = t.Bool.deserialize(data)
-        self.attrid, data = t.uint16_t.deserialize(data)
+        self.direction, offset = t.Bool.deserialize_from(data, offset)
+        self.attrid, offset = t.uint16_t.deserialize_from(data, offset)
         if self.direction:
             # Requesting things to be received by me
-            self.timeout, data = t.uint16_t.deserialize(data)
+            self.timeout, offset = t.uint16_t.deserialize_from(data, offset)
         else:
             # Notifying that I will report things to you
-            self.datatype, data = t.uint8_t.deserialize(data)
-            self.min_interval, data = t.uint16_t.deserialize(data)
-            self.max_interval, data = t.uint16_t.deserialize(data)
+            self.datatype, offset = t.uint8_t.deserialize_from(data, offset)
+            self.min_interval, offset = t.uint16_t.deserialize_from(data, offset)
+            self.max_interval, offset = t.uint16_t.deserialize_from(data, offset)
             datatype = DATA_TYPES[self.datatype]
             if datatype[2] is Analog:
-                self.reportable_change, data = datatype[1].deserialize(data)
+                self.reportable_change, offset = datatype[1].deserialize_from(data, offset)
 
-        return self, data
+        return self, offset
 
 
 class ConfigureReportingResponseRecord(t.EzspStruct):
@@ -1,3 +1,4 @@
+import asyncio
 import functools
 import logging
 
@@ -42,16 +43,44 @@ class ZDO(util.LocalLogMixin, util.ListenableMixin):
         data += t.serialize(args, schema)
         return aps, data
 
-    @util.retryable_request
-    def request(self, command, *args):
+    def request(self, command, *args, single_flight=False, **kwargs):
+        """Send a ZDO request
+
+        With single_flight, a request identical to one still in flight to
+        the device is not sent but shares its result. The retries of the
+        request in flight are shared too, so the tries and delay of the first
+        caller apply.
+        """
         if isinstance(command, str):
             command = CLUSTER_ID[command]
+        if not single_flight:
+            return self._request(command, *args, **kwargs)
+
+        key = (0, command, t.serialize(args, types.CLUSTERS[command][2]))
+        return self._device.single_flight.run(
+            key,
+            functools.partial(self._request, command, *args, **kwargs),
+        )
+
+    @util.retryable_request
+    def _request(self, command, *args):
         aps, data = self._serialize(command, *args)
         return self._device.request(aps, data)
 
     def reply(self, command, *args):
         aps, data = self._serialize(command, *args)
-        return self._device.reply(aps, data)
+        future = asyncio.ensure_future(self._device.reply(aps, data))
+        future.add_done_callback(functools.partial(self._reply_done, command))
+        return future
+
+    def _reply_done(self, command, future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None and future.result()[0] != 0:
+            error = future.result()
+        if error is not None:
+            self.warn("Failed to send ZDO reply 0x%04x: %r", command, error)
 
     def handle_message(self, is_reply, aps_frame, tsn, command_id, args):
         if is_reply:
@@ -28,10 +28,10 @@ class SizePrefixedSimpleDescriptor(SimpleDescriptor):
         return len(data).to_bytes(1, 'little') + data
 
     @classmethod
-    def deserialize(cls, data):
-        if data[0] == 0:
-            return None, data[1:]
-        return SimpleDescriptor.deserialize(data[1:])
+    def deserialize_from(cls, data, offset):
+        if data[offset] == 0:
+            return None, offset + 1
+        return SimpleDescriptor.deserialize_from(data, offset + 1)
 
 
 class NodeDescriptor(t.EzspStruct):
@@ -59,17 +59,23 @@ class MultiAddress:
 
     @classmethod
     def deserialize(cls, data):
+        r, offset = cls.deserialize_from(data, 0)
+        return r, data[offset:]
+
+    @classmethod
+    def deserialize_from(cls, data, offset):
         r = cls()
-        r.addrmode, data = data[0], data[1:]
+        r.addrmode = data[offset]
+        offset += 1
         if r.addrmode == 0x01:
-            r.nwk, data = t.uint16_t.deserialize(data)
+            r.nwk, offset = t.uint16_t.deserialize_from(data, offset)
         elif r.addrmode == 0x03:
-            r.ieee, data = t.EmberEUI64.deserialize(data)
-            r.endpoint, data = t.uint8_t.deserialize(data)
+            r.ieee, offset = t.EmberEUI64.deserialize_from(data, offset)
+            r.endpoint, offset = t.uint8_t.deserialize_from(data, offset)
         else:
             raise ValueError("Invalid MultiAddress - unknown address mode")
 
-        return r, data
+        return r, offset
 
     def serialize(self):
         if self.addrmode == 0x01:
@@ -105,7 +111,7 @@ CLUSTERS = {
     0x0011: ('User_Desc_req', (NWKI, )),
     0x0012: ('Discovery_Cache_req', (NWK, IEEE)),
     0x0013: ('Device_annce', (NWK, IEEE, ('Capability', t.uint8_t))),
-    0x0014: ('User_Desc_set', (NWKI, ('UserDescriptor', t.fixed_list(16, t.uint8_t)))),  # Really a string
+    0x0014: ('User_Desc_set', (NWKI, ('UserDescriptor', t.fixed_bytes(16)))),  # Really a string
     0x0015: ('System_Server_Discovery_req', (('ServerMask', t.uint16_t), )),
     0x0016: ('Discovery_store_req', (NWK, IEEE, ('NodeDescSize', t.uint8_t), ('PowerDescSize', t.uint8_t), ('ActiveEPSize', t.uint8_t), ('SimpleDescSizeList', t.LVList(t.uint8_t)))),
     0x0017: ('Node_Desc_store_req', (NWK, IEEE, ('NodeDescriptor', NodeDescriptor))),
@@ -135,7 +141,7 @@ CLUSTERS = {
     0x8005: ('Active_EP_rsp', (STATUS, NWKI, ('ActiveEPList', t.LVList(t.uint8_t)))),
     0x8006: ('Match_Desc_rsp', (STATUS, NWKI, ('MatchList', t.LVList(t.uint8_t)))),
     # 0x8010: ('Complex_Desc_rsp', (STATUS, NWKI, ('Length', t.uint8_t), ('ComplexDescriptor', ComplexDescriptor))),
-    0x8011: ('User_Desc_rsp', (STATUS, NWKI, ('Length', t.uint8_t), ('UserDescriptor', t.fixed_list(16, t.uint8_t)))),
+    0x8011: ('User_Desc_rsp', (STATUS, NWKI, ('Length', t.uint8_t), ('UserDescriptor', t.fixed_bytes(16)))),
     0x8012: ('Discovery_Cache_rsp', (STATUS, )),
     0x8014: ('User_Desc_conf', (STATUS, NWKI)),
     0x8015: ('System_Server_Discovery_rsp', (STATUS, ('ServerMask', t.uint16_t))),
@@ -0,0 +1,41 @@
+"""Micro-benchmark for the ASH byte codec
+
+Reports how many frames per second can be encoded (randomize + stuff) and
+decoded (unstuff + randomize) for typical EZSP payload sizes.
+
+    python benchmarks/ash_codec.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bellows import ash  # noqa: E402
+
+SIZES = (10, 20, 40, 70, 100, 130)
+NUMBER = 20000
+
+
+def encode(data):
+    return ash.stuff(ash.randomize(data))
+
+
+def decode(data):
+    return ash.randomize(ash.unstuff(data))
+
+
+def main():
+    print("%8s %16s %16s" % ("bytes", "encode frames/s", "decode frames/s"))
+    for size in SIZES:
+        payload = os.urandom(size)
+        frame = encode(payload)
+        assert decode(frame) == payload
+        enc = timeit.timeit(lambda: encode(payload), number=NUMBER)
+        dec = timeit.timeit(lambda: decode(frame), number=NUMBER)
+        print("%8d %16d %16d" % (size, NUMBER / enc, NUMBER / dec))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark for the ASH receive path
+
+Feeds Gateway.data_received 4 KiB and 64 KiB chunks, each holding dozens to
+thousands of stuffed DATA frames, and reports how many frames per second are extracted. The previous
+bytes-concatenating implementation is included for comparison.
+
+    python benchmarks/ash_receive.py
+"""
+
+import os
+import sys
+import timeit
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bellows import uart  # noqa: E402
+
+CHUNK_SIZES = (4096, 65536)
+FRAMES = 100000
+
+
+class LegacyGateway(uart.Gateway):
+    def data_received(self, data):
+        if self.CANCEL in data:
+            self._buffer = b''
+            data = data[data.rfind(self.CANCEL) + 1:]
+        if self.SUBSTITUTE in data:
+            self._buffer = b''
+            data = data[data.find(self.FLAG) + 1:]
+
+        self._buffer += data
+        while self._buffer:
+            frame, self._buffer = self._extract_frame(self._buffer)
+            if frame is None:
+                break
+            self.frame_received(frame)
+
+    def _extract_frame(self, data):
+        if self.FLAG in data:
+            place = data.find(self.FLAG)
+            return self._unstuff(data[:place + 1]), data[place + 1:]
+        return None, data
+
+
+def chunks(payload_size, chunk_size):
+    gw = uart.Gateway(mock.MagicMock())
+    stream = b''
+    seq = 0
+    while len(stream) < chunk_size * 4:
+        stream += gw._data_frame(os.urandom(payload_size), seq, 0)
+        seq = (seq + 1) % 8
+    return [stream[i:i + chunk_size] for i in range(0, len(stream), chunk_size)]
+
+
+def run(cls, data, number):
+    gw = cls(mock.MagicMock())
+    frames = []
+    gw.frame_received = frames.append
+    if cls is LegacyGateway:
+        gw._buffer = b''
+
+    def feed():
+        for chunk in data:
+            gw.data_received(chunk)
+
+    elapsed = timeit.timeit(feed, number=number)
+    return len(frames) / elapsed, len(frames) // (number * len(data))
+
+
+def main():
+    print("%8s %8s %14s %16s %16s" % (
+        "chunk", "payload", "frames/chunk", "legacy frames/s", "frames/s"))
+    for chunk_size in CHUNK_SIZES:
+        for size in (10, 40, 100):
+            data = chunks(size, chunk_size)
+            number = max(1, FRAMES * (size + 6) // (chunk_size * len(data)))
+            legacy, _ = run(LegacyGateway, data, number)
+            new, per_chunk = run(uart.Gateway, data, number)
+            print("%8d %8d %14d %16d %16d" % (
+                chunk_size, size, per_chunk, legacy, new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark for batched ASH transport writes
+
+Simulates bursts of DATA frames received from the NCP, each acknowledged with
+an ACK frame, and counts the writes reaching the serial file descriptor. The
+per-frame writes of the previous implementation are included for comparison.
+
+    python benchmarks/ash_write.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bellows import uart  # noqa: E402
+
+BURSTS = 2000
+FRAMES_PER_BURST = (1, 4, 16, 64)
+
+
+class DevNullTransport:
+    """Transport doing one write syscall per write call"""
+    def __init__(self):
+        self.fd = os.open(os.devnull, os.O_WRONLY)
+        self.syscalls = 0
+
+    def write(self, data):
+        self.syscalls += 1
+        os.write(self.fd, data)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Application:
+    def frame_received(self, data):
+        pass
+
+
+class PerFrameGateway(uart.Gateway):
+    def write(self, data):
+        self._transport.write(data)
+
+
+def burst(frames):
+    gw = uart.Gateway(mock.MagicMock())
+    return b''.join(
+        gw._data_frame(b'\x00\x00\x00' + os.urandom(20), i % 8, 0)
+        for i in range(frames)
+    )
+
+
+def run(loop, cls, data):
+    gw = cls(Application(), ack_frames=1)
+    gw._transport = DevNullTransport()
+    start = time.perf_counter()
+    for i in range(BURSTS):
+        gw.data_received(data)
+        loop.run_until_complete(asyncio.sleep(0))
+    elapsed = time.perf_counter() - start
+    syscalls = gw._transport.syscalls
+    gw._transport.close()
+    return syscalls, elapsed
+
+
+def main():
+    loop = asyncio.get_event_loop()
+    print("%8s %18s %18s %16s %16s" % (
+        "frames", "per-frame writes", "batched writes",
+        "per-frame s", "batched s"))
+    for frames in FRAMES_PER_BURST:
+        data = burst(frames)
+        legacy = run(loop, PerFrameGateway, data)
+        batched = run(loop, uart.Gateway, data)
+        print("%8d %18d %18d %16.3f %16.3f" % (
+            frames, legacy[0], batched[0], legacy[1], batched[1]))
+
+
+if __name__ == '__main__':
+    main()
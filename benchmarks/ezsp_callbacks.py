@@ -0,0 +1,66 @@
+"""Micro-benchmark for decoding a stream of EZSP callbacks
+
+Decodes messageSentHandler frames, with statuses spread over the whole
+EmberStatus range, through the compiled schema used by EZSP and through
+the generic bellows.types.deserialize.
+
+    python benchmarks/ezsp_callbacks.py
+"""
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import bellows.types as t  # noqa: E402
+from bellows.commands import COMMANDS  # noqa: E402
+
+FRAMES = 1000
+NUMBER = 10
+REPEAT = 5
+
+
+def frames():
+    rnd = random.Random(0)
+    statuses = [member.value for member in t.EmberStatus]
+    stream = []
+    for i in range(FRAMES):
+        aps = t.EmberApsFrame()
+        aps.profileId = t.uint16_t(0x0104)
+        aps.clusterId = t.uint16_t(rnd.choice((0x0006, 0x0008, 0x0300)))
+        aps.sourceEndpoint = t.uint8_t(1)
+        aps.destinationEndpoint = t.uint8_t(1)
+        aps.options = t.EmberApsOption(t.EmberApsOption.APS_OPTION_RETRY)
+        aps.groupId = t.uint16_t(0)
+        aps.sequence = t.uint8_t(i & 0xff)
+        stream.append(b''.join([
+            bytes([t.EmberOutgoingMessageType.OUTGOING_DIRECT]),
+            t.uint16_t(rnd.getrandbits(16)).serialize(),
+            aps.serialize(),
+            bytes([i & 0xff, rnd.choice(statuses), 0]),
+        ]))
+    return stream
+
+
+def main():
+    schema = COMMANDS['messageSentHandler'][2]
+    compiled = t.Schema(schema)
+    stream = frames()
+
+    def run_compiled():
+        for data in stream:
+            compiled.deserialize(data)
+
+    def run_generic():
+        for data in stream:
+            t.deserialize(data, schema)
+
+    for name, run in (('compiled', run_compiled), ('generic', run_generic)):
+        elapsed = min(timeit.repeat(run, number=NUMBER, repeat=REPEAT))
+        print("%10s %10d frames/s" % (name, NUMBER * FRAMES / elapsed))
+
+
+if __name__ == '__main__':
+    main()
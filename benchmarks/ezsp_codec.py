@@ -0,0 +1,50 @@
+"""Micro-benchmark for EZSP frame payload codecs
+
+Compares the generic bellows.types.deserialize / serialize walk over a
+command schema with the compiled bellows.types.Schema codec, for the frames
+dominating the traffic of a busy network.
+
+    python benchmarks/ezsp_codec.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import bellows.types as t  # noqa: E402
+from bellows.commands import COMMANDS  # noqa: E402
+
+NUMBER = 20000
+
+# Schema name, payload (as sent by an NCP) or values to serialize
+APS = bytes.fromhex('0401060001014001000064')
+DECODE = [
+    ('incomingMessageHandler', b'\x00' + APS + b'\xff\xd0\x34\x12\xff\xff\x08' + b'\x18\x64\x0a\x00\x00\x10\x01\x00'),
+    ('messageSentHandler', b'\x00\x34\x12' + APS + b'\x64\x00\x00'),
+]
+ENCODE = 'sendUnicast'
+
+
+def main():
+    print("%24s %16s %16s" % ("frame", "generic/s", "compiled/s"))
+    for name, payload in DECODE:
+        schema = COMMANDS[name][2]
+        compiled = t.Schema(schema)
+        assert repr(compiled.deserialize(payload)) == repr(t.deserialize(payload, schema))
+        generic = timeit.timeit(lambda: t.deserialize(payload, schema), number=NUMBER)
+        fast = timeit.timeit(lambda: compiled.deserialize(payload), number=NUMBER)
+        print("%24s %16d %16d" % (name, NUMBER / generic, NUMBER / fast))
+
+    schema = COMMANDS[ENCODE][1]
+    compiled = t.Schema(schema)
+    values = t.deserialize(b'\x00\x34\x12' + APS + b'\x64\x03abc', schema)[0]
+    assert compiled.serialize(values) == t.serialize(values, schema)
+    generic = timeit.timeit(lambda: t.serialize(values, schema), number=NUMBER)
+    fast = timeit.timeit(lambda: compiled.serialize(values), number=NUMBER)
+    print("%24s %16d %16d" % (ENCODE, NUMBER / generic, NUMBER / fast))
+
+
+if __name__ == '__main__':
+    main()
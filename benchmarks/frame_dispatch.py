@@ -0,0 +1,79 @@
+"""Benchmark of incoming frame dispatch against the number of devices
+
+Feeds attribute reports from the last device added through
+ControllerApplication._handle_frame, with the device handlers stubbed out,
+so the time measured is decoding the frame and finding its device. The
+linear search by NWK address of the previous implementation is included
+for comparison.
+
+    python benchmarks/frame_dispatch.py
+"""
+
+import os
+import sys
+import timeit
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import bellows.types as t  # noqa: E402
+from bellows.zigbee import device  # noqa: E402
+from bellows.zigbee.application import ControllerApplication  # noqa: E402
+
+DEVICE_COUNTS = (1, 10, 100, 800, 3000)
+FRAMES = 20000
+
+
+class LinearSearchApplication(ControllerApplication):
+    def get_device(self, ieee=None, nwk=None):
+        if ieee is not None:
+            return self.devices[ieee]
+
+        for dev in self.devices.values():
+            if dev.nwk == nwk:
+                return dev
+
+        raise KeyError
+
+
+def application(cls, count):
+    app = cls(mock.MagicMock())
+    for i in range(count):
+        app.add_device(t.EmberEUI64(i.to_bytes(8, 'big')), i + 1)
+    return app
+
+
+def aps_frame():
+    aps = t.EmberApsFrame()
+    aps.profileId = t.uint16_t(0x0104)
+    aps.clusterId = t.uint16_t(0x0006)
+    aps.sourceEndpoint = t.uint8_t(1)
+    aps.destinationEndpoint = t.uint8_t(1)
+    aps.options = t.EmberApsOption(0)
+    aps.groupId = t.uint16_t(0)
+    aps.sequence = t.uint8_t(0)
+    return aps
+
+
+def run(app, sender):
+    aps = aps_frame()
+    # Report Attributes: on_off is true
+    message = b'\x18\x01\x0a\x00\x00\x10\x01'
+    elapsed = timeit.timeit(
+        lambda: app._handle_frame(0, aps, 255, -40, sender, 0, 0, message),
+        number=FRAMES,
+    )
+    return elapsed / FRAMES
+
+
+def main():
+    print("%8s %18s %18s" % ("devices", "linear us/frame", "indexed us/frame"))
+    with mock.patch.object(device.Device, 'handle_message'):
+        for count in DEVICE_COUNTS:
+            linear = run(application(LinearSearchApplication, count), count)
+            indexed = run(application(ControllerApplication, count), count)
+            print("%8d %18.2f %18.2f" % (count, linear * 1e6, indexed * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Import-time benchmark for the bellows entry points
+
+Each module is imported in a fresh interpreter, which reports how long the
+import took and how many modules it loaded; the fastest of several runs is
+shown. On Python 3.7+ the modules with the highest self time are also
+listed, as reported by `python -X importtime`.
+
+    python benchmarks/import_time.py [module ...]
+"""
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+MODULES = (
+    'bellows.cli.main',
+    'bellows.ezsp',
+    'bellows.zigbee.application',
+)
+RUNS = 20
+TOP = 8
+
+
+def import_time(module):
+    code = (
+        "import sys, time; start = time.perf_counter(); import %s; "
+        "print(time.perf_counter() - start, len(sys.modules))" % (module, )
+    )
+    runs = []
+    for _ in range(RUNS):
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT)
+        elapsed, modules = output.split()
+        runs.append((float(elapsed), int(modules)))
+    return min(runs)
+
+
+def heaviest(module):
+    output = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', 'import %s' % (module, )],
+        cwd=ROOT,
+        stderr=subprocess.STDOUT,
+    ).decode()
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        imports.append((int(self_us), name.strip()))
+    return sorted(imports, reverse=True)[:TOP]
+
+
+def main():
+    modules = sys.argv[1:] or MODULES
+    print("%-30s %11s %8s" % ("module", "import", "modules"))
+    for module in modules:
+        elapsed, count = import_time(module)
+        print("%-30s %8.1f ms %8d" % (module, elapsed * 1000, count))
+        if sys.version_info >= (3, 7):
+            for self_us, name in heaviest(module):
+                print("    %-40s %8.1f ms" % (name, self_us / 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Benchmark of an interactive command during a burst of attribute reads
+
+Joins DEVICES simulated devices, issues BURST bulk priority reads spread
+over them, like a dashboard refresh, and while they are queued turns one
+device on. The time to complete the command and the whole burst is compared
+with the request scheduler effectively disabled: no limits and every
+request of the same priority.
+
+    python benchmarks/request_burst.py
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+from simulated_network import join_network
+from bellows.zigbee.scheduler import Priority
+
+DEVICES = 10
+BURST = 300
+LATENCY = 0.005
+
+
+async def setup(database_file):
+    app, devices = await join_network(database_file, DEVICES, LATENCY)
+    return app, [dev.endpoints[1].in_clusters[0x0006] for dev in devices]
+
+
+async def burst(clusters, command_priority, read_priority):
+    start = time.perf_counter()
+    reads = [
+        asyncio.ensure_future(clusters[i % len(clusters)].read_attributes(
+            ['on_off'], priority=read_priority,
+        ))
+        for i in range(BURST)
+    ]
+    await asyncio.sleep(0)
+    await clusters[0].request(False, 0x01, (), priority=command_priority)
+    command = time.perf_counter() - start
+    await asyncio.gather(*reads)
+    return command, time.perf_counter() - start
+
+
+def main():
+    loop = asyncio.get_event_loop()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app, clusters = loop.run_until_complete(
+            setup(os.path.join(tmpdir, 'bench.db'))
+        )
+        limit = app.scheduler.max_in_flight
+        print("%12s %14s %12s" % ("", "command ms", "burst ms"))
+        for name, max_in_flight, per_device, read_priority in (
+            ('unscheduled', BURST, BURST, Priority.INTERACTIVE),
+            ('scheduled', limit, app.scheduler.per_device, Priority.BULK),
+        ):
+            app.scheduler.max_in_flight = max_in_flight
+            app.scheduler.per_device = per_device
+            command, total = loop.run_until_complete(
+                burst(clusters, Priority.INTERACTIVE, read_priority)
+            )
+            print("%12s %14.1f %12.1f" % (name, command * 1e3, total * 1e3))
+        app._ezsp.close()
+        loop.run_until_complete(asyncio.sleep(0))
+
+
+if __name__ == '__main__':
+    main()
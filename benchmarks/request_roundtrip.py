@@ -0,0 +1,116 @@
+"""Benchmark of request round trip overhead against the NCP simulator
+
+Reads an attribute of a simulated device with no radio latency, so the time
+measured is spent in bellows and the event loop: ZCL, the application
+request, EZSP, ASH and the simulator's side of each. Requests are issued one
+at a time and CONCURRENCY at a time.
+
+The await overhead of the generator based coroutines previously used is
+compared with native coroutines by a chain of CHAIN_DEPTH calls, about the
+depth of Cluster.read_attributes down to the EZSP command.
+
+    python benchmarks/request_roundtrip.py [--uvloop]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import timeit
+import types
+
+from simulated_network import join_network
+
+REQUESTS = 2000
+CONCURRENCY = 16
+CHAIN_DEPTH = 6
+AWAITS = 100000
+
+
+async def setup(database_file):
+    app, devices = await join_network(database_file)
+    return app, devices[0].endpoints[1].in_clusters[0x0006]
+
+
+async def sequential(cluster):
+    start = time.perf_counter()
+    for i in range(REQUESTS):
+        await cluster.read_attributes(['on_off'])
+    return time.perf_counter() - start
+
+
+async def concurrent(cluster):
+    async def worker():
+        for i in range(REQUESTS // CONCURRENCY):
+            await cluster.read_attributes(['on_off'])
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for i in range(CONCURRENCY)])
+    return time.perf_counter() - start
+
+
+@types.coroutine
+def generator_leaf():
+    return None
+    yield
+
+
+def generator_chain(depth):
+    @types.coroutine
+    def call():
+        if depth == 1:
+            return (yield from generator_leaf())
+        return (yield from generator_chain(depth - 1)())
+    return call
+
+
+async def native_leaf():
+    return None
+
+
+def native_chain(depth):
+    async def call():
+        if depth == 1:
+            return await native_leaf()
+        return await native_chain(depth - 1)()
+    return call
+
+
+def await_overhead(loop, chain):
+    call = chain(CHAIN_DEPTH)
+
+    async def run():
+        for i in range(AWAITS):
+            await call()
+
+    return min(timeit.repeat(
+        lambda: loop.run_until_complete(run()), number=1, repeat=3,
+    )) / AWAITS
+
+
+def main():
+    if '--uvloop' in sys.argv:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app, cluster = loop.run_until_complete(
+            setup(os.path.join(tmpdir, 'bench.db'))
+        )
+        for name, run in (('sequential', sequential), ('concurrent', concurrent)):
+            elapsed = loop.run_until_complete(run(cluster))
+            print("%10s %10.0f requests/s %8.1f us/request" % (
+                name, REQUESTS / elapsed, elapsed / REQUESTS * 1e6))
+        app._ezsp.close()
+        loop.run_until_complete(asyncio.sleep(0))
+
+    for name, chain in (('generator', generator_chain), ('native', native_chain)):
+        print("%10s %10.3f us per %d deep call" % (
+            name, await_overhead(loop, chain) * 1e6, CHAIN_DEPTH))
+
+
+if __name__ == '__main__':
+    main()
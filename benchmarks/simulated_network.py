@@ -0,0 +1,34 @@
+"""Helper for the benchmarks run against the NCP simulator"""
+
+import asyncio
+import os
+import sys
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bellows.ezsp import EZSP  # noqa: E402
+from bellows.zigbee.application import ControllerApplication  # noqa: E402
+
+
+async def join_network(database_file, devices=1, latency=None):
+    """Start an application on a simulated NCP and let its devices join
+
+    Returns the application and the devices, once all are initialized.
+    """
+    url = 'sim://?devices=%d&seed=1' % (devices, )
+    if latency is not None:
+        url += '&latency=%s' % (latency, )
+    ezsp = EZSP()
+    await ezsp.connect(url, 57600)
+    app = ControllerApplication(ezsp, database_file)
+    await app.startup()
+
+    initialized = []
+    listener = mock.MagicMock()
+    listener.device_initialized = initialized.append
+    app.add_listener(listener)
+    await app.permit(60)
+    while len(initialized) < devices:
+        await asyncio.sleep(0.01)
+    return app, initialized
@@ -0,0 +1,60 @@
+"""Benchmark of single-flight reads by concurrent consumers
+
+CONSUMERS consumers, like the REST API, the websocket server and a poller,
+each read the same attribute of every simulated device at about the same
+moment, for ROUNDS rounds. The unicasts sent and the time taken are
+compared with and without single_flight.
+
+    python benchmarks/single_flight.py
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+from unittest import mock
+
+from simulated_network import join_network
+
+DEVICES = 10
+CONSUMERS = 3
+ROUNDS = 20
+LATENCY = 0.005
+
+
+async def setup(database_file):
+    app, devices = await join_network(database_file, DEVICES, LATENCY)
+    return app, [dev.endpoints[1].in_clusters[0x0006] for dev in devices]
+
+
+async def run(app, clusters, single_flight):
+    async def consumer():
+        await asyncio.gather(*[
+            cluster.read_attributes(['on_off'], single_flight=single_flight)
+            for cluster in clusters
+        ])
+
+    sent = app._ezsp.sendUnicast.call_count
+    start = time.perf_counter()
+    for i in range(ROUNDS):
+        await asyncio.gather(*[consumer() for i in range(CONSUMERS)])
+    return app._ezsp.sendUnicast.call_count - sent, time.perf_counter() - start
+
+
+def main():
+    loop = asyncio.get_event_loop()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app, clusters = loop.run_until_complete(
+            setup(os.path.join(tmpdir, 'bench.db'))
+        )
+        app._ezsp.sendUnicast = mock.Mock(wraps=app._ezsp.sendUnicast)
+        print("%14s %10s %10s" % ("", "unicasts", "ms"))
+        for name, single_flight in (('independent', False), ('single-flight', True)):
+            sent, elapsed = loop.run_until_complete(run(app, clusters, single_flight))
+            print("%14s %10d %10.1f" % (name, sent, elapsed * 1e3))
+        app._ezsp.close()
+        loop.run_until_complete(asyncio.sleep(0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Micro-benchmark for decoding large ZCL attribute reports
+
+Reports how many Report Attributes frames per second can be decoded, and
+the cost per attribute, for reports carrying an increasing number of
+attributes.  Run it against an older checkout to compare decoders.
+
+    python benchmarks/zcl_report.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import bellows.types as t  # noqa: E402
+from bellows.zigbee import zcl  # noqa: E402
+
+COUNTS = (1, 10, 50, 100, 200, 400)
+ATTRIBUTES = 20000
+
+
+def report(count):
+    data = b'\x18\x01\x0a'
+    for attrid in range(count):
+        data += t.uint16_t(attrid).serialize()
+        if attrid % 4 == 3:
+            data += b'\x42' + t.LVBytes(b'sensor').serialize()
+        else:
+            data += b'\x29' + t.int16s(-attrid).serialize()
+    return data
+
+
+def main():
+    print("%10s %8s %16s %16s" % ("attributes", "bytes", "frames/s", "us/attribute"))
+    for count in COUNTS:
+        frame = report(count)
+        tsn, command_id, is_reply, args = zcl.deserialize(0x0402, frame)
+        assert command_id == 0x0a and len(args[0]) == count
+        number = max(1, ATTRIBUTES // count)
+        elapsed = timeit.timeit(lambda: zcl.deserialize(0x0402, frame), number=number)
+        print("%10d %8d %16d %16.2f" % (
+            count, len(frame), number / elapsed, elapsed * 1e6 / (number * count)))
+
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,7 @@ setup(
     author_email="rcloran@gmail.com",
     license="GPL-3.0",
     packages=find_packages(exclude=['*.tests']),
+    python_requires='>=3.5.3',
     entry_points={
         'console_scripts': ['bellows=bellows.cli.main:main'],
     },
@@ -1,17 +1,23 @@
 import asyncio
+import gc
 from unittest import mock
 
 import pytest
 
 import bellows.types as t
+import bellows.zigbee.application
 from bellows.zigbee.application import ControllerApplication
 from bellows.zigbee.exceptions import DeliveryError
+from bellows.zigbee.scheduler import Priority
 from bellows.zigbee import device
 
 
 @pytest.fixture
 def app():
     ezsp = mock.MagicMock()
+    ezsp.reset = get_mock_coro(True)
+    ezsp.version = get_mock_coro(None)
+    ezsp.getConfigurationValue = get_mock_coro([t.EzspStatus.SUCCESS, 10])
     return ControllerApplication(ezsp)
 
 
@@ -28,8 +34,7 @@ def ieee(init=0):
 
 
 def get_mock_coro(return_value):
-    @asyncio.coroutine
-    def mock_coro(*args, **kwargs):
+    async def mock_coro(*args, **kwargs):
         return return_value
 
     return mock.Mock(wraps=mock_coro)
@@ -38,23 +43,24 @@ def get_mock_coro(return_value):
 def _test_startup(app, nwk_type, auto_form=False, init=0):
     # This is a fairly brittle and pointless test. Except the point is just
     # to allow startup to run all its paths and check types etc.
-    @asyncio.coroutine
-    def mockezsp(*args, **kwargs):
+    async def mockezsp(*args, **kwargs):
         return [0, nwk_type]
 
-    @asyncio.coroutine
-    def mockinit(*args, **kwargs):
+    async def mockinit(*args, **kwargs):
         return [init]
 
+    async def mockconfig(config):
+        return {config_id: 0 for config_id, _ in config}
+
     app._ezsp._command = mockezsp
-    app._ezsp.setConfigurationValue = mockezsp
+    app._ezsp.update_config = mockconfig
     app._ezsp.networkInit = mockinit
     app._ezsp.getNetworkParameters = mockezsp
     app._ezsp.setPolicy = mockezsp
     app._ezsp.getNodeId = mockezsp
     app._ezsp.getEui64 = mockezsp
     app._ezsp.leaveNetwork = mockezsp
-    app.form_network = mock.MagicMock()
+    app.form_network = get_mock_coro(None)
 
     loop = asyncio.get_event_loop()
     loop.run_until_complete(app.startup(auto_form=auto_form))
@@ -64,6 +70,48 @@ def test_startup(app):
     return _test_startup(app, t.EmberNodeType.COORDINATOR)
 
 
+def test_startup_timings(app):
+    _test_startup(app, t.EmberNodeType.COORDINATOR)
+    assert list(app.startup_timings) == ['reset', 'config', 'network', 'policy']
+    assert all(v >= 0 for v in app.startup_timings.values())
+
+
+def test_startup_sizes_scheduler(app):
+    _test_startup(app, t.EmberNodeType.COORDINATOR)
+    # 10 packet buffers are enough for 2 requests
+    assert app.scheduler.max_in_flight == 2
+
+
+def test_initialize_config_failure(app):
+    async def mockconfig(config):
+        return {config_id: 1 for config_id, _ in config}
+
+    app._ezsp.update_config = mockconfig
+    loop = asyncio.get_event_loop()
+    with pytest.raises(AssertionError):
+        loop.run_until_complete(app.initialize())
+
+
+def test_initialize_optional_config_failure(app):
+    async def mockconfig(config):
+        c = t.EzspConfigId
+        return {
+            config_id: int(config_id == c.CONFIG_TRANSIENT_KEY_TIMEOUT_S)
+            for config_id, _ in config
+        }
+
+    app._ezsp.update_config = mockconfig
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(app.initialize())
+
+
+def test_startup_subscribes_once(app):
+    _test_startup(app, t.EmberNodeType.COORDINATOR)
+    _test_startup(app, t.EmberNodeType.COORDINATOR)
+    frames = [c[0][0] for c in app._ezsp.subscribe.call_args_list]
+    assert sorted(frames) == sorted(bellows.zigbee.application.EZSP_HANDLERS)
+
+
 def test_startup_no_status(app):
     with pytest.raises(Exception):
         return _test_startup(app, None, init=1)
@@ -86,6 +134,8 @@ def test_form_network(app):
     f = asyncio.Future()
     f.set_result([0])
     app._ezsp.setInitialSecurityState.side_effect = [f]
+    app._ezsp.formNetwork = get_mock_coro(None)
+    app._ezsp.setValue = get_mock_coro([0])
 
     loop = asyncio.get_event_loop()
     loop.run_until_complete(app.form_network())
@@ -103,6 +153,16 @@ def _frame_handler(app, aps, ieee, endpoint, cluster=0, sender=3):
     )
 
 
+def _transaction(app, tsn=1, nwk=3, tag=None):
+    transaction = mock.MagicMock()
+    transaction.nwk = nwk
+    transaction.tsn = tsn
+    transaction.tag = tsn if tag is None else tag
+    app._pending._pending[(nwk, tsn)] = transaction
+    app._pending._tags[transaction.tag] = transaction
+    return transaction.send_fut, transaction.reply_fut
+
+
 def test_frame_handler_unknown_device(app, aps, ieee):
     return _frame_handler(app, aps, ieee, 0, sender=99)
 
@@ -112,15 +172,15 @@ def test_frame_handler_zdo(app, aps, ieee):
 
 
 def test_frame_handler_zdo_reply(app, aps, ieee):
-    send_fut, reply_fut = app._pending[1] = (mock.MagicMock(), mock.MagicMock())
+    send_fut, reply_fut = _transaction(app, 1)
     _frame_handler(app, aps, ieee, 0, 0x8000)
     assert send_fut.set_result.call_count == 0
     assert reply_fut.set_result.call_count == 1
 
 
 def test_frame_handler_dup_zdo_reply(app, aps, ieee):
-    send_fut, reply_fut = app._pending[1] = (mock.MagicMock(), mock.MagicMock())
-    reply_fut.set_result.side_effect = asyncio.futures.InvalidStateError()
+    send_fut, reply_fut = _transaction(app, 1)
+    reply_fut.set_result.side_effect = asyncio.InvalidStateError()
     _frame_handler(app, aps, ieee, 0, 0x8000)
     assert send_fut.set_result.call_count == 0
     assert reply_fut.set_result.call_count == 1
@@ -135,7 +195,7 @@ def test_frame_handler_zcl(app, aps, ieee):
 
 
 def test_send_failure(app, aps, ieee):
-    send_fut, reply_fut = app._pending[254] = (mock.MagicMock(), mock.MagicMock())
+    send_fut, reply_fut = _transaction(app, 254)
     app.ezsp_callback_handler(
         'messageSentHandler',
         [None, None, None, 254, 1, b'']
@@ -145,8 +205,8 @@ def test_send_failure(app, aps, ieee):
 
 
 def test_dup_send_failure(app, aps, ieee):
-    send_fut, reply_fut = app._pending[254] = (mock.MagicMock(), mock.MagicMock())
-    send_fut.set_exception.side_effect = asyncio.futures.InvalidStateError()
+    send_fut, reply_fut = _transaction(app, 254)
+    send_fut.set_exception.side_effect = asyncio.InvalidStateError()
     app.ezsp_callback_handler(
         'messageSentHandler',
         [None, None, None, 254, 1, b'']
@@ -163,7 +223,7 @@ def test_send_failure_unexpected(app, aps, ieee):
 
 
 def test_send_success(app, aps, ieee):
-    send_fut, reply_fut = app._pending[253] = (mock.MagicMock(), mock.MagicMock())
+    send_fut, reply_fut = _transaction(app, 253)
     app.ezsp_callback_handler(
         'messageSentHandler',
         [None, None, None, 253, 0, b'']
@@ -181,8 +241,8 @@ def test_unexpected_send_success(app, aps, ieee):
 
 
 def test_dup_send_success(app, aps, ieee):
-    send_fut, reply_fut = app._pending[253] = (mock.MagicMock(), mock.MagicMock())
-    send_fut.set_result.side_effect = asyncio.futures.InvalidStateError()
+    send_fut, reply_fut = _transaction(app, 253)
+    send_fut.set_result.side_effect = asyncio.InvalidStateError()
     app.ezsp_callback_handler(
         'messageSentHandler',
         [None, None, None, 253, 0, b'']
@@ -218,7 +278,9 @@ def test_leave_handler(app, ieee):
 
 
 def test_remove(app, ieee):
-    app.devices[ieee] = mock.MagicMock()
+    dev = mock.MagicMock()
+    dev.zdo.leave = get_mock_coro([0])
+    app.devices[ieee] = dev
     loop = asyncio.get_event_loop()
     loop.run_until_complete(app.remove(ieee))
     assert ieee not in app.devices
@@ -258,6 +320,73 @@ def test_get_device_both(app, ieee):
     assert app.get_device(ieee=ieee, nwk=8) is dev
 
 
+def test_get_device_nwk_missing(app, ieee):
+    app.add_device(ieee, 8)
+    with pytest.raises(KeyError):
+        app.get_device(nwk=9)
+
+
+def test_get_device_nwk_changed(app, ieee):
+    dev = app.add_device(ieee, 8)
+    dev.nwk = 9
+    assert app.get_device(nwk=9) is dev
+    with pytest.raises(KeyError):
+        app.get_device(nwk=8)
+
+
+def test_get_device_nwk_join(app, ieee):
+    dev = app.add_device(ieee, 8)
+    dev.status = device.Status.INITIALIZED
+    app._handle_join(9, ieee, None, None, None)
+    assert app.get_device(nwk=9) is dev
+    with pytest.raises(KeyError):
+        app.get_device(nwk=8)
+
+
+def test_get_device_nwk_readded(app, ieee):
+    app.add_device(ieee, 8)
+    dev = app.add_device(ieee, 9)
+    assert app.get_device(nwk=9) is dev
+    with pytest.raises(KeyError):
+        app.get_device(nwk=8)
+
+
+def test_get_device_nwk_removed(app, ieee):
+    dev = app.add_device(ieee, 8)
+    dev.zdo.leave = get_mock_coro([0])
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(app.remove(ieee))
+    with pytest.raises(KeyError):
+        app.get_device(nwk=8)
+
+
+def test_get_device_nwk_conflict(app, ieee, caplog):
+    dev1 = app.add_device(ieee, 8)
+    ieee2 = t.EmberEUI64(map(t.uint8_t, range(1, 9)))
+    dev2 = app.add_device(ieee2, 8)
+    assert 'NWK address conflict' in caplog.text
+    assert app.get_device(nwk=8) is dev2
+    # The device losing the address keeps the new owner indexed
+    dev1.nwk = 10
+    assert app.get_device(nwk=8) is dev2
+    assert app.get_device(nwk=10) is dev1
+
+
+def test_device_announce(app, aps, ieee):
+    dev = app.add_device(ieee, 8)
+    dev.handle_message = mock.MagicMock()
+    aps.destinationEndpoint = 0
+    aps.clusterId = 0x0013
+    announce = b'\x01' + t.uint16_t(9).serialize() + ieee.serialize() + b'\x8e'
+    app.ezsp_callback_handler(
+        'incomingMessageHandler',
+        [None, aps, 1, 2, 9, 4, 5, announce]
+    )
+    assert dev.nwk == 9
+    assert app.get_device(nwk=9) is dev
+    assert dev.handle_message.call_count == 1
+
+
 def test_permit(app):
     app.permit(60)
     assert app._ezsp.permitJoining.call_count == 1
@@ -299,10 +428,10 @@ def test_permit_with_key_failed_add_key(app, ieee):
 
 
 def _request(app, aps, returnvals, **kwargs):
-    @asyncio.coroutine
-    def mocksend(method, nwk, aps_frame, seq, data):
-        app._pending[seq][0].set_result(True)
-        app._pending[seq][1].set_result(mock.sentinel.result)
+    async def mocksend(method, nwk, aps_frame, tag, data):
+        transaction = app._pending._tags[tag]
+        transaction.send_fut.set_result(True)
+        transaction.reply_fut.set_result(mock.sentinel.result)
         return [returnvals.pop(0)]
 
     app._ezsp.sendUnicast = mocksend
@@ -314,6 +443,13 @@ def test_request(app, aps):
     assert _request(app, aps, [0]) == mock.sentinel.result
 
 
+def test_request_scheduled(app, aps):
+    _request(app, aps, [0], priority=Priority.BULK)
+    assert app.scheduler.started[Priority.BULK] == 1
+    assert app.scheduler.active == 0
+    assert app.scheduler.in_flight == 0
+
+
 def test_request_fail(app, aps):
     with pytest.raises(DeliveryError):
         _request(app, aps, [1])
@@ -325,8 +461,272 @@ def test_request_retry(app, aps):
     assert returnvals == [0]
 
 
+def test_request_uses_message_tag(app, aps):
+    tags = []
+
+    async def mocksend(method, nwk, aps_frame, tag, data):
+        tags.append(tag)
+        transaction = app._pending._tags[tag]
+        assert transaction.tsn == aps_frame.sequence
+        transaction.send_fut.set_result(True)
+        transaction.reply_fut.set_result(mock.sentinel.result)
+        return [0]
+
+    app._ezsp.sendUnicast = mocksend
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(app.request(0x1234, aps, b''))
+    loop.run_until_complete(app.request(0x1234, aps, b''))
+    assert len(app._pending) == 0
+    assert tags[0] != tags[1]
+
+
+def test_request_same_tsn_queued(app, aps):
+    loop = asyncio.get_event_loop()
+    sent = []
+
+    async def mocksend(method, nwk, aps_frame, tag, data):
+        sent.append(tag)
+        app._pending._tags[tag].send_fut.set_result(True)
+        return [0]
+
+    app._ezsp.sendUnicast = mocksend
+    first = asyncio.ensure_future(app.request(0x1234, aps, b''))
+    second = asyncio.ensure_future(app.request(0x1234, aps, b''))
+    loop.run_until_complete(asyncio.sleep(0))
+    assert len(sent) == 1
+
+    _reply(app, 0x1234, aps.sequence, mock.sentinel.first)
+    assert loop.run_until_complete(first) == mock.sentinel.first
+    loop.run_until_complete(asyncio.sleep(0))
+    assert len(sent) == 2
+    _reply(app, 0x1234, aps.sequence, mock.sentinel.second)
+    assert loop.run_until_complete(second) == mock.sentinel.second
+
+
+def test_reply_matched_by_sender(app, aps):
+    loop = asyncio.get_event_loop()
+
+    async def mocksend(method, nwk, aps_frame, tag, data):
+        app._pending._tags[tag].send_fut.set_result(True)
+        return [0]
+
+    app._ezsp.sendUnicast = mocksend
+    app._handle_message = mock.MagicMock()
+    request = asyncio.ensure_future(app.request(0x1234, aps, b''))
+    loop.run_until_complete(asyncio.sleep(0))
+
+    _reply(app, 0x4321, aps.sequence, mock.sentinel.other)
+    assert app._handle_message.call_count == 1
+    assert not request.done()
+    _reply(app, 0x1234, aps.sequence, mock.sentinel.result)
+    assert loop.run_until_complete(request) == mock.sentinel.result
+
+
+def _assert_cleaned_up(app):
+    assert len(app._pending) == 0
+    assert app._pending._tags == {}
+    assert app.scheduler.active == 0
+
+
+def test_request_send_timeout(app, aps):
+    # No messageSentHandler ever arrives
+    app._ezsp.sendUnicast = get_mock_coro([0])
+    loop = asyncio.get_event_loop()
+    with pytest.raises(asyncio.TimeoutError):
+        loop.run_until_complete(app.request(0x1234, aps, b'', timeout=0.01))
+    _assert_cleaned_up(app)
+
+
+def _request_times_out(app, aps):
+    loop = asyncio.get_event_loop()
+    start = loop.time()
+    with pytest.raises(asyncio.TimeoutError):
+        # The outer timeout only stops a hang if the deadline is not kept
+        loop.run_until_complete(asyncio.wait_for(
+            app.request(0x1234, aps, b'', timeout=0.01), 1,
+        ))
+    assert loop.time() - start < 0.5
+
+
+def test_request_sendunicast_stalled(app, aps):
+    loop = asyncio.get_event_loop()
+    stalled = loop.create_future()
+    app._ezsp.sendUnicast = mock.MagicMock(return_value=stalled)
+    _request_times_out(app, aps)
+    _assert_cleaned_up(app)
+
+
+def test_request_tsn_wait_timeout(app, aps):
+    loop = asyncio.get_event_loop()
+    app._ezsp.sendUnicast = get_mock_coro([0])
+    # An earlier request still holds the TSN
+    earlier = loop.run_until_complete(app._pending.begin(0x1234, aps.sequence))
+    _request_times_out(app, aps)
+    assert app._ezsp.sendUnicast.call_count == 0
+    assert app._pending.waiting == 0
+    assert app.scheduler.active == 0
+    app._pending.end(earlier)
+    _assert_cleaned_up(app)
+
+
+def test_request_send_failure_after_expiry(app, aps):
+    loop = asyncio.get_event_loop()
+
+    async def mocksend(method, nwk, aps_frame, tag, data):
+        app._pending._tags[tag].send_fut.set_exception(asyncio.TimeoutError())
+        return [1]
+
+    app._ezsp.sendUnicast = mocksend
+    with mock.patch.object(loop, 'call_exception_handler') as handler:
+        with pytest.raises(DeliveryError):
+            loop.run_until_complete(app.request(0x1234, aps, b''))
+        gc.collect()
+    assert handler.call_count == 0
+    _assert_cleaned_up(app)
+
+
+def test_request_reply_timeout(app, aps):
+    async def mocksend(method, nwk, aps_frame, tag, data):
+        app._pending._tags[tag].send_fut.set_result(True)
+        return [0]
+
+    app._ezsp.sendUnicast = mocksend
+    loop = asyncio.get_event_loop()
+    with pytest.raises(asyncio.TimeoutError):
+        loop.run_until_complete(app.request(0x1234, aps, b'', timeout=0.01))
+    _assert_cleaned_up(app)
+
+
+def test_request_cancelled(app, aps):
+    app._ezsp.sendUnicast = get_mock_coro([0])
+    loop = asyncio.get_event_loop()
+    request = asyncio.ensure_future(app.request(0x1234, aps, b''))
+    loop.run_until_complete(asyncio.sleep(0.01))
+    assert len(app._pending) == 1
+    request.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        loop.run_until_complete(request)
+    _assert_cleaned_up(app)
+
+
+def test_request_no_reply(app, aps):
+    async def mocksend(method, nwk, aps_frame, tag, data):
+        assert app._pending.get(nwk, aps_frame.sequence) is None
+        app._pending._tags[tag].send_fut.set_result(True)
+        return [0]
+
+    app._ezsp.sendUnicast = mocksend
+    loop = asyncio.get_event_loop()
+    result = loop.run_until_complete(
+        app.request(0x1234, aps, b'', expect_reply=False, timeout=0.01)
+    )
+    assert result is None
+    _assert_cleaned_up(app)
+
+
+def test_sweep_pending(app):
+    loop = asyncio.get_event_loop()
+    transaction = loop.run_until_complete(
+        app._pending.begin(0x1234, 1, deadline=loop.time() - 1)
+    )
+    reserved = app._pending.reserve_tag(deadline=loop.time() - 1)
+    app._sweep_pending()
+    assert isinstance(transaction.send_fut.exception(), asyncio.TimeoutError)
+    assert reserved not in app._pending._tags
+    _assert_cleaned_up(app)
+    assert app._sweep_handle is not None
+    app._sweep_handle.cancel()
+
+
+def test_startup_schedules_sweep(app):
+    _test_startup(app, t.EmberNodeType.COORDINATOR)
+    handle = app._sweep_handle
+    assert handle is not None
+    _test_startup(app, t.EmberNodeType.COORDINATOR)
+    assert app._sweep_handle is handle
+    handle.cancel()
+
+
+def _reply(app, sender, tsn, args):
+    app._handle_reply(sender, None, tsn, 0x8000, args)
+
+
+def test_reply_tag(app, aps):
+    app._ezsp.sendUnicast = get_mock_coro([0])
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(app.reply(0x1234, aps, b''))
+    tag = app._ezsp.sendUnicast.call_args[0][3]
+    assert tag in app._pending._tags
+    app.ezsp_callback_handler(
+        'messageSentHandler',
+        [None, None, None, tag, 0, b'']
+    )
+    assert tag not in app._pending._tags
+
+
+def test_reply_send_failure(app, aps):
+    app._ezsp.sendUnicast = get_mock_coro([1])
+    loop = asyncio.get_event_loop()
+    assert loop.run_until_complete(app.reply(0x1234, aps, b'')) == [1]
+    assert app._pending._tags == {}
+
+
+def test_reply_waits_for_tag(app, aps):
+    loop = asyncio.get_event_loop()
+    app._ezsp.sendUnicast = get_mock_coro([0])
+    tags = [app._pending.reserve_tag() for i in range(256)]
+    reply = asyncio.ensure_future(app.reply(0x1234, aps, b''))
+    loop.run_until_complete(asyncio.sleep(0))
+    assert not reply.done()
+    assert app._ezsp.sendUnicast.call_count == 0
+
+    app._pending.sent(tags[10])
+    loop.run_until_complete(reply)
+    assert app._ezsp.sendUnicast.call_args[0][3] == tags[10]
+
+
+def test_sequence_per_destination(app):
+    assert app.get_sequence(1) == app.get_sequence(2)
+
+
 def test_request_retry_fail(app, aps):
     returnvals = [1, 1, 0, 0]
     with pytest.raises(DeliveryError):
         assert _request(app, aps, returnvals, tries=2, delay=0)
     assert returnvals == [0, 0]
+
+
+def test_reset_request(app, monkeypatch):
+    monkeypatch.setattr(bellows.zigbee.application, 'RESET_ATTEMPT_BACKOFF_TIME', 0)
+    attempts = []
+
+    async def mockreconnect():
+        attempts.append(None)
+        if len(attempts) == 1:
+            raise Exception("Port busy")
+
+    app._ezsp.reconnect = mockreconnect
+    app.startup = get_mock_coro(None)
+
+    app.ezsp_callback_handler('_reset_controller_application', [mock.sentinel.error])
+    task = app._reset_task
+    # A second failure while resetting does not start another reset
+    app.ezsp_callback_handler('_reset_controller_application', [mock.sentinel.error])
+    assert app._reset_task is task
+
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(task)
+    assert len(attempts) == 2
+    assert app.startup.call_count == 1
+
+
+def test_start_counter_sampler(app):
+    with mock.patch('bellows.zigbee.counters.CounterSampler') as sampler:
+        counters = app.start_counter_sampler(interval=5, history=10)
+        assert counters is app.counters
+        sampler.assert_called_once_with(app._ezsp, 5, 10)
+        assert counters.start.call_count == 1
+
+        assert app.start_counter_sampler() is counters
+        assert sampler.call_count == 1
+        assert counters.start.call_count == 2
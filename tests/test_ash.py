@@ -0,0 +1,87 @@
+import os
+import random
+
+import pytest
+
+from bellows import ash
+
+
+def reference_randomize(s):
+    rand = 0x42
+    out = b''
+    for c in s:
+        out += bytes([c ^ rand])
+        if rand % 2:
+            rand = (rand >> 1) ^ 0xB8
+        else:
+            rand = rand >> 1
+    return out
+
+
+def reference_stuff(s):
+    out = b''
+    for c in s:
+        if c in ash.RESERVED:
+            out += ash.ESCAPE + bytes([c ^ 0x20])
+        else:
+            out += bytes([c])
+    return out
+
+
+def reference_unstuff(s):
+    out = b''
+    escaped = False
+    for c in s:
+        if escaped:
+            out += bytes([c ^ 0x20])
+            escaped = False
+        elif c == 0x7D:
+            escaped = True
+        else:
+            out += bytes([c])
+    return out
+
+
+def payloads():
+    rnd = random.Random(0x42)
+    yield b''
+    yield ash.RESERVED
+    yield ash.RESERVED * 3
+    yield bytes(range(256))
+    for length in range(1, 140):
+        yield bytes(rnd.getrandbits(8) for _ in range(length))
+    yield os.urandom(600)
+
+
+@pytest.mark.parametrize('data', list(payloads()))
+def test_randomize_equivalence(data):
+    assert ash.randomize(data) == reference_randomize(data)
+    assert ash.randomize(ash.randomize(data)) == data
+
+
+@pytest.mark.parametrize('data', list(payloads()))
+def test_stuff_equivalence(data):
+    stuffed = ash.stuff(data)
+    assert stuffed == reference_stuff(data)
+    assert not any(c in stuffed for c in ash.RESERVED if c != ash.ESCAPE[0])
+    assert ash.unstuff(stuffed) == reference_unstuff(stuffed) == data
+
+
+@pytest.mark.parametrize('data', [
+    b'\x7d',
+    b'abc\x7d',
+    b'\x7d\x7d\x31',
+    b'\x7d\x5d\x7d',
+    b'\x7e\x7d\x7e',
+])
+def test_unstuff_malformed(data):
+    assert ash.unstuff(data) == reference_unstuff(data)
+
+
+def test_types():
+    assert isinstance(ash.randomize(bytearray(b'\x00')), bytes)
+    assert isinstance(ash.stuff(bytearray(b'\x7e')), bytes)
+    assert isinstance(ash.unstuff(bytearray(b'\x00')), bytes)
+    assert isinstance(ash.unstuff(bytearray(b'\x7d\x5e')), bytes)
+    assert ash.unstuff(memoryview(b'\x00\x7d\x5e')[1:]) == b'\x7e'
+    assert isinstance(ash.unstuff(memoryview(b'\x00')), bytes)
@@ -1,3 +1,39 @@
-import bellows.cli  # noqa: F401
+import subprocess
+import sys
 
-# Just being able to import is a small test...
+import click
+import pytest
+
+from bellows.cli import main
+
+
+def test_commands():
+    ctx = click.Context(main.main)
+    names = main.main.list_commands(ctx)
+    assert sorted(name.replace('-', '_') for name in names) == sorted(main.COMMANDS)
+
+
+@pytest.mark.parametrize('name', sorted(main.COMMANDS))
+def test_get_command(name):
+    ctx = click.Context(main.main)
+    command = main.main.get_command(ctx, name.replace('_', '-'))
+    assert command is not None
+    assert command.callback.__module__ == 'bellows.cli.' + main.COMMANDS[name]
+
+
+def test_get_command_unknown():
+    ctx = click.Context(main.main)
+    assert main.main.get_command(ctx, 'nope') is None
+
+
+def test_lazy_import():
+    code = (
+        "import sys, bellows.cli.main, bellows.zigbee.application;"
+        "print(' '.join(sorted(sys.modules)))"
+    )
+    modules = subprocess.check_output([sys.executable, '-c', code]).split()
+    assert b'bellows.cli.application' not in modules
+    assert b'bellows.zigbee.zcl.clusters.general' not in modules
+    assert b'Crypto' not in modules
+    assert b'crccheck' not in modules
+    assert b'sqlite3' not in modules
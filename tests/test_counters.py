@@ -0,0 +1,148 @@
+import asyncio
+from unittest import mock
+
+import pytest
+
+import bellows.types as t
+from bellows.ezsp import EZSP
+from bellows.zigbee import counters
+
+C = t.EmberCounterType
+
+
+def _counters(**values):
+    result = [0] * len(counters.COUNTER_TYPES)
+    for name, value in values.items():
+        result[C[name]] = value
+    return result
+
+
+@pytest.fixture
+def ezsp():
+    ezsp = EZSP()
+    ezsp._gw = mock.MagicMock()
+    return ezsp
+
+
+def _sample(sampler, ezsp, values):
+    def mockcommand(name, *args):
+        assert name == 'readCounters'
+        fut = asyncio.Future()
+        fut.set_result([values])
+        return fut
+
+    ezsp._command = mockcommand
+    return asyncio.get_event_loop().run_until_complete(sampler.sample())
+
+
+def test_counter_name():
+    assert counters.counter_name(C.COUNTER_MAC_RX_BROADCAST) == 'mac_rx_broadcast'
+    assert counters.counter_name(C.COUNTER_TYPE_NWK_RETRY_OVERFLOW) == 'nwk_retry_overflow'
+    assert C.COUNTER_TYPE_COUNT not in counters.COUNTER_TYPES
+
+
+def test_sample(ezsp):
+    sampler = counters.CounterSampler(ezsp)
+    assert _sample(sampler, ezsp, _counters(COUNTER_MAC_RX_BROADCAST=10)) is None
+    assert sampler.latest is None
+    assert sampler.rates() == {}
+
+    sample = _sample(sampler, ezsp, _counters(COUNTER_MAC_RX_BROADCAST=25, COUNTER_APS_DATA_TX_UNICAST_FAILED=3))
+    assert sample is sampler.latest
+    assert sample.delta(C.COUNTER_MAC_RX_BROADCAST) == 15
+    assert sample.delta(C.COUNTER_APS_DATA_TX_UNICAST_FAILED) == 3
+    assert sample.delta(C.COUNTER_MAC_TX_BROADCAST) == 0
+    assert sampler.totals[C.COUNTER_MAC_RX_BROADCAST] == 15
+
+    sample.interval = 5
+    assert sample.rate(C.COUNTER_MAC_RX_BROADCAST) == 3
+    assert sampler.rates()['mac_rx_broadcast'] == 3
+    sample.interval = 0
+    assert sample.rate(C.COUNTER_MAC_RX_BROADCAST) == 0
+
+
+def test_wrap(ezsp):
+    sampler = counters.CounterSampler(ezsp)
+    _sample(sampler, ezsp, _counters(COUNTER_MAC_RX_BROADCAST=0xfff0))
+    sample = _sample(sampler, ezsp, _counters(COUNTER_MAC_RX_BROADCAST=0x10))
+    assert sample.delta(C.COUNTER_MAC_RX_BROADCAST) == 0x20
+
+
+def test_rollover_handler(ezsp):
+    sampler = counters.CounterSampler(ezsp)
+    sampler.start()
+    _sample(sampler, ezsp, _counters(COUNTER_MAC_RX_BROADCAST=0x10))
+    ezsp.frame_received(b'\x01\x90\xf2' + bytes([C.COUNTER_MAC_RX_BROADCAST]))
+    ezsp.frame_received(b'\x02\x90\xf2' + bytes([C.COUNTER_MAC_RX_BROADCAST]))
+    sample = _sample(sampler, ezsp, _counters(COUNTER_MAC_RX_BROADCAST=0x20))
+    assert sample.delta(C.COUNTER_MAC_RX_BROADCAST) == 2 * 0x10000 + 0x10
+
+    # Rollovers are only counted once
+    sample = _sample(sampler, ezsp, _counters(COUNTER_MAC_RX_BROADCAST=0x20))
+    assert sample.delta(C.COUNTER_MAC_RX_BROADCAST) == 0
+    sampler.stop()
+
+
+def test_reset(ezsp):
+    sampler = counters.CounterSampler(ezsp)
+    sampler.start()
+    _sample(sampler, ezsp, _counters(COUNTER_MAC_RX_BROADCAST=100))
+    ezsp.handle_callback('_reset_controller_application', (mock.sentinel.error, ))
+    assert _sample(sampler, ezsp, _counters(COUNTER_MAC_RX_BROADCAST=5)) is None
+    sample = _sample(sampler, ezsp, _counters(COUNTER_MAC_RX_BROADCAST=7))
+    assert sample.delta(C.COUNTER_MAC_RX_BROADCAST) == 2
+    sampler.stop()
+
+
+def test_history(ezsp):
+    sampler = counters.CounterSampler(ezsp, history=3)
+    for i in range(6):
+        _sample(sampler, ezsp, _counters(COUNTER_MAC_RX_BROADCAST=i * 10))
+    assert len(sampler.samples) == 3
+    assert sampler.totals[C.COUNTER_MAC_RX_BROADCAST] == 50
+
+
+def test_start_stop(ezsp):
+    loop = asyncio.get_event_loop()
+    reads = []
+
+    def mockcommand(name, *args):
+        reads.append(name)
+        fut = asyncio.Future()
+        if len(reads) == 2:
+            fut.set_exception(asyncio.TimeoutError())
+        else:
+            fut.set_result([_counters(COUNTER_MAC_RX_BROADCAST=len(reads))])
+        return fut
+
+    ezsp._command = mockcommand
+    sampler = counters.CounterSampler(ezsp, interval=0.001)
+    sampler.start()
+    sampler.start()
+    loop.run_until_complete(asyncio.sleep(0.05))
+    sampler.stop()
+    sampler.stop()
+    loop.run_until_complete(asyncio.sleep(0))
+    count = len(reads)
+    assert count > 3
+    assert len(sampler.samples) == count - 2
+    assert not ezsp._subscriptions
+
+    loop.run_until_complete(asyncio.sleep(0.01))
+    assert len(reads) == count
+
+
+def test_prometheus(ezsp):
+    sampler = counters.CounterSampler(ezsp)
+    text = counters.prometheus(sampler)
+    assert 'bellows_ncp_counter_total{counter="mac_rx_broadcast"} 0\n' in text
+    assert 'bellows_ncp_counter_rate' not in text
+
+    _sample(sampler, ezsp, _counters())
+    _sample(sampler, ezsp, _counters(COUNTER_PHY_CCA_FAIL_COUNT=4))
+    sampler.latest.interval = 2
+    text = counters.prometheus(sampler)
+    assert 'bellows_ncp_counter_total{counter="phy_cca_fail_count"} 4\n' in text
+    assert 'bellows_ncp_counter_rate{counter="phy_cca_fail_count"} 2.0\n' in text
+    assert text.count('# TYPE') == 2
+    assert text.endswith('\n')
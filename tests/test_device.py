@@ -5,6 +5,7 @@ import pytest
 
 import bellows.types as t
 from bellows.zigbee import device, endpoint
+from bellows.zigbee.scheduler import Priority
 
 
 @pytest.fixture
@@ -17,12 +18,10 @@ def dev():
 def test_initialize(monkeypatch, dev):
     loop = asyncio.get_event_loop()
 
-    @asyncio.coroutine
-    def mockrequest(req, nwk, tries=None, delay=None):
+    async def mockrequest(req, nwk, tries=None, delay=None, single_flight=None):
         return [0, None, [1, 2]]
 
-    @asyncio.coroutine
-    def mockepinit(self):
+    async def mockepinit(self):
         return
 
     monkeypatch.setattr(endpoint.Endpoint, 'initialize', mockepinit)
@@ -38,8 +37,7 @@ def test_initialize(monkeypatch, dev):
 def test_initialize_fail(dev):
     loop = asyncio.get_event_loop()
 
-    @asyncio.coroutine
-    def mockrequest(req, nwk, tries=None, delay=None):
+    async def mockrequest(req, nwk, tries=None, delay=None, single_flight=None):
         return [1]
 
     dev.zdo.request = mockrequest
@@ -61,6 +59,7 @@ def test_request(dev):
     dev.request(aps, b'')
     app_mock = dev._application
     assert app_mock.request.call_count == 1
+    assert app_mock.request.call_args[1]['priority'] == Priority.NORMAL
     assert app_mock.get_sequence.call_count == 1
 
 
@@ -17,8 +17,7 @@ def ep():
 def _test_initialize(ep, profile):
     loop = asyncio.get_event_loop()
 
-    @asyncio.coroutine
-    def mockrequest(req, nwk, epid, tries=None, delay=None):
+    async def mockrequest(req, nwk, epid, tries=None, delay=None, single_flight=None):
         sd = types.SimpleDescriptor()
         sd.endpoint = 1
         sd.profile = profile
@@ -46,8 +45,7 @@ def test_initialize_zll(ep):
 def test_initialize_fail(ep):
     loop = asyncio.get_event_loop()
 
-    @asyncio.coroutine
-    def mockrequest(req, nwk, epid, tries=None, delay=None):
+    async def mockrequest(req, nwk, epid, tries=None, delay=None, single_flight=None):
         return [1, None, None]
 
     ep._device.zdo.request = mockrequest
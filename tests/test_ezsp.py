@@ -4,6 +4,7 @@ from unittest import mock
 
 import pytest
 
+import bellows.types as t
 from bellows import ezsp, uart
 
 
@@ -15,8 +16,7 @@ def ezsp_f():
 def test_connect(ezsp_f, monkeypatch):
     connected = False
 
-    @asyncio.coroutine
-    def mockconnect(*args, **kwargs):
+    async def mockconnect(*args, **kwargs):
         nonlocal connected
         connected = True
 
@@ -27,6 +27,48 @@ def test_connect(ezsp_f, monkeypatch):
     assert connected
 
 
+def test_reconnect(ezsp_f, monkeypatch):
+    gw = mock.MagicMock()
+    ezsp_f._gw = gw
+    ezsp_f._device = '/dev/null'
+    ezsp_f._baudrate = 115200
+    connect_args = []
+
+    async def mockconnect(*args, **kwargs):
+        connect_args.append(args)
+        return mock.sentinel.gw
+
+    monkeypatch.setattr(uart, 'connect', mockconnect)
+
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(ezsp_f.reconnect())
+    assert gw.close.call_count == 1
+    assert connect_args == [('/dev/null', 115200, ezsp_f)]
+    assert ezsp_f._gw is mock.sentinel.gw
+
+
+def test_enter_failed_state(ezsp_f):
+    ezsp_f.handle_callback = mock.MagicMock()
+    fut = asyncio.Future()
+    done = asyncio.Future()
+    done.set_result(None)
+    ezsp_f._awaiting[0] = (0, [], fut)
+    ezsp_f._awaiting[1] = (0, [], done)
+    ezsp_f.enter_failed_state(mock.sentinel.error)
+
+    assert not ezsp_f._awaiting
+    assert isinstance(fut.exception(), Exception)
+    ezsp_f.handle_callback.assert_called_once_with(
+        '_reset_controller_application',
+        (mock.sentinel.error, ),
+    )
+
+
+def test_ash_stats(ezsp_f):
+    ezsp_f._gw = mock.MagicMock()
+    assert ezsp_f.ash_stats is ezsp_f._gw.stats
+
+
 def test_reset(ezsp_f):
     ezsp_f._gw = mock.MagicMock()
     ezsp_f.reset()
@@ -61,6 +103,177 @@ def test_command(ezsp_f):
     assert ezsp_f._gw.data.call_count == 1
 
 
+def test_invalid_window():
+    with pytest.raises(ValueError):
+        ezsp.EZSP(window_size=0)
+
+
+def _sent_sequences(ezsp_f):
+    return [c[0][0][0] for c in ezsp_f._gw.data.call_args_list]
+
+
+def test_command_window():
+    ezsp_f = ezsp.EZSP(window_size=2)
+    ezsp_f._gw = mock.MagicMock()
+    futures = [ezsp_f._command('nop') for _ in range(4)]
+    assert _sent_sequences(ezsp_f) == [0, 1]
+    assert ezsp_f.stats.in_flight == 2
+    assert ezsp_f.stats.queued == 2
+
+    ezsp_f.frame_received(b'\x01\x00\x05')
+    assert futures[1].result() == []
+    assert _sent_sequences(ezsp_f) == [0, 1, 2]
+    assert ezsp_f.stats.queued == 1
+    assert ezsp_f.stats.responses == 1
+    assert ezsp_f.stats.latency is not None
+
+    futures[3].cancel()
+    ezsp_f.frame_received(b'\x00\x00\x05')
+    ezsp_f.frame_received(b'\x02\x00\x05')
+    assert _sent_sequences(ezsp_f) == [0, 1, 2]
+    assert ezsp_f.stats.in_flight == 0
+    assert ezsp_f.stats.queued == 0
+    assert ezsp_f.stats.in_flight_max == 2
+    assert not ezsp_f._deadlines
+
+
+def test_command_timeout():
+    loop = asyncio.get_event_loop()
+    ezsp_f = ezsp.EZSP(window_size=1, timeout=0.01)
+    ezsp_f._gw = mock.MagicMock()
+    first = ezsp_f._command('nop')
+    second = ezsp_f._command('nop')
+    with pytest.raises(asyncio.TimeoutError):
+        loop.run_until_complete(first)
+    assert _sent_sequences(ezsp_f) == [0, 1]
+    assert 0 not in ezsp_f._awaiting
+    assert ezsp_f.stats.timeouts == 1
+
+    ezsp_f.frame_received(b'\x01\x00\x05')
+    assert loop.run_until_complete(second) == []
+    assert not ezsp_f._awaiting
+
+
+def test_command_timed_out_response():
+    loop = asyncio.get_event_loop()
+    ezsp_f = ezsp.EZSP(timeout=0.01)
+    ezsp_f._gw = mock.MagicMock()
+    ezsp_f.handle_callback = mock.MagicMock()
+    with pytest.raises(asyncio.TimeoutError):
+        loop.run_until_complete(ezsp_f._command('nop'))
+
+    # A callback with the same sequence is still dispatched
+    ezsp_f.frame_received(b'\x00\x00\x19\x90')
+    assert ezsp_f.handle_callback.call_count == 1
+    ezsp_f.frame_received(b'\x00\x00\x05')
+    assert ezsp_f.handle_callback.call_count == 1
+    assert ezsp_f.stats.late_responses == 1
+    # Only once
+    ezsp_f.frame_received(b'\x00\x00\x05')
+    assert ezsp_f.handle_callback.call_count == 2
+
+
+def test_command_timed_out_forgotten():
+    loop = asyncio.get_event_loop()
+    ezsp_f = ezsp.EZSP(timeout=0.01)
+    ezsp_f._gw = mock.MagicMock()
+    with pytest.raises(asyncio.TimeoutError):
+        loop.run_until_complete(ezsp_f._command('nop'))
+    assert ezsp_f._timed_out == {0: 0x05}
+    loop.run_until_complete(asyncio.sleep(0.02))
+    assert ezsp_f._timed_out == {}
+
+
+def test_command_timed_out_sequence_reused():
+    loop = asyncio.get_event_loop()
+    ezsp_f = ezsp.EZSP(timeout=0.01)
+    ezsp_f._gw = mock.MagicMock()
+    with pytest.raises(asyncio.TimeoutError):
+        loop.run_until_complete(ezsp_f._command('nop'))
+    ezsp_f._seq = 0
+    fut = ezsp_f._command('nop')
+    assert ezsp_f._timed_out == {}
+    ezsp_f.frame_received(b'\x00\x00\x05')
+    assert fut.result() == []
+
+
+def test_command_late_response(ezsp_f):
+    ezsp_f._gw = mock.MagicMock()
+    ezsp_f.handle_callback = mock.MagicMock()
+    fut = ezsp_f._command('nop')
+    fut.cancel()
+    ezsp_f.frame_received(b'\x00\x00\x05')
+    assert not ezsp_f._awaiting
+    assert ezsp_f.handle_callback.call_count == 0
+
+
+def test_command_sequence_in_use(ezsp_f):
+    ezsp_f._gw = mock.MagicMock()
+    ezsp_f._command('nop')
+    ezsp_f._seq = 0
+    ezsp_f._command('nop')
+    assert _sent_sequences(ezsp_f) == [0, 1]
+    assert ezsp_f.stats.sequence_skips == 1
+
+
+def test_callback_with_awaited_sequence(ezsp_f):
+    ezsp_f._gw = mock.MagicMock()
+    ezsp_f.handle_callback = mock.MagicMock()
+    fut = ezsp_f._command('nop')
+    ezsp_f.frame_received(b'\x00\x00\x19\x90')
+    assert not fut.done()
+    assert ezsp_f.handle_callback.call_count == 1
+
+
+def test_enter_failed_state_queued():
+    ezsp_f = ezsp.EZSP(window_size=1)
+    ezsp_f._gw = mock.MagicMock()
+    ezsp_f.handle_callback = mock.MagicMock()
+    futures = [ezsp_f._command('nop') for _ in range(2)]
+    ezsp_f.enter_failed_state(mock.sentinel.error)
+    assert all(isinstance(f.exception(), Exception) for f in futures)
+    assert not ezsp_f._deadlines
+    assert ezsp_f.stats.in_flight == 0
+    assert ezsp_f.stats.queued == 0
+
+
+def test_update_config(ezsp_f):
+    ncp = {1: (t.EzspStatus.SUCCESS, 2), 2: (t.EzspStatus.SUCCESS, 0),
+           3: (t.EzspStatus.ERROR_INVALID_ID, 0)}
+    sent = []
+
+    def mockcommand(name, *args):
+        sent.append((name, ) + args)
+        fut = asyncio.Future()
+        if name == 'getConfigurationValue':
+            fut.set_result(list(ncp[args[0]]))
+        else:
+            fut.set_result([t.EzspStatus.SUCCESS if args[0] == 2 else t.EzspStatus.ERROR_INVALID_ID])
+        return fut
+
+    ezsp_f._command = mockcommand
+    loop = asyncio.get_event_loop()
+    statuses = loop.run_until_complete(ezsp_f.update_config([(1, 2), (2, 5), (3, 7)]))
+    assert sent == [
+        ('getConfigurationValue', 1),
+        ('getConfigurationValue', 2),
+        ('getConfigurationValue', 3),
+        ('setConfigurationValue', 2, 5),
+        ('setConfigurationValue', 3, 7),
+    ]
+    assert statuses == {
+        1: t.EzspStatus.SUCCESS,
+        2: t.EzspStatus.SUCCESS,
+        3: t.EzspStatus.ERROR_INVALID_ID,
+    }
+
+
+def _assert_unsubscribed(ezsp_f):
+    asyncio.get_event_loop().run_until_complete(asyncio.sleep(0))
+    assert not ezsp_f._subscriptions
+    assert not ezsp_f._waiters
+
+
 def _test_list_command(ezsp_f, mockcommand):
     loop = asyncio.get_event_loop()
     ezsp_f._command = mockcommand
@@ -73,8 +286,7 @@ def _test_list_command(ezsp_f, mockcommand):
 
 
 def test_list_command(ezsp_f):
-    @asyncio.coroutine
-    def mockcommand(name, *args):
+    async def mockcommand(name, *args):
         assert name == 'startScan'
         ezsp_f.frame_received(b'\x01\x00\x1b')
         ezsp_f.frame_received(b'\x02\x00\x1b')
@@ -84,21 +296,21 @@ def test_list_command(ezsp_f):
 
     result = _test_list_command(ezsp_f, mockcommand)
     assert len(result) == 2
+    _assert_unsubscribed(ezsp_f)
 
 
 def test_list_command_initial_failure(ezsp_f):
-    @asyncio.coroutine
-    def mockcommand(name, *args):
+    async def mockcommand(name, *args):
         assert name == 'startScan'
         return [1]
 
     with pytest.raises(Exception):
         _test_list_command(ezsp_f, mockcommand)
+    _assert_unsubscribed(ezsp_f)
 
 
 def test_list_command_later_failure(ezsp_f):
-    @asyncio.coroutine
-    def mockcommand(name, *args):
+    async def mockcommand(name, *args):
         assert name == 'startScan'
         ezsp_f.frame_received(b'\x01\x00\x1b')
         ezsp_f.frame_received(b'\x02\x00\x1b')
@@ -108,11 +320,111 @@ def test_list_command_later_failure(ezsp_f):
 
     with pytest.raises(Exception):
         _test_list_command(ezsp_f, mockcommand)
+    _assert_unsubscribed(ezsp_f)
 
 
-def _test_form_network(ezsp_f, initial_result, final_result):
-    @asyncio.coroutine
+def _stream_command(ezsp_f, result=(0, )):
+    sent = []
+
     def mockcommand(name, *args):
+        sent.append(name)
+        fut = asyncio.Future()
+        fut.set_result(list(result))
+        return fut
+
+    ezsp_f._command = mockcommand
+    return sent
+
+
+def test_list_stream(ezsp_f):
+    loop = asyncio.get_event_loop()
+    sent = _stream_command(ezsp_f)
+    stream = ezsp_f.start_scan_iter(t.EzspNetworkScanType.ENERGY_SCAN, 1 << 11, 3)
+    assert stream.__aiter__() is stream
+
+    next_ = asyncio.ensure_future(stream.next())
+    loop.run_until_complete(asyncio.sleep(0))
+    assert sent == ['startScan']
+    assert not next_.done()
+    ezsp_f.frame_received(b'\x01\x00\x48\x0b\xc0')
+    assert loop.run_until_complete(next_) == [11, -64]
+
+    ezsp_f.frame_received(b'\x02\x00\x48\x0c\xc1')
+    ezsp_f.frame_received(b'\x03\x00\x1c\x0c\x00')
+    assert loop.run_until_complete(stream.__anext__()) == [12, -63]
+    with pytest.raises(StopAsyncIteration):
+        loop.run_until_complete(stream.next())
+    _assert_unsubscribed(ezsp_f)
+
+    loop.run_until_complete(stream.close())
+    assert sent == ['startScan']
+
+
+def test_list_stream_failure(ezsp_f):
+    loop = asyncio.get_event_loop()
+    _stream_command(ezsp_f)
+    stream = ezsp_f.start_scan_iter(t.EzspNetworkScanType.ENERGY_SCAN, 1 << 11, 3)
+    assert loop.run_until_complete(stream.__aenter__()) is stream
+    next_ = asyncio.ensure_future(stream.next())
+    loop.run_until_complete(asyncio.sleep(0))
+    ezsp_f.frame_received(b'\x01\x00\x48\x0b\xc0')
+    ezsp_f.frame_received(b'\x02\x00\x1c\x0b\x01')
+    assert loop.run_until_complete(next_) == [11, -64]
+    with pytest.raises(Exception):
+        loop.run_until_complete(stream.next())
+
+
+def test_list_stream_command_failure(ezsp_f):
+    loop = asyncio.get_event_loop()
+    _stream_command(ezsp_f, (1, ))
+    stream = ezsp_f.start_scan_iter(t.EzspNetworkScanType.ENERGY_SCAN, 1 << 11, 3)
+    with pytest.raises(Exception):
+        loop.run_until_complete(stream.next())
+    _assert_unsubscribed(ezsp_f)
+
+
+def test_list_stream_close(ezsp_f):
+    loop = asyncio.get_event_loop()
+    sent = _stream_command(ezsp_f)
+    stream = ezsp_f.start_scan_iter(t.EzspNetworkScanType.ENERGY_SCAN, 1 << 11, 3)
+    next_ = asyncio.ensure_future(stream.next())
+    loop.run_until_complete(asyncio.sleep(0))
+    ezsp_f.frame_received(b'\x01\x00\x48\x0b\xc0')
+    loop.run_until_complete(next_)
+
+    loop.run_until_complete(stream.__aexit__(None, None, None))
+    assert sent == ['startScan', 'stopScan']
+    _assert_unsubscribed(ezsp_f)
+    with pytest.raises(StopAsyncIteration):
+        loop.run_until_complete(stream.next())
+
+
+def test_list_stream_close_unstarted(ezsp_f):
+    loop = asyncio.get_event_loop()
+    sent = _stream_command(ezsp_f)
+    stream = ezsp_f.start_scan_iter(t.EzspNetworkScanType.ENERGY_SCAN, 1 << 11, 3)
+    loop.run_until_complete(stream.close())
+    assert sent == []
+
+
+def test_list_stream_buffer(ezsp_f):
+    loop = asyncio.get_event_loop()
+    _stream_command(ezsp_f)
+    stream = ezsp_f.poll_for_data_iter(1, t.EmberEventUnits.EVENT_MS_TIME, 0, maxsize=2)
+    next_ = asyncio.ensure_future(stream.next())
+    loop.run_until_complete(asyncio.sleep(0))
+    ezsp_f.frame_received(b'\x01\x00\x44\x01\x00')
+    assert loop.run_until_complete(next_) == [1]
+    for nwk in range(2, 6):
+        ezsp_f.frame_received(b'\x01\x00\x44' + bytes([nwk, 0]))
+    ezsp_f.frame_received(b'\x02\x00\x43\x00')
+    assert loop.run_until_complete(stream.next()) == [4]
+    assert loop.run_until_complete(stream.next()) == [5]
+    assert stream.dropped == 2
+
+
+def _test_form_network(ezsp_f, initial_result, final_result):
+    async def mockcommand(name, *args):
         assert name == 'formNetwork'
         ezsp_f.frame_received(b'\x01\x00\x19' + final_result)
         return initial_result
@@ -125,11 +437,13 @@ def _test_form_network(ezsp_f, initial_result, final_result):
 
 def test_form_network(ezsp_f):
     _test_form_network(ezsp_f, [0], b'\x90')
+    _assert_unsubscribed(ezsp_f)
 
 
 def test_form_network_fail(ezsp_f):
     with pytest.raises(Exception):
         _test_form_network(ezsp_f, [1], b'\x90')
+    _assert_unsubscribed(ezsp_f)
 
 
 def test_form_network_fail_stack_status(ezsp_f):
@@ -158,12 +472,12 @@ def test_callback(ezsp_f):
     testcb = mock.MagicMock()
 
     cbid = ezsp_f.add_callback(testcb)
-    ezsp_f.handle_callback(1, 2, 3)
+    ezsp_f.handle_callback('frame', [1, 2])
 
     assert testcb.call_count == 1
 
     ezsp_f.remove_callback(cbid)
-    ezsp_f.handle_callback(4, 5, 6)
+    ezsp_f.handle_callback('frame', [4, 5])
     assert testcb.call_count == 1
 
 
@@ -173,17 +487,17 @@ def test_callback_multi(ezsp_f):
     cbid1 = ezsp_f.add_callback(testcb)
     ezsp_f.add_callback(testcb)
 
-    ezsp_f.handle_callback(1, 2, 3)
+    ezsp_f.handle_callback('frame', [1, 2])
 
     assert testcb.call_count == 2
 
     ezsp_f.remove_callback(cbid1)
 
-    ezsp_f.handle_callback(4, 5, 6)
+    ezsp_f.handle_callback('frame', [4, 5])
     testcb.assert_has_calls([
-        mock.call(1, 2, 3),
-        mock.call(1, 2, 3),
-        mock.call(4, 5, 6),
+        mock.call('frame', [1, 2]),
+        mock.call('frame', [1, 2]),
+        mock.call('frame', [4, 5]),
     ])
 
 
@@ -192,10 +506,83 @@ def test_callback_exc(ezsp_f):
     testcb.side_effect = Exception("Testing")
 
     ezsp_f.add_callback(testcb)
-    ezsp_f.handle_callback(1)
+    ezsp_f.handle_callback('frame', [1])
     assert testcb.call_count == 1
 
 
+def test_subscribe(ezsp_f):
+    by_name = mock.MagicMock()
+    by_id = mock.MagicMock()
+    other = mock.MagicMock()
+    ezsp_f.subscribe('stackStatusHandler', by_name)
+    sub_id = ezsp_f.subscribe(0x19, by_id)
+    ezsp_f.subscribe('scanCompleteHandler', other)
+
+    ezsp_f.frame_received(b'\x01\x00\x19\x90')
+    by_name.assert_called_once_with(t.EmberStatus.NETWORK_UP)
+    by_id.assert_called_once_with(t.EmberStatus.NETWORK_UP)
+    assert other.call_count == 0
+
+    assert ezsp_f.unsubscribe(sub_id) is by_id
+    ezsp_f.frame_received(b'\x02\x00\x19\x91')
+    assert by_name.call_count == 2
+    assert by_id.call_count == 1
+
+
+def test_unsubscribe_last(ezsp_f):
+    sub_id = ezsp_f.subscribe('stackStatusHandler', mock.MagicMock())
+    ezsp_f.unsubscribe(sub_id)
+    assert not ezsp_f._subscriptions
+    assert not ezsp_f._subscription_frames
+    with pytest.raises(KeyError):
+        ezsp_f.unsubscribe(sub_id)
+
+
+def test_subscribe_unsubscribe_in_handler(ezsp_f):
+    calls = []
+
+    def once(*args):
+        calls.append(args)
+        ezsp_f.unsubscribe(sub_id)
+
+    sub_id = ezsp_f.subscribe('stackStatusHandler', once)
+    ezsp_f.handle_callback('stackStatusHandler', [1])
+    ezsp_f.handle_callback('stackStatusHandler', [2])
+    assert calls == [(1, )]
+
+
+def test_subscribe_exc(ezsp_f):
+    failing = mock.MagicMock(side_effect=Exception("Testing"))
+    handler = mock.MagicMock()
+    ezsp_f.subscribe('stackStatusHandler', failing)
+    ezsp_f.subscribe('stackStatusHandler', handler)
+    ezsp_f.handle_callback('stackStatusHandler', [1])
+    assert handler.call_count == 1
+
+
+def test_wait_for(ezsp_f):
+    loop = asyncio.get_event_loop()
+    fut = ezsp_f.wait_for(0x19)
+    ezsp_f.handle_callback('scanCompleteHandler', [1, 2])
+    assert not fut.done()
+    ezsp_f.handle_callback('stackStatusHandler', [1])
+    ezsp_f.handle_callback('stackStatusHandler', [2])
+    assert loop.run_until_complete(fut) == [1]
+    assert not ezsp_f._waiters
+
+
+def test_wait_for_cancel(ezsp_f):
+    loop = asyncio.get_event_loop()
+    fut = ezsp_f.wait_for('stackStatusHandler')
+    other = ezsp_f.wait_for('stackStatusHandler')
+    fut.cancel()
+    loop.run_until_complete(asyncio.sleep(0))
+    assert ezsp_f._waiters == {'stackStatusHandler': [other]}
+    other.cancel()
+    loop.run_until_complete(asyncio.sleep(0))
+    assert not ezsp_f._waiters
+
+
 def test_version_5(ezsp_f):
     ezsp_f._gw = mock.MagicMock()
 
@@ -0,0 +1,171 @@
+import asyncio
+
+import pytest
+
+from bellows.zigbee import scheduler
+from bellows.zigbee.scheduler import Priority
+
+
+@pytest.fixture
+def sched():
+    return scheduler.RequestScheduler(max_in_flight=2, per_device=1)
+
+
+def _run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def _acquire(sched, key, priority=Priority.NORMAL):
+    return asyncio.ensure_future(sched.acquire(key, priority))
+
+
+def _settle():
+    _run(asyncio.sleep(0))
+
+
+def test_limit_from_config():
+    assert scheduler.limit_from_config(None, None) == scheduler.DEFAULT_MAX_IN_FLIGHT
+    assert scheduler.limit_from_config(255, 10) == 9
+    assert scheduler.limit_from_config(20, 10) == 5
+    assert scheduler.limit_from_config(0, 10) == 9
+    assert scheduler.limit_from_config(2, 1) == 1
+
+
+def test_acquire_release(sched):
+    slot = _run(sched.acquire(1))
+    assert slot.key == 1
+    assert slot.priority == Priority.NORMAL
+    assert sched.in_flight == 1
+    assert sched.active == 1
+
+    sched.sent(slot)
+    assert sched.in_flight == 0
+    assert sched.active == 1
+    sched.release(slot)
+    assert sched.active == 0
+    assert sched.started[Priority.NORMAL] == 1
+
+
+def test_release_unsent(sched):
+    slot = _run(sched.acquire(1))
+    sched.release(slot)
+    assert sched.in_flight == 0
+    assert sched.active == 0
+
+
+def test_global_limit(sched):
+    slots = [_run(sched.acquire(key)) for key in (1, 2)]
+    waiting = _acquire(sched, 3)
+    _settle()
+    assert not waiting.done()
+    assert sched.queued() == 1
+
+    # Sent frees the NCP, although the reply is still awaited
+    sched.sent(slots[0])
+    _settle()
+    assert waiting.done()
+    assert sched.queued() == 0
+
+
+def test_per_device_limit(sched):
+    slot = _run(sched.acquire(1))
+    sched.sent(slot)
+    waiting = _acquire(sched, 1)
+    other = _acquire(sched, 2)
+    _settle()
+    assert not waiting.done()
+    assert other.done()
+
+    sched.release(slot)
+    _settle()
+    assert waiting.done()
+
+
+def test_priority(sched):
+    sched.max_in_flight = 1
+    sched.per_device = 10
+    slot = _run(sched.acquire(1))
+    bulk = _acquire(sched, 1, Priority.BULK)
+    interactive = _acquire(sched, 2, Priority.INTERACTIVE)
+    _settle()
+    assert sched.queued(Priority.BULK) == 1
+    assert sched.queued(Priority.INTERACTIVE) == 1
+
+    sched.release(slot)
+    _settle()
+    assert interactive.done()
+    assert not bulk.done()
+    bulk.cancel()
+    _settle()
+
+
+def test_fairness(sched):
+    sched.max_in_flight = 1
+    sched.per_device = 10
+    slot = _run(sched.acquire(0))
+    waiting = [_acquire(sched, 1) for i in range(3)] + [_acquire(sched, 2)]
+    _settle()
+
+    order = []
+    while waiting:
+        sched.release(slot)
+        _settle()
+        started = [f for f in waiting if f.done()]
+        assert len(started) == 1
+        waiting.remove(started[0])
+        slot = started[0].result()
+        order.append(slot.key)
+    assert order == [1, 2, 1, 1]
+
+
+def test_raise_limit(sched):
+    sched.max_in_flight = 0
+    waiting = _acquire(sched, 1)
+    _settle()
+    assert not waiting.done()
+    sched.max_in_flight = 1
+    _settle()
+    assert waiting.done()
+
+
+def test_cancelled_waiter(sched):
+    slot = _run(sched.acquire(1))
+    first = _acquire(sched, 1)
+    second = _acquire(sched, 1)
+    _settle()
+    first.cancel()
+    _settle()
+    assert sched.queued() == 1
+
+    sched.release(slot)
+    _settle()
+    assert second.done()
+    assert sched.active == 1
+
+
+def test_cancelled_after_start(sched):
+    slot = _run(sched.acquire(1))
+    waiting = _acquire(sched, 1)
+    _settle()
+    sched.release(slot)
+    # Started, but cancelled before it could run
+    waiting.cancel()
+    _settle()
+    assert waiting.cancelled()
+    assert sched.active == 0
+    assert sched.in_flight == 0
+
+
+def test_prometheus(sched):
+    _run(sched.acquire(1))
+    waiting = _acquire(sched, 1, Priority.BULK)
+    _settle()
+    text = scheduler.prometheus(sched)
+    waiting.cancel()
+    _settle()
+    lines = text.splitlines()
+    assert 'bellows_requests_queued{priority="bulk"} 1' in lines
+    assert 'bellows_requests_started_total{priority="normal"} 1' in lines
+    assert 'bellows_requests_in_flight 1' in lines
+    assert 'bellows_requests_in_flight_limit 2' in lines
+    assert 'bellows_requests_active 1' in lines
@@ -0,0 +1,138 @@
+import asyncio
+import os
+from unittest import mock
+
+import pytest
+
+import bellows.types as t
+from bellows import simulator
+from bellows.ezsp import EZSP
+from bellows.zigbee.application import ControllerApplication
+from bellows.zigbee.exceptions import DeliveryError
+
+
+def _run(coro):
+    loop = asyncio.get_event_loop()
+    return loop.run_until_complete(coro)
+
+
+async def _connect(url):
+    ezsp = EZSP()
+    await ezsp.connect(url, 57600)
+    return ezsp
+
+
+@pytest.fixture
+def app(tmpdir):
+    ezsp = _run(_connect('sim://?devices=3&latency=0.001&seed=1'))
+    app = ControllerApplication(ezsp, os.path.join(str(tmpdir), 'test.db'))
+    _run(app.startup())
+    yield app
+    ezsp.close()
+    _run(asyncio.sleep(0))
+
+
+def _sim(app):
+    return app._ezsp._gw._transport.get_extra_info('simulator')
+
+
+async def _join_all(app):
+    initialized = []
+    listener = mock.MagicMock()
+    listener.device_initialized = initialized.append
+    app.add_listener(listener)
+    await app.permit(60)
+    while len(initialized) < len(_sim(app).devices):
+        await asyncio.sleep(0.01)
+    return initialized
+
+
+def test_parse_url():
+    kwargs = simulator._parse_url('sim://?devices=10&latency=0.5&loss=0.1&formed=0')
+    assert kwargs == {'devices': 10, 'latency': 0.5, 'loss': 0.1, 'formed': False}
+    assert simulator._parse_url('sim://') == {}
+
+
+def test_parse_url_unknown():
+    with pytest.raises(ValueError):
+        simulator._parse_url('sim://?radio=1')
+
+
+def test_default():
+    params = simulator._default(t.EmberNetworkParameters)
+    assert params.panId == 0
+    assert params.extendedPanId == b"\x00" * 8
+    assert simulator._default(t.LVBytes) == b''
+    assert simulator._default(t.EmberStatus) == t.EmberStatus.SUCCESS
+
+
+def test_startup(app):
+    assert app.ieee == _sim(app).ieee
+    assert app.nwk == 0
+    assert _sim(app).config[t.EzspConfigId.CONFIG_STACK_PROFILE] == 2
+
+
+def test_startup_form(tmpdir):
+    ezsp = _run(_connect('sim://?formed=0'))
+    app = ControllerApplication(ezsp, os.path.join(str(tmpdir), 'test.db'))
+    _run(app.startup(auto_form=True))
+    assert _sim(app).formed
+    ezsp.close()
+
+
+def test_join_and_initialize(app):
+    initialized = _run(asyncio.wait_for(_join_all(app), 10))
+    assert len(initialized) == 3
+    for dev in initialized:
+        assert dev.manufacturer_code == simulator.EMBER_MANUFACTURER_CODE
+        assert sorted(dev.endpoints[1].in_clusters) == [0x0000, 0x0006]
+
+
+def test_read_write_attributes(app):
+    dev = _run(asyncio.wait_for(_join_all(app), 10))[0]
+    basic = dev.endpoints[1].in_clusters[0x0000]
+    success, failure = _run(basic.read_attributes(['model', 'zcl_version']))
+    assert success == {'model': b'sim'}
+    assert 'zcl_version' in failure
+
+    on_off = dev.endpoints[1].in_clusters[0x0006]
+    _run(on_off.write_attributes({'on_time': 10}))
+    success, _ = _run(on_off.read_attributes(['on_time']))
+    assert success == {'on_time': 10}
+
+
+def test_report(app):
+    dev = _run(asyncio.wait_for(_join_all(app), 10))[0]
+    sim = _sim(app)
+    sim.devices[dev.nwk].attributes[0x0006][0x0000] = (0x10, t.Bool.true)
+    sim.report(sim.devices[dev.nwk], 0x0006, 0x0000)
+    _run(asyncio.sleep(0.05))
+    assert dev.endpoints[1].in_clusters[0x0006]._attr_cache[0] == t.Bool.true
+
+
+def test_loss(app):
+    dev = _run(asyncio.wait_for(_join_all(app), 10))[0]
+    _sim(app).loss = 1
+    with pytest.raises(DeliveryError):
+        _run(dev.zdo.request(0x0002, dev.nwk, tries=1))
+
+
+def test_unknown_device(app):
+    aps = t.EmberApsFrame()
+    aps.profileId = t.uint16_t(0)
+    aps.clusterId = t.uint16_t(0x0002)
+    aps.sourceEndpoint = t.uint8_t(0)
+    aps.destinationEndpoint = t.uint8_t(0)
+    aps.options = t.EmberApsOption(0)
+    aps.groupId = t.uint16_t(0)
+    aps.sequence = t.uint8_t(1)
+    with pytest.raises(DeliveryError):
+        _run(app.request(0x4321, aps, b'\x01\x21\x43'))
+
+
+def test_close(app):
+    sim = _sim(app)
+    app._ezsp.close()
+    _run(asyncio.sleep(0))
+    assert sim._closed
+    assert sim._gw._transport.is_closing()
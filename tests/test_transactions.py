@@ -0,0 +1,178 @@
+import asyncio
+
+import pytest
+
+from bellows.zigbee import transactions
+
+
+@pytest.fixture
+def manager():
+    return transactions.TransactionManager()
+
+
+def _run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def test_next_tsn_per_destination(manager):
+    assert manager.next_tsn(1) == 1
+    assert manager.next_tsn(1) == 2
+    assert manager.next_tsn(2) == 1
+    for i in range(254):
+        manager.next_tsn(1)
+    assert manager.next_tsn(1) == 1
+
+
+def test_next_tsn_skips_pending(manager):
+    _run(manager.begin(1, 2))
+    assert manager.next_tsn(1) == 1
+    assert manager.next_tsn(1) == 3
+    assert manager.next_tsn(2) == 1
+
+
+def test_begin_end(manager):
+    first = _run(manager.begin(1, 5))
+    second = _run(manager.begin(2, 5))
+    assert first.tag != second.tag
+    assert manager.get(1, 5) is first
+    assert manager.get(2, 5) is second
+    assert len(manager) == 2
+
+    manager.end(first)
+    assert manager.get(1, 5) is None
+    assert len(manager) == 1
+
+
+def test_end_discards(manager):
+    loop = asyncio.get_event_loop()
+    transaction = _run(manager.begin(1, 5))
+    transaction.send_fut.set_exception(asyncio.TimeoutError())
+    manager.end(transaction)
+    assert transaction.reply_fut.cancelled()
+    # Retrieved, so not logged when garbage collected
+    assert not transaction.send_fut._log_traceback
+    with pytest.raises(asyncio.TimeoutError):
+        loop.run_until_complete(transaction.send_fut)
+
+
+def test_sent(manager):
+    transaction = _run(manager.begin(1, 5))
+    assert manager.sent(transaction.tag) is transaction
+    assert manager.sent(transaction.tag) is None
+    # Still awaiting the reply
+    assert manager.get(1, 5) is transaction
+    manager.end(transaction)
+    assert len(manager) == 0
+
+
+def test_same_tsn_waits(manager):
+    loop = asyncio.get_event_loop()
+    first = _run(manager.begin(1, 5))
+    second = asyncio.ensure_future(manager.begin(1, 5))
+    other = asyncio.ensure_future(manager.begin(2, 5))
+    loop.run_until_complete(asyncio.sleep(0))
+    assert not second.done()
+    assert other.done()
+    assert manager.waiting == 1
+
+    manager.end(first)
+    transaction = loop.run_until_complete(second)
+    assert manager.get(1, 5) is transaction
+    assert manager.waiting == 0
+
+
+def test_tags_exhausted_waits(manager):
+    loop = asyncio.get_event_loop()
+    started = [_run(manager.begin(nwk, 1)) for nwk in range(256)]
+    assert len({transaction.tag for transaction in started}) == 256
+    assert manager.reserve_tag() is None
+
+    waiting = asyncio.ensure_future(manager.begin(256, 1))
+    loop.run_until_complete(asyncio.sleep(0))
+    assert not waiting.done()
+
+    manager.sent(started[10].tag)
+    transaction = loop.run_until_complete(waiting)
+    assert transaction.tag == started[10].tag
+
+
+def test_waiter_cancelled(manager):
+    loop = asyncio.get_event_loop()
+    first = _run(manager.begin(1, 5))
+    second = asyncio.ensure_future(manager.begin(1, 5))
+    loop.run_until_complete(asyncio.sleep(0))
+    second.cancel()
+    loop.run_until_complete(asyncio.sleep(0))
+    assert manager.waiting == 0
+    manager.end(first)
+    assert len(manager) == 0
+
+
+def test_reserve_tag(manager):
+    tag = manager.reserve_tag()
+    transaction = _run(manager.begin(1, 5))
+    assert transaction.tag != tag
+    assert manager.sent(tag) is None
+    assert manager.reserve_tag() is not None
+
+
+def test_begin_no_reply(manager):
+    transaction = _run(manager.begin(1, 5, expect_reply=False))
+    assert manager.get(1, 5) is None
+    assert manager.next_tsn(1) == 1
+    # The TSN is not held, so a request expecting a reply can use it
+    _run(manager.begin(1, 5))
+    assert manager.sent(transaction.tag) is transaction
+    manager.end(transaction)
+    assert len(manager) == 1
+
+
+def test_sweep(manager):
+    loop = asyncio.get_event_loop()
+    expired = _run(manager.begin(1, 5, deadline=10))
+    current = _run(manager.begin(2, 5, deadline=30))
+    forever = _run(manager.begin(3, 5))
+    sent = _run(manager.begin(4, 5, deadline=10, expect_reply=False))
+
+    assert manager.sweep(20) == 2
+    assert manager.get(1, 5) is None
+    assert manager.get(2, 5) is current
+    assert manager.get(3, 5) is forever
+    assert manager.sent(sent.tag) is None
+    for future in (expired.send_fut, sent.send_fut):
+        with pytest.raises(asyncio.TimeoutError):
+            loop.run_until_complete(future)
+    assert expired.reply_fut.cancelled()
+    assert manager.sweep(20) == 0
+
+
+def test_sweep_reserved_tag(manager):
+    tag = manager.reserve_tag(deadline=10)
+    kept = manager.reserve_tag()
+    assert manager.sweep(20) == 1
+    assert manager.sent(tag) is None
+    assert manager.sent(kept) is None
+    assert manager._tags == {}
+
+
+def test_sweep_wakes(manager):
+    loop = asyncio.get_event_loop()
+    expired = _run(manager.begin(1, 5, deadline=10))
+    waiting = asyncio.ensure_future(manager.begin(1, 5))
+    loop.run_until_complete(asyncio.sleep(0))
+    manager.sweep(20)
+    assert isinstance(expired.send_fut.exception(), asyncio.TimeoutError)
+    transaction = loop.run_until_complete(waiting)
+    assert manager.get(1, 5) is transaction
+
+
+def test_reserve_waits(manager):
+    loop = asyncio.get_event_loop()
+    tags = [manager.reserve_tag() for i in range(256)]
+    waiting = [asyncio.ensure_future(manager.reserve()) for i in range(2)]
+    loop.run_until_complete(asyncio.sleep(0))
+    assert not any(f.done() for f in waiting)
+
+    manager.sent(tags[1])
+    manager.sent(tags[2])
+    assert sorted(loop.run_until_complete(asyncio.gather(*waiting))) == [1, 2]
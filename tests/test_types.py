@@ -1,4 +1,9 @@
+import random
+
+import pytest
+
 import bellows.types as t
+from bellows.commands import COMMANDS
 
 
 def test_basic():
@@ -63,3 +68,303 @@ def test_struct():
 
 def test_str():
     assert str(t.EzspStatus.deserialize(b'\0')[0]) == 'EzspStatus.SUCCESS'
+
+
+def _schemas():
+    for name, (_, request, response) in sorted(COMMANDS.items()):
+        yield name, request
+        yield name, response
+
+
+def _decode(decoder, data):
+    try:
+        result, rest = decoder(data)
+    except Exception as exc:
+        return type(exc)
+    return [(type(v), repr(v)) for v in result], rest
+
+
+def test_schema_deserialize():
+    rnd = random.Random(0)
+    for name, schema in _schemas():
+        compiled = t.Schema(schema)
+        for length in (0, 1, 5, 20, 60):
+            for i in range(5):
+                data = bytes(rnd.getrandbits(8) for _ in range(length))
+                expected = _decode(lambda d: t.deserialize(d, schema), data)
+                assert _decode(compiled.deserialize, data) == expected, name
+
+
+def test_schema_serialize():
+    schema = t.Schema((t.EmberStatus, t.EmberApsFrame, t.int8s, t.LVBytes))
+    aps = t.EmberApsFrame()
+    aps.profileId = t.uint16_t(260)
+    aps.clusterId = t.uint16_t(6)
+    aps.sourceEndpoint = t.uint8_t(1)
+    aps.destinationEndpoint = t.uint8_t(2)
+    aps.options = t.EmberApsOption(t.EmberApsOption.APS_OPTION_RETRY)
+    aps.groupId = t.uint16_t(0)
+    aps.sequence = t.uint8_t(200)
+    values = [0, aps, -5, b'abc']
+    expected = t.serialize(values, schema)
+    assert schema.serialize(values) == expected
+    result, rest = schema.deserialize(expected + b'x')
+    assert rest == b'x'
+    assert schema.serialize(result) == expected
+    assert result[0] is t.EmberStatus.SUCCESS
+    assert isinstance(result[1], t.EmberApsFrame)
+    assert type(result[1].options) is t.EmberApsOption
+
+
+def test_schema_serialize_errors():
+    schema = t.Schema((t.EmberStatus, t.uint8_t))
+    with pytest.raises(ValueError):
+        schema.serialize([0x03, 1])
+    with pytest.raises(OverflowError):
+        schema.serialize([0, 256])
+    with pytest.raises(OverflowError):
+        schema.serialize([0, -1])
+
+
+def test_schema_is_tuple():
+    schema = t.Schema((t.uint8_t, t.LVBytes))
+    assert schema == (t.uint8_t, t.LVBytes)
+    assert t.deserialize(b'\x01\x01a', schema) == ([1, b'a'], b'')
+
+
+def test_deserialize_from():
+    data = memoryview(b'\xff\x08\x01\x02extra')
+    assert t.uint8_t.deserialize_from(data, 1) == (8, 2)
+    assert t.int16s.deserialize_from(data, 2) == (0x0201, 4)
+    assert t.uint16_t.deserialize_from(b'\x08\x01', 0) == (0x0108, 2)
+
+
+def test_deserialize_from_float():
+    data = b'\x00' + t.Single(1.25).serialize() + t.Double(-2.5).serialize()
+    assert t.Single.deserialize_from(data, 1) == (1.25, 5)
+    assert t.Double.deserialize_from(data, 5) == (-2.5, 13)
+    assert t.Single.deserialize(data[1:]) == (1.25, data[5:])
+
+
+def test_deserialize_from_lvbytes():
+    value, offset = t.LVBytes.deserialize_from(memoryview(b'\x00\x03abcd'), 1)
+    assert value == b'abc'
+    assert type(value) is bytes
+    assert offset == 5
+
+
+def test_deserialize_from_lists():
+    data = memoryview(b'\x00\x02\x01\x02\x03')
+    assert t.LVList(t.uint8_t).deserialize_from(data, 1) == ([1, 2], 4)
+    assert t.fixed_list(2, t.uint16_t).deserialize_from(data, 1) == ([0x0102, 0x0302], 5)
+    assert t.List(t.uint8_t).deserialize_from(data, 2) == ([1, 2, 3], 5)
+
+
+def test_deserialize_from_eui64():
+    data = b'\x00\x01\x02\x03\x04\x05\x06\x07\x08'
+    ieee, offset = t.EmberEUI64.deserialize_from(data, 1)
+    assert offset == 9
+    assert ieee == t.EmberEUI64.deserialize(data[1:])[0]
+    assert ieee == bytes([8, 7, 6, 5, 4, 3, 2, 1])
+
+
+def test_deserialize_from_struct():
+    aps = t.EmberApsFrame()
+    aps.profileId = t.uint16_t(260)
+    aps.clusterId = t.uint16_t(6)
+    aps.sourceEndpoint = t.uint8_t(1)
+    aps.destinationEndpoint = t.uint8_t(2)
+    aps.options = t.EmberApsOption(0)
+    aps.groupId = t.uint16_t(0)
+    aps.sequence = t.uint8_t(200)
+    data = b'\xaa' + aps.serialize() + b'rest'
+    aps2, offset = t.EmberApsFrame.deserialize_from(memoryview(data), 1)
+    assert aps2.serialize() == aps.serialize()
+    assert data[offset:] == b'rest'
+
+
+def test_deserialize_memoryview():
+    schema = (t.uint8_t, t.LVBytes, t.List(t.uint16_t))
+    data = b'\x01\x02ab\x03\x00\x04\x00'
+    result, rest = t.deserialize(memoryview(data), schema)
+    assert result == [1, b'ab', [3, 4]]
+    assert rest == b''
+    assert t.deserialize(data, schema) == (result, b'')
+
+
+def _structs():
+    for name in sorted(dir(t)):
+        type_ = getattr(t, name)
+        if isinstance(type_, type) and issubclass(type_, t.EzspStruct) and \
+                type_ is not t.EzspStruct:
+            yield type_
+
+
+def _reference_deserialize(cls, data):
+    r = cls()
+    offset = 0
+    for field_name, field_type in cls._fields:
+        v, offset = field_type.deserialize_from(data, offset)
+        setattr(r, field_name, v)
+    return [r], data[offset:]
+
+
+def _reference_serialize(value):
+    return b''.join(getattr(value, f[0]).serialize() for f in value._fields)
+
+
+def test_struct_layout_equivalence():
+    rnd = random.Random(1)
+    compiled = 0
+    for cls in _structs():
+        for length in (0, 3, 40, 200):
+            data = bytes(rnd.getrandbits(8) for _ in range(length))
+            expected = _decode(lambda d: t.deserialize(d, [cls]), data)
+            assert _decode(lambda d: _reference_deserialize(cls, d), data) == expected, cls
+            if isinstance(expected, tuple):
+                value = cls.deserialize(data)[0]
+                assert value.serialize() == _reference_serialize(value), cls
+        compiled += bool(cls._layout)
+    assert compiled > 30
+
+
+def test_struct_slots():
+    aps = t.EmberApsFrame()
+    assert not hasattr(aps, '__dict__')
+    with pytest.raises(AttributeError):
+        aps.unknown = 1
+    with pytest.raises(AttributeError):
+        aps.serialize()
+    assert 'sequence' in repr(aps)
+
+
+def test_struct_variable_width():
+    from bellows.zigbee.zdo import types as zdo_t
+    sd, rest = zdo_t.SimpleDescriptor.deserialize(
+        b'\x01\x04\x01\x00\x01\x00\x02\x06\x00\x08\x00\x00x')
+    assert rest == b'x'
+    assert sd.input_clusters == [6, 8]
+    assert zdo_t.SimpleDescriptor._layout is False
+    assert sd.serialize() == b'\x01\x04\x01\x00\x01\x00\x02\x06\x00\x08\x00\x00'
+
+
+def test_struct_field_of_other_type():
+    state = t.EmberKeyStruct()
+    state.bitmask = t.EmberKeyStructBitmask(0)
+    state.type = t.EmberKeyType(1)
+    state.key = t.fixed_list(16, t.uint8_t)([t.uint8_t(i) for i in range(16)])
+    state.outgoingFrameCounter = t.uint32_t(1)
+    state.incomingFrameCounter = t.uint32_t(2)
+    state.sequenceNumber = t.uint8_t(3)
+    state.partnerEUI64 = t.fixed_list(8, t.uint8_t)([t.uint8_t(i) for i in range(8)])
+    assert state.serialize() == _reference_serialize(state)
+    assert state.serialize()[3:19] == bytes(range(16))
+    assert state.serialize()[-8:] == bytes(range(8))
+
+    state.sequenceNumber = t.uint16_t(0x100)
+    assert state.serialize() == _reference_serialize(state)
+
+
+def test_eui64():
+    ieee = t.EmberEUI64([0, 1, 2, 3, 4, 5, 6, 0xab])
+    assert isinstance(ieee, bytes)
+    assert ieee[7] == 0xab
+    assert repr(ieee) == str(ieee) == '00:01:02:03:04:05:06:ab'
+    assert ieee.serialize() == b'\xab\x06\x05\x04\x03\x02\x01\x00'
+    assert t.EmberEUI64.deserialize(ieee.serialize() + b'x') == (ieee, b'x')
+    assert {ieee: 1}[t.EmberEUI64(bytes(ieee))] == 1
+    assert hash(ieee) == hash(t.EmberEUI64(b'\x00\x01\x02\x03\x04\x05\x06\xab'))
+
+
+def test_fixed_bytes():
+    key_type = t.fixed_bytes(4)
+    key = key_type(b'\x01\x02\x03\xff')
+    assert repr(key) == '01:02:03:ff'
+    assert key.serialize() == b'\x01\x02\x03\xff'
+    assert key_type.deserialize(b'\x01\x02\x03\xff\x05') == (key, b'\x05')
+    assert key_type.deserialize_from(memoryview(b'\x00\x01'), 1) == (b'\x01\x00\x00\x00', 5)
+    with pytest.raises(AssertionError):
+        key_type(b'\x01').serialize()
+
+
+def test_fixed_bytes_struct():
+    key = t.EmberKeyData()
+    key.contents = t.fixed_bytes(16)(b'ZigBeeAlliance09')
+    assert key.serialize() == b'ZigBeeAlliance09'
+    key2, rest = t.EmberKeyData.deserialize(b'ZigBeeAlliance09x')
+    assert rest == b'x'
+    assert key2.contents == b'ZigBeeAlliance09'
+
+    key.contents = t.fixed_list(16, t.uint8_t)(map(t.uint8_t, b'ZigBeeAlliance09'))
+    assert key.serialize() == b'ZigBeeAlliance09'
+
+
+def test_list_factories_memoized():
+    assert t.List(t.uint16_t) is t.List(t.uint16_t)
+    assert t.LVList(t.uint16_t) is t.LVList(t.uint16_t)
+    assert t.LVList(t.uint16_t) is not t.List(t.uint16_t)
+    assert t.fixed_list(8, t.uint8_t) is t.fixed_list(8, t.uint8_t)
+    assert t.fixed_list(8, t.uint8_t) is not t.fixed_list(7, t.uint8_t)
+    assert t.fixed_bytes(16) is t.fixed_bytes(16)
+
+
+def _reference_list(cls, data, count=None):
+    r = cls()
+    offset = 0
+    while (offset < len(data)) if count is None else (len(r) < count):
+        item, offset = cls._itemtype.deserialize_from(data, offset)
+        r.append(item)
+    return r, data[offset:]
+
+
+@pytest.mark.parametrize('itemtype', [t.uint8_t, t.int16s, t.uint32_t, t.uint24_t, t.EmberStatus])
+def test_int_list_fast_path(itemtype):
+    rnd = random.Random(2)
+    for length in (0, 1, 7, 8, 33):
+        data = bytes(rnd.getrandbits(8) for _ in range(length))
+        expected = _decode(lambda d: _reference_list(t.List(itemtype), d), data)
+        assert _decode(t.List(itemtype).deserialize, data) == expected
+        expected = _decode(lambda d: _reference_list(t.fixed_list(4, itemtype), d, 4), data)
+        assert _decode(t.fixed_list(4, itemtype).deserialize, data) == expected
+        lv = bytes([length // 4]) + data
+        expected = _decode(lambda d: _reference_list(t.LVList(itemtype), d[1:], d[0]), lv)
+        assert _decode(t.LVList(itemtype).deserialize, lv) == expected
+
+
+def test_int_list_serialize():
+    values = t.LVList(t.uint16_t)([t.uint16_t(1), t.uint16_t(0x1234)])
+    assert values.serialize() == b'\x02\x01\x00\x34\x12'
+    assert t.List(t.int8s)([t.int8s(-1)]).serialize() == b'\xff'
+    with pytest.raises(OverflowError):
+        t.List(t.uint8_t)([t.uint8_t(256)]).serialize()
+    with pytest.raises(AssertionError):
+        t.fixed_list(2, t.uint8_t)([t.uint8_t(1)]).serialize()
+
+
+def test_enum_members():
+    assert t.EmberStatus.deserialize(b'\x00') == (t.EmberStatus.SUCCESS, b'')
+    assert t.EmberStatus.deserialize(b'\x00')[0] is t.EmberStatus.SUCCESS
+    assert t.EzspStatus._members[0x00] is t.EzspStatus.SUCCESS
+    assert t.NcpResetCode._members[0x51] is \
+        t.NcpResetCode.ERROR_EXCEEDED_MAXIMUM_ACK_TIMEOUT_COUNT
+
+
+def test_enum_unknown_value():
+    status, rest = t.EmberStatus.deserialize(b'\x03x')
+    assert rest == b'x'
+    assert status == 0x03
+    assert isinstance(status, t.EmberStatus)
+    assert status.serialize() == b'\x03'
+    assert 'undefined_0x03' in str(status)
+    assert status not in list(t.EmberStatus)
+    with pytest.raises(ValueError):
+        t.EmberStatus(0x03)
+
+
+def test_enum_unknown_value_in_frame():
+    schema = COMMANDS['messageSentHandler'][2]
+    data = b'\x00\x34\x12' + b'\x04\x01\x06\x00\x01\x02\x00\x01\x00\x00\x07' + b'\x08\x03\x00'
+    result, rest = t.Schema(schema).deserialize(data)
+    assert rest == b''
+    assert result[4] == 0x03
+    assert [repr(v) for v in result] == [repr(v) for v in t.deserialize(data, schema)[0]]
@@ -11,8 +11,7 @@ def test_connect(monkeypatch):
     portmock = mock.MagicMock()
     appmock = mock.MagicMock()
 
-    @asyncio.coroutine
-    def mockconnect(loop, protocol_factory, **kwargs):
+    async def mockconnect(loop, protocol_factory, **kwargs):
         protocol = protocol_factory()
         loop.call_soon(protocol.connection_made, None)
         return None, protocol
@@ -76,19 +75,117 @@ def test_substitute_received(gw):
     assert gw._buffer == b'partial'
 
 
+def test_multiple_frames_received(gw):
+    gw.rst_frame_received = mock.MagicMock()
+    gw.data_received(b'\x7e' + b'\xc0\x38\xbc\x7e' * 3 + b'\xc0\x38')
+    assert gw.rst_frame_received.call_count == 3
+    gw.data_received(b'\xbc\x7e')
+    assert gw.rst_frame_received.call_count == 4
+    assert gw.rst_frame_received.call_args[0][0] == b'\xc0\x38\xbc\x7e'
+
+
+def test_control_bytes_mid_chunk(gw):
+    gw.rst_frame_received = mock.MagicMock()
+    # A substitute discards up to the next flag, a cancel only what came
+    # before it
+    gw.data_received(
+        b'\xc0\x18\xc0\x38\xbc\x7e'
+        b'junk\x1a\xc0\x38\xbc\x7e'
+        b'\x18junk\x1ajunk\x7e'
+        b'\xc0\x38\x1ajunk\x1a\xc0\x38\xbc\x7e'
+    )
+    assert gw.rst_frame_received.call_count == 2
+    assert gw._buffer == b''
+
+
+def test_xon_xoff_stripped(gw):
+    gw.rst_frame_received = mock.MagicMock()
+    gw.data_received(b'\x11\xc0\x13\x38')
+    gw.data_received(b'\x11\xbc\x13\x7e')
+    gw.rst_frame_received.assert_called_once_with(b'\xc0\x38\xbc\x7e')
+
+
+def test_escaped_frame_received(gw):
+    gw.frame_received = mock.MagicMock()
+    gw.data_received(bytearray(b'\x00\x7d\x5e\x7e\x7d'))
+    gw.data_received(b'\x31\x7e')
+    assert gw.frame_received.call_args_list == [
+        mock.call(b'\x00\x7e\x7e'),
+        mock.call(b'\x11\x7e'),
+    ]
+
+
 def test_partial_data_received(gw):
     gw.write = mock.MagicMock()
     gw.data_received(b'\x54\x79\xa1\xb0')
     gw.data_received(b'\x50\xf2\x6e\x7e')
-    assert gw.write.call_count == 1
     assert gw._application.frame_received.call_count == 1
+    _wait_delayed_ack(gw)
+    assert gw.write.call_count == 1
 
 
 def test_data_frame_received(gw):
     gw.write = mock.MagicMock()
     gw.data_received(b'\x54\x79\xa1\xb0\x50\xf2\x6e\x7e')
-    assert gw.write.call_count == 1
     assert gw._application.frame_received.call_count == 1
+    assert gw.write.call_count == 0
+    _wait_delayed_ack(gw)
+    gw.write.assert_called_once_with(b'\x86\x10\xbe\x7e')
+    assert gw.stats.acks_sent == 1
+    assert gw.stats.acks_saved == 0
+
+
+def _wait_delayed_ack(gw):
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(asyncio.sleep(gw._ack_delay * 2))
+
+
+def test_ack_coalesced(gw):
+    gw.write = mock.MagicMock()
+    for seq in range(gw.ACK_FRAMES):
+        gw.data_frame_received(bytes([seq << 4]) + b'\x00\x00\x00')
+    # One ACK for all of the frames, without waiting for the delay
+    gw.write.assert_called_once_with(gw._ack_frame())
+    assert gw._rec_seq == gw.ACK_FRAMES
+    assert gw._delayed_ack is None
+    assert gw.stats.acks_saved == gw.ACK_FRAMES - 1
+
+
+def test_ack_immediate():
+    gw = uart.Gateway(mock.MagicMock(), ack_frames=1)
+    gw.write = mock.MagicMock()
+    gw.data_frame_received(b'\x00\x00\x00\x00')
+    gw.write.assert_called_once_with(gw._ack_frame())
+
+
+def test_invalid_ack_frames():
+    with pytest.raises(ValueError):
+        uart.Gateway(mock.MagicMock(), ack_frames=0)
+
+
+def test_ack_piggybacked(gw):
+    gw.write = mock.MagicMock()
+    gw.data_frame_received(b'\x00\x00\x00\x00')
+    gw.data_frame_received(b'\x10\x00\x00\x00')
+    gw.data(b'foo')
+    _run_send_task(gw)
+    # The DATA frame carries the ackNum, no ACK frame is sent
+    assert gw.write.call_count == 1
+    control = gw._unstuff(gw.write.call_args[0][0])[0]
+    assert control & 0b10000111 == 2
+    _wait_delayed_ack(gw)
+    assert gw.write.call_count == 1
+    assert gw.stats.acks_sent == 0
+    assert gw.stats.acks_saved == 2
+
+
+def test_rstack_cancels_delayed_ack(gw):
+    gw.write = mock.MagicMock()
+    gw.data_frame_received(b'\x00\x00\x00\x00')
+    gw.data_received(b'\xc1\x02\x0b\nR\x7e')
+    assert gw._delayed_ack is None
+    _wait_delayed_ack(gw)
+    gw.write.assert_not_called()
 
 
 def test_ack_frame_received(gw):
@@ -140,6 +237,7 @@ def test_close(gw):
 
 def test_reset(gw):
     gw.reset()
+    _run_loop_once()
     assert gw._transport.write.call_count == 1
 
 
@@ -150,16 +248,61 @@ def test_reset_old(gw):
     gw._transport.write.assert_not_called()
 
 
-def test_data(gw):
+def _run_loop_once():
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(asyncio.sleep(0))
+
+
+def test_write_coalesced(gw):
+    gw.write(b'a')
+    gw.write(b'b')
+    gw.write(b'c')
+    gw._transport.write.assert_not_called()
+    _run_loop_once()
+    gw._transport.write.assert_called_once_with(b'abc')
+
+    gw.write(b'd')
+    _run_loop_once()
+    assert gw._transport.write.call_args == mock.call(b'd')
+
+
+def test_xon_xoff(gw):
+    gw.data_received(b'\x13')
+    gw.write(b'a')
+    _run_loop_once()
+    gw.write(b'b')
+    _run_loop_once()
+    gw._transport.write.assert_not_called()
+
+    gw.data_received(b'\x11')
+    gw._transport.write.assert_called_once_with(b'ab')
+
+
+def test_close_flushes(gw):
+    gw.write(b'a')
+    gw.close()
+    gw._transport.write.assert_called_once_with(b'a')
+    _run_loop_once()
+    assert gw._transport.write.call_count == 1
+
+
+def _run_send_task(gw):
+    gw._sendq.put_nowait(gw.Terminator)
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(gw._send_task())
+
+
+def test_data():
+    gw = uart.Gateway(mock.MagicMock(), window_size=1)
     write_call_count = 0
 
     def mockwrite(data):
         nonlocal loop, write_call_count
+        seq = (gw._unstuff(data)[0] & 0b01110000) >> 4
         if data == b'\x10 @\xda}^Z~':
-            print(write_call_count)
-            loop.call_soon(gw._handle_nak, gw._pending[0])
+            loop.call_soon(gw._handle_nak, seq)
         else:
-            loop.call_soon(gw._handle_ack, (gw._pending[0] + 1) % 8)
+            loop.call_soon(gw._handle_ack, (seq + 1) % 8)
         write_call_count += 1
 
     gw.write = mockwrite
@@ -167,8 +310,174 @@ def test_data(gw):
     gw.data(b'foo')
     gw.data(b'bar')
     gw.data(b'baz')
-    gw._sendq.put_nowait(gw.Terminator)
 
     loop = asyncio.get_event_loop()
-    loop.run_until_complete(gw._send_task())
+    _run_send_task(gw)
+    loop.run_until_complete(asyncio.sleep(0))
     assert write_call_count == 4
+    assert not gw._unacked
+
+
+def test_data_window(gw):
+    gw.write = mock.MagicMock()
+    for i in range(5):
+        gw.data(b'frame%d' % (i, ))
+
+    loop = asyncio.get_event_loop()
+    task = loop.create_task(gw._send_task())
+    loop.run_until_complete(asyncio.sleep(0))
+    assert gw.write.call_count == gw.TX_K
+    assert list(gw._unacked) == [0, 1, 2]
+
+    # Cumulative acknowledgement of frames 0 and 1
+    gw._handle_ack(0b10000010)
+    loop.run_until_complete(asyncio.sleep(0))
+    assert gw.write.call_count == 5
+    assert list(gw._unacked) == [2, 3, 4]
+
+    gw._handle_ack(0b10000101)
+    gw._sendq.put_nowait(gw.Terminator)
+    loop.run_until_complete(task)
+    assert not gw._unacked
+
+
+def test_data_window_size():
+    gw = uart.Gateway(mock.MagicMock(), window_size=7)
+    gw.write = mock.MagicMock()
+    for i in range(8):
+        gw.data(b'frame')
+
+    loop = asyncio.get_event_loop()
+    task = loop.create_task(gw._send_task())
+    loop.run_until_complete(asyncio.sleep(0))
+    assert gw.write.call_count == 7
+    gw._handle_ack(0b10000111)
+    gw._sendq.put_nowait(gw.Terminator)
+    loop.run_until_complete(task)
+    assert gw.write.call_count == 8
+
+
+def test_invalid_window_size():
+    with pytest.raises(ValueError):
+        uart.Gateway(mock.MagicMock(), window_size=8)
+
+
+def test_duplicate_ack(gw):
+    gw.write = mock.MagicMock()
+    gw.data(b'foo')
+    gw.data(b'bar')
+    _run_send_task(gw)
+    gw._handle_ack(0b10000001)
+    gw._handle_ack(0b10000001)
+    assert list(gw._unacked) == [1]
+
+
+def test_nak_retransmits(gw):
+    gw.write = mock.MagicMock()
+    gw.data(b'foo')
+    gw.data(b'bar')
+    gw.data(b'baz')
+    _run_send_task(gw)
+    gw.write.reset_mock()
+
+    # Frame 0 was received, 1 and 2 have to be sent again
+    gw._handle_nak(0b10100001)
+    assert list(gw._unacked) == [1, 2]
+    assert gw.write.call_count == 2
+    for (frame, ), seq in zip([c[0] for c in gw.write.call_args_list], [1, 2]):
+        control = gw._unstuff(frame)[0]
+        assert control & 0b01111000 == (seq << 4) | 0b00001000
+    assert gw._unacked[1].retransmits == 1
+
+
+def test_stale_nak(gw):
+    gw.write = mock.MagicMock()
+    gw.data(b'foo')
+    _run_send_task(gw)
+    gw.write.reset_mock()
+    gw._handle_nak(0b10100101)
+    gw.write.assert_not_called()
+
+
+def test_rstack_clears_window(gw):
+    gw.write = mock.MagicMock()
+    gw.data(b'foo')
+    _run_send_task(gw)
+    gw.data_received(b'\xc1\x02\x0b\nR\x7e')
+    assert not gw._unacked
+
+
+def test_ack_timeout_retransmits(gw):
+    gw.write = mock.MagicMock()
+    gw.data(b'foo')
+    _run_send_task(gw)
+    assert gw._ack_timer is not None
+    gw.write.reset_mock()
+
+    gw._ack_timeout()
+    assert gw.write.call_count == 1
+    assert gw._unstuff(gw.write.call_args[0][0])[0] & 0b00001000
+    assert gw.stats.ack_timeouts == 1
+    assert gw.stats.retransmits == 1
+    assert gw.stats.t_rx_ack == gw.T_RX_ACK_MAX
+    assert gw._ack_timer is not None
+    gw.close()
+    assert gw._ack_timer is None
+
+
+def test_ack_timeout_failed_state(gw):
+    gw.write = mock.MagicMock()
+    gw.data(b'foo')
+    _run_send_task(gw)
+    for i in range(gw.ACK_TIMEOUTS - 1):
+        gw._ack_timeout()
+    assert gw._application.enter_failed_state.call_count == 0
+
+    gw._ack_timeout()
+    assert gw._application.enter_failed_state.call_count == 1
+    assert not gw._unacked
+    assert gw._ack_timer is None
+
+
+def test_ack_resets_timeouts(gw):
+    gw.write = mock.MagicMock()
+    gw.data(b'foo')
+    gw.data(b'bar')
+    _run_send_task(gw)
+    gw._ack_timeout()
+    assert gw._ack_timeouts == 1
+    gw._handle_ack(0b10000001)
+    assert gw._ack_timeouts == 0
+    assert gw._ack_timer is not None
+    gw._handle_ack(0b10000010)
+    assert gw._ack_timer is None
+
+
+def test_rtt_estimate(gw):
+    gw.write = mock.MagicMock()
+    gw.data(b'foo')
+    _run_send_task(gw)
+    gw._unacked[0].sent -= 0.1
+    gw._handle_ack(0b10000001)
+    assert 0.1 <= gw.stats.rtt < 0.2
+    expected = gw.T_RX_ACK_INIT * 7 / 8 + gw.stats.rtt / 2
+    assert gw.stats.t_rx_ack == pytest.approx(expected)
+
+
+def test_rtt_estimate_clamped(gw):
+    for i in range(20):
+        gw._update_t_rx_ack(0)
+    assert gw.stats.t_rx_ack == gw.T_RX_ACK_MIN
+    for i in range(20):
+        gw._update_t_rx_ack(10)
+    assert gw.stats.t_rx_ack == gw.T_RX_ACK_MAX
+
+
+def test_rtt_not_measured_on_retransmit(gw):
+    gw.write = mock.MagicMock()
+    gw.data(b'foo')
+    _run_send_task(gw)
+    gw._ack_timeout()
+    gw._handle_ack(0b10000001)
+    assert gw.stats.rtt is None
+    assert 'retransmits=1' in repr(gw.stats)
@@ -5,6 +5,8 @@ import pytest
 
 import bellows.types as t
 import bellows.zigbee.zcl as zcl
+from bellows.zigbee import util
+from bellows.zigbee.scheduler import Priority
 
 
 @pytest.fixture
@@ -83,6 +85,64 @@ def cluster(aps):
 def test_request_general(cluster):
     cluster.request(True, 0, [])
     assert cluster._endpoint.device.request.call_count == 1
+    assert cluster._endpoint.device.request.call_args[1]['priority'] == Priority.NORMAL
+
+
+def test_request_no_reply(cluster):
+    cluster.request(False, 0, [], expect_reply=False)
+    args, kwargs = cluster._endpoint.device.request.call_args
+    assert kwargs['expect_reply'] is False
+    assert args[1][0] == 0x11
+
+
+def test_request_single_flight(cluster):
+    loop = asyncio.get_event_loop()
+    cluster._endpoint.device.single_flight = util.SingleFlight()
+    reply = loop.create_future()
+    cluster._endpoint.device.request.return_value = reply
+    requests = [
+        asyncio.ensure_future(cluster.read_attributes_raw([0], single_flight=True)),
+        asyncio.ensure_future(cluster.read_attributes_raw([0], single_flight=True)),
+        asyncio.ensure_future(cluster.read_attributes_raw([1], single_flight=True)),
+        asyncio.ensure_future(cluster.read_attributes_raw([0])),
+    ]
+    loop.run_until_complete(asyncio.sleep(0))
+    assert cluster._endpoint.device.request.call_count == 3
+    reply.set_result(mock.sentinel.reply)
+    results = loop.run_until_complete(asyncio.gather(*requests))
+    assert results == [mock.sentinel.reply] * 4
+
+
+def test_request_single_flight_key(cluster):
+    loop = asyncio.get_event_loop()
+    cluster._endpoint.device.single_flight = util.SingleFlight()
+    reply = loop.create_future()
+    cluster._endpoint.device.request.return_value = reply
+    requests = [
+        asyncio.ensure_future(cluster.request(True, 0, [], single_flight=True)),
+        asyncio.ensure_future(cluster.request(
+            True, 0, [], single_flight=True, expect_reply=False,
+        )),
+        asyncio.ensure_future(cluster.request(
+            True, 0, [], single_flight=True, priority=Priority.BULK,
+        )),
+        asyncio.ensure_future(cluster.request(
+            True, 0, [], single_flight=True, priority=Priority.NORMAL,
+        )),
+    ]
+    loop.run_until_complete(asyncio.sleep(0))
+    # Only the default priority, which is NORMAL, is shared
+    assert cluster._endpoint.device.request.call_count == 3
+    assert cluster._endpoint.device.single_flight.joined == 1
+    reply.set_result(mock.sentinel.reply)
+    loop.run_until_complete(asyncio.gather(*requests))
+
+
+def test_request_priority(cluster):
+    cluster.request(False, 0, [])
+    assert cluster._endpoint.device.request.call_args[1]['priority'] == Priority.INTERACTIVE
+    cluster.request(True, 0, [], priority=Priority.BULK)
+    assert cluster._endpoint.device.request.call_args[1]['priority'] == Priority.BULK
 
 
 def test_attribute_report(cluster, aps):
@@ -116,8 +176,7 @@ def _mk_rar(attrid, value, status=0):
 
 
 def test_read_attributes_uncached(cluster):
-    @asyncio.coroutine
-    def mockrequest(foundation, command, schema, args):
+    async def mockrequest(foundation, command, schema, args, priority=None, single_flight=None):
         assert foundation is True
         assert command == 0
         rar0 = _mk_rar(0, 99)
@@ -150,8 +209,7 @@ def test_read_attributes_cached(cluster):
 
 
 def test_read_attributes_mixed_cached(cluster):
-    @asyncio.coroutine
-    def mockrequest(foundation, command, schema, args):
+    async def mockrequest(foundation, command, schema, args, priority=None, single_flight=None):
         assert foundation is True
         assert command == 0
         rar5 = _mk_rar(5, b'Model')
@@ -172,8 +230,7 @@ def test_read_attributes_mixed_cached(cluster):
 
 
 def test_read_attributes_default_response(cluster):
-    @asyncio.coroutine
-    def mockrequest(foundation, command, schema, args):
+    async def mockrequest(foundation, command, schema, args, priority=None, single_flight=None):
         assert foundation is True
         assert command == 0
         return [0xc1]
@@ -189,8 +246,7 @@ def test_read_attributes_default_response(cluster):
 
 
 def test_item_access_attributes(cluster):
-    @asyncio.coroutine
-    def mockrequest(foundation, command, schema, args):
+    async def mockrequest(foundation, command, schema, args, priority=None, single_flight=None):
         assert foundation is True
         assert command == 0
         rar5 = _mk_rar(5, b'Model')
@@ -199,14 +255,13 @@ def test_item_access_attributes(cluster):
     cluster.request = mockrequest
     cluster._attr_cache[0] = 99
 
-    @asyncio.coroutine
-    def inner():
-        v = yield from cluster['model']
+    async def inner():
+        v = await cluster['model']
         assert v == b'Model'
-        v = yield from cluster['zcl_version']
+        v = await cluster['zcl_version']
         assert v == 99
         with pytest.raises(KeyError):
-            v = yield from cluster[99]
+            v = await cluster[99]
 
     loop = asyncio.get_event_loop()
     loop.run_until_complete(inner())
@@ -1,7 +1,10 @@
 import re
 
+import pytest
+
 import bellows.zigbee.endpoint
 import bellows.zigbee.zcl as zcl
+from bellows.zigbee.zcl import clusters
 
 
 def test_registry():
@@ -11,6 +14,31 @@ def test_registry():
         assert issubclass(cluster, zcl.Cluster)
 
 
+def test_registry_index():
+    registry = zcl.Cluster._registry
+    assert sorted(registry) == sorted(clusters.CLUSTERS)
+    for cluster_id, cluster in registry.items():
+        module = cluster.__module__.rsplit('.', 1)[-1]
+        assert clusters.CLUSTERS[cluster_id] == module
+
+    ranges = zcl.Cluster._registry_range
+    assert sorted(ranges) == sorted(clusters.CLUSTER_RANGES)
+    for cluster_range, cluster in ranges.items():
+        module = cluster.__module__.rsplit('.', 1)[-1]
+        assert clusters.CLUSTER_RANGES[cluster_range] == module
+
+
+def test_registry_lookup():
+    registry = zcl.Cluster._registry
+    assert 0x0006 in registry
+    assert 0xfbff not in registry
+    assert registry.get(0xfbff) is None
+    with pytest.raises(KeyError):
+        registry[0xfbff]
+    assert registry[0x0006].cluster_id == 0x0006
+    assert registry.get(0x0006) is registry[0x0006]
+
+
 def test_attributes():
     for cluster_id, cluster in zcl.Cluster._registry.items():
         for attrid, attrspec in cluster.attributes.items():
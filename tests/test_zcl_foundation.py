@@ -62,3 +62,34 @@ def test_attribute_reporting_config_1():
     assert data == b''
     assert arc2.direction == arc.direction
     assert arc2.timeout == arc.timeout
+
+
+def test_typevalue_deserialize_from():
+    data = b'\x00\x48\x21\x02\x00\x01\x00\x02\x00\x4c\x01\x00\x42\x02hi'
+    tv, offset = foundation.TypeValue.deserialize_from(memoryview(data), 1)
+    assert tv.type == 0x48
+    assert tv.value == [1, 2]
+    tv, offset = foundation.TypeValue.deserialize_from(data, offset)
+    assert tv.type == 0x4c
+    assert tv.value == [b'hi']
+    assert offset == len(data)
+
+
+def test_attribute_report():
+    records = []
+    data = b''
+    for attrid in range(100):
+        data += t.uint16_t(attrid).serialize() + b'\x21' + t.uint16_t(attrid * 3).serialize()
+        records.append((attrid, attrid * 3))
+    data += b'\x01\x00\x42\x05hello'
+    records.append((1, b'hello'))
+
+    attrs, rest = t.List(foundation.Attribute).deserialize(data)
+    assert rest == b''
+    assert [(a.attrid, a.value.value) for a in attrs] == records
+
+    rars, rest = t.List(foundation.ReadAttributeRecord).deserialize(
+        b'\x00\x00\x86\x01\x00\x00\x20\x07')
+    assert rest == b''
+    assert [r.status for r in rars] == [0x86, 0]
+    assert rars[1].value.value == 7
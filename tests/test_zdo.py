@@ -1,3 +1,4 @@
+import asyncio
 from unittest import mock
 
 import pytest
@@ -48,6 +49,23 @@ def test_request(zdo_f):
     assert app_mock.get_sequence.call_count == 1
 
 
+def test_request_single_flight(zdo_f):
+    loop = asyncio.get_event_loop()
+    app_mock = zdo_f._device._application
+    app_mock.request = mock.MagicMock(side_effect=lambda *args, **kwargs: reply)
+    reply = loop.create_future()
+    requests = [
+        asyncio.ensure_future(zdo_f.request(4, 65535, 1, single_flight=True)),
+        asyncio.ensure_future(zdo_f.request(4, 65535, 1, single_flight=True)),
+        asyncio.ensure_future(zdo_f.request(4, 65535, 2, single_flight=True)),
+    ]
+    loop.run_until_complete(asyncio.sleep(0))
+    assert app_mock.request.call_count == 2
+    reply.set_result(mock.sentinel.reply)
+    results = loop.run_until_complete(asyncio.gather(*requests))
+    assert results == [mock.sentinel.reply] * 3
+
+
 def test_bind(zdo_f):
     zdo_f.bind(1, 1026)
     app_mock = zdo_f._device._application
@@ -69,6 +87,39 @@ def test_leave(zdo_f):
     assert app_mock.request.call_args[0][1].clusterId == 0x0034
 
 
+def _reply(zdo_f, side_effect):
+    loop = asyncio.get_event_loop()
+
+    async def reply(*args, **kwargs):
+        return side_effect()
+
+    zdo_f._device._application.reply = reply
+    with mock.patch.object(zdo_f, 'warn') as warn:
+        future = zdo_f.reply(0x8000, 0, zdo_f._device.ieee, 0, 0, 0, [])
+        loop.run_until_complete(asyncio.wait([future]))
+        loop.run_until_complete(asyncio.sleep(0))
+    return warn
+
+
+def test_reply(zdo_f):
+    warn = _reply(zdo_f, lambda: [0])
+    assert warn.call_count == 0
+
+
+def test_reply_send_failure(zdo_f):
+    warn = _reply(zdo_f, lambda: [0x66])
+    assert warn.call_count == 1
+
+
+def test_reply_timeout(zdo_f):
+    def timeout():
+        raise asyncio.TimeoutError()
+
+    warn = _reply(zdo_f, timeout)
+    assert warn.call_count == 1
+    assert isinstance(warn.call_args[0][2], asyncio.TimeoutError)
+
+
 def _handle_match_desc(zdo_f, profile):
     zdo_f.reply = mock.MagicMock()
     aps = t.EmberApsFrame()
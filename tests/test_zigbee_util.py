@@ -49,8 +49,7 @@ def test_zha_security_controller():
 def _test_retry(exception, retry_exceptions, n):
     counter = 0
 
-    @asyncio.coroutine
-    def count():
+    async def count():
         nonlocal counter
         counter += 1
         if counter <= n:
@@ -83,8 +82,7 @@ def _test_retryable(exception, retry_exceptions, n, tries=3, delay=0.001):
     counter = 0
 
     @util.retryable(retry_exceptions)
-    @asyncio.coroutine
-    def count(x, y, z):
+    async def count(x, y, z):
         assert x == y == z == 9
         nonlocal counter
         counter += 1
@@ -125,24 +123,82 @@ def test_retryable_once():
     assert counter == 2
 
 
+def test_single_flight():
+    loop = asyncio.get_event_loop()
+    flight = util.SingleFlight()
+    calls = []
+
+    async def call(result):
+        calls.append(result)
+        await asyncio.sleep(0)
+        return result
+
+    # Scheduled in order, as gather() does not keep the order of coroutines
+    futures = [
+        asyncio.ensure_future(flight.run('a', lambda: call(1))),
+        asyncio.ensure_future(flight.run('a', lambda: call(2))),
+        asyncio.ensure_future(flight.run('b', lambda: call(3))),
+    ]
+    results = loop.run_until_complete(asyncio.gather(*futures))
+    assert results == [1, 1, 3]
+    assert calls == [1, 3]
+    assert flight.joined == 1
+    assert len(flight) == 0
+
+    # Once finished, the next call runs again
+    assert loop.run_until_complete(flight.run('a', lambda: call(4))) == 4
+
+
+def test_single_flight_exception():
+    loop = asyncio.get_event_loop()
+    flight = util.SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0)
+        raise ValueError()
+
+    futures = [
+        asyncio.ensure_future(flight.run('a', call)),
+        asyncio.ensure_future(flight.run('a', call)),
+    ]
+    results = loop.run_until_complete(asyncio.gather(*futures, return_exceptions=True))
+    assert all(isinstance(r, ValueError) for r in results)
+    assert len(flight) == 0
+
+
+def test_single_flight_cancel():
+    loop = asyncio.get_event_loop()
+    flight = util.SingleFlight()
+    done = loop.create_future()
+
+    first = asyncio.ensure_future(flight.run('a', lambda: done))
+    second = asyncio.ensure_future(flight.run('a', lambda: done))
+    loop.run_until_complete(asyncio.sleep(0))
+    first.cancel()
+    loop.run_until_complete(asyncio.sleep(0))
+    done.set_result(1)
+    assert loop.run_until_complete(second) == 1
+    assert first.cancelled()
+
+
 def test_zigbee_security_hash():
     message = bytes([0x11, 0x22, 0x33, 0x44, 0x55, 0x66, 0x77, 0x88, 0x4A, 0xF7])
     key = util.aes_mmo_hash(message)
-    assert key.contents == [0x41, 0x61, 0x8F, 0xC0, 0xC8, 0x3B, 0x0E, 0x14, 0xA5, 0x89, 0x95, 0x4B, 0x16, 0xE3, 0x14, 0x66]
+    assert key.contents == bytes([0x41, 0x61, 0x8F, 0xC0, 0xC8, 0x3B, 0x0E, 0x14, 0xA5, 0x89, 0x95, 0x4B, 0x16, 0xE3, 0x14, 0x66])
 
     message = bytes([0x7A, 0x93, 0x97, 0x23, 0xA5, 0xC6, 0x39, 0xB2, 0x69, 0x16, 0x18, 0x02, 0x81, 0x9B])
     key = util.aes_mmo_hash(message)
-    assert key.contents == [0xF9, 0x39, 0x03, 0x72, 0x16, 0x85, 0xFD, 0x32, 0x9D, 0x26, 0x84, 0x9B, 0x90, 0xF2, 0x95, 0x9A]
+    assert key.contents == bytes([0xF9, 0x39, 0x03, 0x72, 0x16, 0x85, 0xFD, 0x32, 0x9D, 0x26, 0x84, 0x9B, 0x90, 0xF2, 0x95, 0x9A])
 
     message = bytes([0x83, 0xFE, 0xD3, 0x40, 0x7A, 0x93, 0x97, 0x23, 0xA5, 0xC6, 0x39, 0xB2, 0x69, 0x16, 0x18, 0x02, 0xAE, 0xBB])
     key = util.aes_mmo_hash(message)
-    assert key.contents == [0x33, 0x3C, 0x23, 0x68, 0x60, 0x79, 0x46, 0x8E, 0xB2, 0x7B, 0xA2, 0x4B, 0xD9, 0xC7, 0xE5, 0x64]
+    assert key.contents == bytes([0x33, 0x3C, 0x23, 0x68, 0x60, 0x79, 0x46, 0x8E, 0xB2, 0x7B, 0xA2, 0x4B, 0xD9, 0xC7, 0xE5, 0x64])
 
 
 def test_convert_install_code():
     message = bytes([0x11, 0x22, 0x33, 0x44, 0x55, 0x66, 0x77, 0x88, 0x4A, 0xF7])
     key = util.convert_install_code(message)
-    assert key.contents == [0x41, 0x61, 0x8F, 0xC0, 0xC8, 0x3B, 0x0E, 0x14, 0xA5, 0x89, 0x95, 0x4B, 0x16, 0xE3, 0x14, 0x66]
+    assert key.contents == bytes([0x41, 0x61, 0x8F, 0xC0, 0xC8, 0x3B, 0x0E, 0x14, 0xA5, 0x89, 0x95, 0x4B, 0x16, 0xE3, 0x14, 0x66])
 
 
 def test_fail_convert_install_code():